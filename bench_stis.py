@@ -0,0 +1,410 @@
+# bench_stis.py – benchmarky pro stis_uploader (nejsou součástí EXE)
+#
+#   python bench_stis.py teams [--sheets 30] [--teams 200]
+#   python bench_stis.py xlsx  [--sheets 20] [--rows 3000]
+#   python bench_stis.py replay --xlsx X --team T --har session.har [-n 5]
+#   python bench_stis.py bulk  [--files 64] [--procs 1 2 4 8] [--engine openpyxl]
+#   python bench_stis.py importtime [--repeat 5] [--max-ms 150]
+#   python bench_stis.py micro   [--size match|club|league] [--save]
+#   python bench_stis.py compare [--size club] [--threshold 25]
+#
+import argparse, datetime, io, json, os, platform, shutil, statistics, subprocess, sys, tempfile, time, timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import stis_uploader as su
+
+
+def make_setup_workbook(path: Path, sheets: int = 30, teams: int = 200):
+    """Syntetický sešit: `sheets-1` balastních listů (60×40 textu) a list Teams jako POSLEDNÍ."""
+    from openpyxl import Workbook
+    wb = Workbook()
+    wb.remove(wb.active)
+    for s in range(sheets - 1):
+        ws = wb.create_sheet(f"list{s}")
+        for r in range(60):
+            ws.append([f"Položka {r}-{c} Šťastný" for c in range(40)])
+    ws = wb.create_sheet("setup")
+    ws["A1"], ws["B1"] = "login", "bench"
+    ws["A2"], ws["B2"] = "heslo", "bench"
+    ws.append([])
+    ws.append(["Družstvo", "DruzstvoID", "Vedoucí domácích", "Vedoucí hostů", "Herna", "Začátek utkání"])
+    for i in range(teams):
+        ws.append([f"Družstvo {i}", 10000 + i, f"Vedoucí {i}", f"Host {i}", "Herna 1", "18:30"])
+    wb.save(path)
+
+
+def make_club_workbook(path: Path, sheets: int = 20, rows: int = 3000):
+    """„Velký klubový“ sešit: setup + zdroj (D2:M22) + `sheets` archivních listů po `rows` řádcích."""
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "setup"
+    ws["A1"], ws["B1"] = "login", "bench"
+    ws["A2"], ws["B2"] = "heslo", "bench"
+    ws.append([])
+    ws.append(["Družstvo", "DruzstvoID", "Vedoucí domácích", "Vedoucí hostů", "Herna", "Začátek utkání"])
+    ws.append(["A", 12345, "Dvořák Jiří", "Novák Petr", "Herna 1", "18:30"])
+    z = wb.create_sheet("zdroj")
+    for r in range(2, 23):
+        z.cell(r, 4, f"Domácí Hráč {r}")
+        z.cell(r, 5, f"Hostující Hráč {r}")
+        for c in range(9, 12):
+            z.cell(r, c, (r * c) % 11 - 5)
+    for s in range(sheets):
+        a = wb.create_sheet(f"archiv{s}")
+        for r in range(rows):
+            a.append([f"Hráč {r % 97}", r, r * 0.5, "11:7", "=B1*2"] * 4)
+    wb.save(path)
+
+
+FIRST_NAMES = ("Jiří", "Petr", "Jan", "Tomáš", "Martin", "Lukáš", "Ondřej", "Štěpán",
+               "Kateřina", "Žaneta", "Eliška", "Radek")
+LAST_NAMES = ("Novák", "Dvořák", "Černý", "Procházka", "Kučera", "Veselý", "Horák", "Němec",
+              "Pokorný", "Marek", "Růžička", "Šťastný", "Křížek")
+
+
+def make_roster(players: int, clubs: int = 12):
+    """
+    Syntetická soupiska: [(text v STIS, jméno jak ho píše uživatel)] – diakritika, ročník a klub
+    v závorce jako v nabídkách STIS. Jména jsou unikátní (nad 156 hráčů s druhým křestním jménem),
+    jen každý 50. hráč je jmenovec předchozího (jiný klub/ID). Uživatel střídá pořadí
+    „Jméno Příjmení“ / „Příjmení Jméno“.
+    """
+    out, combos = [], len(FIRST_NAMES) * len(LAST_NAMES)
+    for i in range(players):
+        j = i - 1 if i % 50 == 49 else i
+        first = FIRST_NAMES[j % len(FIRST_NAMES)]
+        if j >= combos:
+            first += " " + FIRST_NAMES[(j // combos - 1) % len(FIRST_NAMES)]
+        last = LAST_NAMES[(j // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        text = f"{last} {first} ({1950 + i % 55}, TJ Klub {i % clubs})"
+        out.append((text, f"{first} {last}" if i % 2 else f"{last} {first}"))
+    return out
+
+
+def _timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    out = fn(*a, **kw)
+    return time.perf_counter() - t0, out
+
+
+def bench_teams(args):
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "setup.xlsx"
+        make_setup_workbook(path, args.sheets, args.teams)
+        names = [f"Družstvo {i}" for i in range(args.teams)]
+
+        su._TEAM_INDEX_CACHE.clear()
+        t_cold, _ = _timed(su.read_excel_config, path, names[0])
+        t_warm, _ = _timed(lambda: [su.read_excel_config(path, n) for n in names])
+
+        wb = su.load_workbook(path, data_only=True)
+        t_hdr, _ = _timed(su.find_teams_header_anywhere, wb)
+
+        print(f"workbook: {args.sheets} listů, {args.teams} družstev")
+        print(f"  read_excel_config – první dotaz (index)   {t_cold*1000:9.1f} ms")
+        print(f"  read_excel_config – {len(names)} dotazů (cache) {t_warm*1000:9.1f} ms"
+              f"  ({t_warm/len(names)*1e6:.1f} µs/dotaz)")
+        print(f"  find_teams_header_anywhere (načtený wb)  {t_hdr*1000:9.1f} ms")
+
+
+def bench_xlsx(args):
+    log = lambda *a: None
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "klub.xlsx"
+        make_club_workbook(path, args.sheets, args.rows)
+        print(f"workbook: {path.stat().st_size/1e6:.1f} MB, {args.sheets} archivních listů × {args.rows} řádků")
+        res = {}
+        for engine in su.XLSX_ENGINES:
+            runs = []
+            for _ in range(args.repeat):
+                su._TEAM_INDEX_CACHE.clear()
+                t0 = time.perf_counter()
+                su.read_excel_config(path, "A", engine=engine)
+                su.read_zdroj_data(path, log, engine=engine)
+                runs.append(time.perf_counter() - t0)
+            res[engine] = min(runs)
+            print(f"  {engine:9s} config + zdroj  {res[engine]*1000:9.1f} ms")
+        t_full, _ = _timed(su.load_workbook, path, data_only=True)
+        print(f"  load_workbook celého sešitu (původní cesta, 1×) {t_full*1000:9.1f} ms")
+        print(f"  zrychlení fast vs openpyxl: {res['openpyxl']/res['fast']:.1f}×,"
+              f" vs 2× load_workbook: {2*t_full/res['fast']:.1f}×")
+
+
+def bench_replay(args):
+    """N× celý běh z HAR (headless, bez sítě) do dočasné historie → report s percentily fází."""
+    with tempfile.TemporaryDirectory() as td:
+        os.environ["STIS_STATE_DIR"] = td
+        failed = 0
+        for i in range(args.n):
+            try:
+                su.main(["--xlsx", args.xlsx, "--team", args.team, "--replay-har", args.har, "--headless"])
+            except Exception as e:
+                failed += 1
+                print(f"  běh {i + 1}: {e!r}")
+        print(f"replay: {args.n} běhů, chyb {failed}")
+        su.cmd_report(["--mode", "replay", "--last", str(args.n)])
+
+
+def bench_bulk(args):
+    """Škálování `validate` přes ProcessPoolExecutor: stejná sada sešitů pro 1, 2, 4, 8… procesů."""
+    with tempfile.TemporaryDirectory() as td:
+        src = Path(td) / "vzor.xlsx"
+        make_club_workbook(src, args.sheets, args.rows)
+        files = []
+        for i in range(args.files):
+            f = Path(td) / "archiv" / f"zapas{i:04d}.xlsx"
+            f.parent.mkdir(exist_ok=True)
+            shutil.copy(src, f)
+            files.append(f)
+        print(f"{args.files} sešitů po {src.stat().st_size/1e6:.1f} MB, engine={args.engine}, jader: {os.cpu_count()}")
+        base = None
+        for n in args.procs:
+            t, stats = _timed(su.bulk_process, [str(f.parent)], "validate", team="A",
+                              engine=args.engine, workers=n, out=io.StringIO())
+            base = base or t
+            print(f"  {n:>2} proc.  {t:7.2f} s  {args.files / t:7.1f} sešitů/s  zrychlení {base / t:4.1f}×"
+                  f"  (OK {stats['ok']}, chyb {stats['failed']})")
+
+
+# moduly, které se smí načíst až ve fázi, která je potřebuje – ne při `import stis_uploader`
+LAZY_MODULES = ("openpyxl", "playwright", "concurrent.futures", "cProfile", "pstats")
+
+
+def _parse_importtime(stderr: str):
+    """Výstup `-X importtime` → [(modul, vlastní µs, kumulativně µs)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue   # hlavička „self [us] | cumulative | imported package“
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def bench_importtime(args):
+    """`import stis_uploader` v čistém procesu s -X importtime: medián, nejdražší moduly, kontrola líných importů."""
+    here = str(Path(__file__).resolve().parent)
+    code = (f"import sys; sys.path.insert(0, {here!r}); import stis_uploader; "
+            f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)   # s .pyc jako v EXE – neměříme kompilaci zdrojáku
+    subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, check=True)   # zahřátí
+    totals, rows, loaded = [], [], ""
+    for _ in range(args.repeat):
+        r = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env,
+                           capture_output=True, text=True, check=True)
+        rows = _parse_importtime(r.stderr)
+        totals.append(next(cum for name, _s, cum in rows if name == "stis_uploader") / 1000)
+        loaded = r.stdout.split()
+    med = statistics.median(totals)
+    print(f"import stis_uploader: medián {med:.1f} ms, min {min(totals):.1f} ms ({args.repeat} běhů)")
+    print("  nejdražší moduly (vlastní čas, poslední běh):")
+    for name, self_us, cum_us in sorted(rows, key=lambda x: -x[1])[:args.top]:
+        print(f"    {name:<32} {self_us / 1000:7.1f} ms  (kumulativně {cum_us / 1000:.1f} ms)")
+    rc = 0
+    if loaded:
+        print(f"  CHYBA: při importu se načetlo {', '.join(loaded)} – má se importovat až ve fázi, která to potřebuje")
+        rc = 1
+    if args.max_ms and med > args.max_ms:
+        print(f"  CHYBA: medián {med:.1f} ms > limit {args.max_ms} ms")
+        rc = 1
+    return rc
+
+
+# velikosti pro micro/compare: od jednoho zápasu po ligu se stovkami družstev a soupiskou 1000 hráčů
+MICRO_SIZES = {
+    "match":  {"teams": 1,   "sheets": 2,  "players": 40},
+    "club":   {"teams": 30,  "sheets": 10, "players": 200},
+    "league": {"teams": 300, "sheets": 30, "players": 1000},
+}
+BASELINE_FILE = Path(__file__).resolve().parent / "bench_baseline.json"
+
+
+def micro_suite(cfg, td):
+    """[(název, fn, počet operací v jednom volání fn)] – horké čistě pythonové funkce na syntetických datech."""
+    quiet = lambda *a: None
+    setup = Path(td) / "setup.xlsx"
+    make_setup_workbook(setup, cfg["sheets"], cfg["teams"])
+    roster = make_roster(cfg["players"])
+    su.write_roster(setup, [("Družstvo 0", 10000, "hrac", "domaci", su._roster_name(t), str(100000 + i), t)
+                            for i, (t, _typed) in enumerate(roster)], quiet)
+    club = Path(td) / "klub.xlsx"
+    make_club_workbook(club, 0, 0)
+
+    zdroj = su.load_workbook(club)["zdroj"]
+    wb_setup = su.load_workbook(setup, data_only=True)
+    addrs = [f"{c}{r}" for r in range(2, 23) for c in "DEIJKLM"]
+    texts = [t for t, _typed in roster]
+    typed = [n for _t, n in roster]
+    teams = [f"Družstvo {i}" for i in range(cfg["teams"])]
+    times = ["18:30", "18.30", "19", " 9:05 ", 0.7708333, 18.5, datetime.time(18, 30), None] * 8
+    sets = ["11:7", "-9", "7", "WO 3:0", "0:3wo", "", None, "101"] * 8
+    su._ROSTER_CACHE.clear()
+    r = su.load_roster(setup)
+
+    def cold_config():
+        su._TEAM_INDEX_CACHE.clear()
+        su.read_excel_config(setup, teams[-1])
+
+    def cold_roster():
+        su._ROSTER_CACHE.clear()
+        su.load_roster(setup)
+
+    return [
+        ("a1_to_rc",                   lambda: [su.a1_to_rc(a) for a in addrs], len(addrs)),
+        ("cell_value",                 lambda: [su.cell_value(zdroj, a) for a in addrs], len(addrs)),
+        ("row_sets",                   lambda: [su.row_sets(zdroj, r) for r in range(2, 23)], 21),
+        ("norm",                       lambda: [su.norm(t) for t in texts], len(texts)),
+        ("_norm_name",                 lambda: [su._norm_name(t) for t in texts], len(texts)),
+        ("_strip_menu_text",           lambda: [su._strip_menu_text(t) for t in texts], len(texts)),
+        ("_name_variants",             lambda: [su._name_variants(n) for n in typed], len(typed)),
+        ("as_time_txt",                lambda: [su.as_time_txt(v) for v in times], len(times)),
+        ("_map_wo",                    lambda: [su._map_wo(v) for v in sets], len(sets)),
+        ("find_teams_header_anywhere", lambda: su.find_teams_header_anywhere(wb_setup), 1),
+        ("read_excel_config cold",     cold_config, 1),
+        ("read_excel_config warm",     lambda: [su.read_excel_config(setup, t) for t in teams], len(teams)),
+        ("load_roster cold",           cold_roster, 1),
+        ("roster_id",                  lambda: [su.roster_id(r, "hrac", n) for n in typed], len(typed)),
+    ]
+
+
+def _measure(fn, ops, repeat):
+    """Nejlepší z `repeat` dávek (dávka ≥ 50 ms) → ns na operaci."""
+    number = 1
+    while number < 1 << 16 and timeit.timeit(fn, number=number) < 0.05:
+        number *= 4
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number / ops * 1e9
+
+
+def run_micro(size, repeat, out=print, suspect=None, retries=2):
+    """
+    {název: ns na operaci}. Když `suspect(název, ns)` hlásí podezření na regresi, měří se ještě
+    `retries`× a platí nejlepší výsledek – jednorázový šum sdíleného stroje pak build neshodí.
+    """
+    cfg = MICRO_SIZES[size]
+    out(f"micro [{size}]: {cfg['teams']} družstev, {cfg['sheets']} listů, soupiska {cfg['players']} hráčů")
+    res = {}
+    with tempfile.TemporaryDirectory() as td:
+        for name, fn, ops in micro_suite(cfg, td):
+            fn()   # zahřátí: lru_cache, líné importy
+            res[name] = _measure(fn, ops, repeat)
+            for _ in range(retries if suspect else 0):
+                if not suspect(name, res[name]):
+                    break
+                res[name] = min(res[name], _measure(fn, ops, repeat))
+            out(f"  {name:<28} {_fmt_ns(res[name]):>12}/op")
+    return res
+
+
+def _fmt_ns(ns):
+    return f"{ns:.0f} ns" if ns < 1e3 else f"{ns / 1e3:.1f} µs" if ns < 1e6 else f"{ns / 1e6:.1f} ms"
+
+
+def _load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"sizes": {}}
+
+
+def bench_micro(args):
+    res = run_micro(args.size, args.repeat)
+    if args.save:
+        doc = _load_baseline(args.baseline)
+        doc.setdefault("sizes", {})[args.size] = {
+            "saved": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "machine": platform.machine(),
+            "ns_per_op": {k: round(v, 1) for k, v in res.items()}}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        print(f"baseline [{args.size}] uložena → {args.baseline}")
+
+
+def bench_compare(args):
+    """
+    Proti uložené baseline; návratový kód 1, když je některá funkce pomalejší o víc než --threshold %
+    A ZÁROVEŇ o víc než --min-delta-ns (operace za desítky ns na cache hit jinak „regresují“ šumem).
+    """
+    base = _load_baseline(args.baseline).get("sizes", {}).get(args.size)
+    if not base:
+        print(f"V {args.baseline} není baseline pro velikost '{args.size}' – nejdřív `micro --size {args.size} --save`.")
+        return 2
+    print(f"baseline [{args.size}] z {base['saved']} (Python {base['python']}, {base['machine']})")
+    def regressed(name, ns):
+        old = base["ns_per_op"].get(name)
+        return old is not None and (ns / old - 1) * 100 > args.threshold and ns - old > args.min_delta_ns
+
+    res = run_micro(args.size, args.repeat, out=lambda *a: None, suspect=regressed)
+    worse = []
+    print(f"  {'funkce':<28} {'baseline':>12} {'teď':>12} {'změna':>8}")
+    for name, ns in res.items():
+        old = base["ns_per_op"].get(name)
+        if old is None:
+            print(f"  {name:<28} {'–':>12} {_fmt_ns(ns):>12}     nová")
+            continue
+        change = (ns / old - 1) * 100
+        bad = regressed(name, ns)
+        worse += [name] if bad else []
+        print(f"  {name:<28} {_fmt_ns(old):>12} {_fmt_ns(ns):>12} {change:>+7.0f}%" + ("  REGRESE" if bad else ""))
+    if worse:
+        print(f"Pomalejší o víc než {args.threshold:g} %: {', '.join(worse)}")
+        return 1
+    print(f"OK – žádná funkce není pomalejší o víc než {args.threshold:g} %")
+    return 0
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="benchmarky stis_uploader")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("teams", help="index tabulky Teams na velkém setup sešitu")
+    t.add_argument("--sheets", type=int, default=30)
+    t.add_argument("--teams", type=int, default=200)
+    t.set_defaults(fn=bench_teams)
+    x = sub.add_parser("xlsx", help="workbook stage (config + zdroj) – fast vs openpyxl")
+    x.add_argument("--sheets", type=int, default=20)
+    x.add_argument("--rows", type=int, default=3000)
+    x.add_argument("--repeat", type=int, default=3)
+    x.set_defaults(fn=bench_xlsx)
+    r = sub.add_parser("replay", help="celý běh z HAR (--record-har) – fáze bez síťové latence")
+    r.add_argument("--xlsx", required=True)
+    r.add_argument("--team", required=True)
+    r.add_argument("--har", required=True)
+    r.add_argument("-n", type=int, default=5)
+    r.set_defaults(fn=bench_replay)
+    b = sub.add_parser("bulk", help="parse/validate mnoha sešitů – škálování podle počtu procesů")
+    b.add_argument("--files", type=int, default=64)
+    b.add_argument("--sheets", type=int, default=2)
+    b.add_argument("--rows", type=int, default=500)
+    b.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4, 8])
+    b.add_argument("--engine", choices=su.XLSX_ENGINES, default="openpyxl")
+    b.set_defaults(fn=bench_bulk)
+    i = sub.add_parser("importtime", help="doba `import stis_uploader` (-X importtime) + hlídání líných importů")
+    i.add_argument("--repeat", type=int, default=5)
+    i.add_argument("--top", type=int, default=10)
+    i.add_argument("--max-ms", type=float, default=None, help="návratový kód 1, když medián překročí limit")
+    i.set_defaults(fn=bench_importtime)
+    for name, fn, help_ in (("micro", bench_micro, "mikrobenchmarky horkých funkcí (ns/operaci)"),
+                            ("compare", bench_compare, "micro proti bench_baseline.json – exit 1 při regresi")):
+        m = sub.add_parser(name, help=help_)
+        m.add_argument("--size", choices=MICRO_SIZES, default="club")
+        m.add_argument("--repeat", type=int, default=5)
+        m.add_argument("--baseline", default=str(BASELINE_FILE))
+        if name == "micro":
+            m.add_argument("--save", action="store_true", help="ulož výsledek jako baseline pro tuto velikost")
+        else:
+            m.add_argument("--threshold", type=float, default=25.0, help="povolené zpomalení v %% (výchozí 25)")
+            m.add_argument("--min-delta-ns", type=float, default=50.0,
+                           help="menší absolutní zpomalení na operaci se nepočítá (výchozí 50 ns)")
+        m.set_defaults(fn=fn)
+    args = p.parse_args(argv)
+    return args.fn(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
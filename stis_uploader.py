@@ -1,13 +1,29 @@
 # stis_uploader.py
-import argparse, os, re, sys, time, shutil
+import argparse, os, re, sys, time, shutil, json
+import hashlib
 import unicodedata
+import functools
+import contextlib
+import threading
+import weakref
+import math
+import platform
+import sqlite3
+import zipfile
+import xml.etree.ElementTree as ET
 import traceback
+import io
+import html
+import urllib.parse
 import ctypes
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from openpyxl import load_workbook
-from playwright.sync_api import sync_playwright
-from playwright.sync_api import TimeoutError as PwTimeout
+# openpyxl, playwright, concurrent.futures, cProfile/pstats se importují až ve fázi, která je
+# potřebuje (load_workbook / sync_playwright / bulk_process / --profile): start EXE, chyba
+# argumentů, report, enqueue ani čtení přes FastXlsx za jejich import (~150 ms) neplatí.
+# Hlídá to `python bench_stis.py importtime`.
+
+__version__ = "1.1.0"
 
 # --- rychlé timeouty (ms) pro výběr hráčů ---
 FAST_CLICK_MS   = 400
@@ -15,10 +31,102 @@ FAST_FOCUS_MS   = 300
 FAST_MENU_MS    = 700   # čekání na zobrazení autocomplete
 FAST_PAUSE_MS   = 80
 MAX_PER_NAME_MS = 1500  # tvrdý strop ~1.5 s na 1 jméno
+VERIFY_ROUNDS   = 1     # kolikrát po kontrole znovu vyplnit nesedící buňky/sety (verify_online)
+SAVE_TIMEOUT_MS = 15000 # 'Uložit změny': max. čekání na odpověď serveru (save_online)
+SAVE_ATTEMPTS   = 3     # pokusy při HTTP 5xx / bez odpovědi; odmítnutí serverem se neopakuje
+SAVE_BACKOFF_MS = 1000  # pauza před 2. pokusem, pak dvojnásobek
+SAVE_ERROR_SEL  = ".exception"   # chybová hláška STIS na stránce po odeslání
 AFTER_SELECT_SLEEP_MS = 60
-
-DIAG_DIR = Path(os.getcwd()) / "stis_diag"
-DIAG_DIR.mkdir(exist_ok=True)
+LEADER_MENU_MS  = 1500  # menu vedoucích (serverový autocomplete)
+
+# --- adaptivní timeouty: naučené z latencí minulých běhů (p95 × rezerva, s podlahou a stropem) ---
+# operace -> (globál, který přepisuje, podlaha ms, strop ms)
+ADAPTIVE_OPS = {
+    "click":        ("FAST_CLICK_MS",         150, 2000),
+    "focus":        ("FAST_FOCUS_MS",         100, 1500),
+    "menu":         ("FAST_MENU_MS",          250, 3000),
+    "after_select": ("AFTER_SELECT_SLEEP_MS",  30,  400),
+    "leader_menu":  ("LEADER_MENU_MS",        400, 4000),
+}
+LATENCY_FILE        = "stis_latency.json"
+LATENCY_WINDOW      = 200   # kolik posledních vzorků na operaci držíme
+LATENCY_MIN_SAMPLES = 20    # pod tímhle počtem platí ruční konstanta
+LATENCY_MARGIN      = 1.5
+
+STRATEGY_FILE       = "stis_strategies.json"   # naučené pořadí lokátorů/fallbacků (viz StrategyCache)
+STRATEGY_MAX_KEYS   = 200                      # kolik otisků stránek si pamatujeme
+MATCH_URLS_FILE     = "stis_match_urls.json"   # přímé URL formulářů (zapis_start/online ?u=) podle družstva a data
+MATCH_URLS_KEEP_D   = 30                       # starší zápasy se z cache mažou
+
+# --- časové rozpočty (ms): buňka ⊂ fáze ⊂ celý běh ---
+LEADER_BUDGET_MS = 5000            # výběr jednoho vedoucího (autocomplete je pomalejší)
+RUN_BUDGET_MS    = 6 * 60 * 1000   # celý běh bez ruční kontroly na konci
+PHASE_BUDGET_MS  = {
+    "launch":     60000,
+    "login":      30000,
+    "team_page":  25000,
+    "open_form":  25000,
+    "start_form": 20000,
+    "submit":     50000,
+    "online":    180000,
+}
+
+# metriky pro node-exporter (textfile collector): --metrics-dir nebo proměnná prostředí
+METRICS_DIR_ENV = "STIS_METRICS_DIR"
+METRICS_PREFIX  = "stis_uploader"                      # soubor stis_uploader_<ID družstva>.prom
+CELL_PATHS      = ("roster", "cell", "select", "autocomplete", "surname")
+
+HISTORY_FILE    = "stis_history.sqlite"                # historie běhů ve state_dir() (viz report)
+
+# HAR záznam/přehrání: v uloženém HAR jsou místo přihlašovacích údajů tyto placeholdery
+HAR_LOGIN       = "stis-har-login"
+HAR_PASSWORD    = "stis-har-heslo"
+
+STIS_LOGIN_URL  = "https://registr.ping-pong.cz/htm/auth/login.php"
+STIS_TEAM_URL   = "https://registr.ping-pong.cz/htm/auth/klub/druzstva/vysledky/?druzstvo={id}"
+
+# souběžné zápasy v jednom contextu (viz BrowserSession / SessionGate)
+# --lite: úsporné spuštění Chromia (staré notebooky, 1GB VPS) + hlídání RSS prohlížeče
+LITE_CHROMIUM_ARGS = (
+    "--disable-extensions", "--disable-gpu", "--disable-dev-shm-usage",
+    "--disable-background-networking", "--disable-component-update", "--disable-default-apps",
+    "--disable-sync", "--no-first-run", "--mute-audio", "--process-per-site",
+    "--renderer-process-limit=2", "--js-flags=--max-old-space-size=128",
+    "--disk-cache-size=1", "--media-cache-size=1", "--aggressive-cache-discard",
+    "--blink-settings=imagesEnabled=false",   # formuláře STIS obrázky nepotřebují
+    "--disable-features=Translate,MediaRouter,OptimizationHints,BackForwardCache",
+)
+LITE_VIEWPORT = {"width": 1024, "height": 720}
+RSS_SAMPLE_S  = 2.0    # interval vzorkování RSS stromu procesů prohlížeče
+
+# registr.ping-pong.cz: limit navigací / odeslání formulářů a jistič proti pomalému serveru
+REGISTR_HOST       = "registr.ping-pong.cz"
+RATE_PER_S         = 2.0     # průměrně navigací/POSTů za sekundu (všechny zápasy procesu dohromady)
+RATE_BURST         = 4       # kolik jich smí jít hned za sebou
+BREAKER_TRIP       = 3       # po tolika pomalých/chybných načteních za sebou se jistič rozpojí
+BREAKER_SLOW_MS    = 8000    # načtení delší než tohle = „pomalé“
+BREAKER_COOLDOWN_S = 60      # jak dlouho rozpojený jistič odmítá; pak jeden zkušební požadavek
+SERIAL_STEPS    = ("start_form",)   # zapis_start.php → odeslat: rozpracovaný zápis je v PHP session
+POLL_SLICE_MS   = 50                # čekání na síť po úsecích, mezi nimi běží ostatní zápasy
+
+# --watch: sledování složky se sešity (polling – funguje i na síťovém disku)
+WATCH_STATE_FILE = "stis_watch.json"   # ve state_dir(): hash dat posledního úspěšného nahrání
+WATCH_POLL_S     = 2.0                 # interval kontroly složky
+WATCH_DEBOUNCE_S = 5.0                 # soubor se zpracuje až po tolika sekundách bez změny
+WATCH_RELOGIN_S  = 20 * 60             # po takové nečinnosti se před dalším zápasem znovu přihlásí
+
+# export-roster: soupisky ze STIS do sešitu → jména přesně jako v STIS a výběr rovnou podle ID
+ROSTER_SHEET     = "hraci"
+# pozor: hlavička nesmí vypadat jako tabulka Teams ('Družstvo' + 'DruzstvoID'), viz _is_teams_header
+ROSTER_HEADER    = ("Tým", "Tým ID", "Typ", "Strana", "Jméno", "STIS ID", "Text v STIS")
+ROSTER_AC_TERMS  = ("",) + tuple("abcčdefghijklmnoprřsštuvzž")   # dotazy na URL zdroj autocomplete
+
+# fronta úloh (enqueue / worker) – víc kliknutí na „nahrát“ = jeden běh s nejnovější verzí
+QUEUE_FILE       = "stis_queue.sqlite"
+QUEUE_POLL_S     = 2.0
+QUEUE_MAX_TRIES  = 3                   # kolikrát se znovu zařadí úloha po pádu workeru
+
+DIAG_DIR = Path(os.getcwd()) / "stis_diag"   # vytváří se až při prvním diagnostickém výpisu
 
 # kde EXE skutečně leží
 EXE_DIR = Path(sys.argv[0]).resolve().parent
@@ -34,16 +142,663 @@ ZDROJ_SHEET             = "zdroj"
 ZDROJ_FIRST_SINGLE_ROW  = 7     # první řádek singlů (D/E = jména, I—M = sety)
 SINGLES_COUNT           = 16    # kolik singlů se vyplňuje (2..17)
 
+# --- čtení XLSX: "fast" = FastXlsx (zip + iterparse jen potřebných řádků),
+#     "openpyxl" = load_workbook; fast při jakékoli chybě spadne na openpyxl ---
+XLSX_ENGINES = ("fast", "openpyxl")
+XLSX_ENGINE  = "fast"
+
+class PwTimeout(Exception):
+    """Zástupce playwright TimeoutError; sync_playwright() ho přepíše skutečnou třídou (dřív nic z Playwright neběží)."""
+
+def sync_playwright():
+    """playwright.sync_api.sync_playwright() s importem až při startu prohlížeče."""
+    global PwTimeout
+    from playwright.sync_api import sync_playwright as _sync_playwright, TimeoutError as PwTimeout
+    return _sync_playwright()
+
+def load_workbook(*args, **kwargs):
+    """openpyxl.load_workbook s importem až při prvním použití (fallback / engine openpyxl)."""
+    from openpyxl import load_workbook as _load_workbook
+    return _load_workbook(*args, **kwargs)
+
+# --- layouty soutěží: mapování list "zdroj" → online formulář ---
+# Layout je čistě deklarativní. Nový formát soutěže = nový záznam buď tady,
+# nebo v stis_layouts.json (vedle EXE / XLSX / v pracovním adresáři).
+# doubles: každá čtyřhra zabírá `rows` řádků (hráči pod sebou, sety na posledním řádku)
+# events:  nepovinný explicitní seznam indexů .event (když jsou čtyřhry uprostřed)
+DEFAULT_LAYOUT = "default"
+LAYOUTS_FILE   = "stis_layouts.json"
+DOM_PLAYER_TARGETS = {
+    "home1": "#{id} .cell-player:first-child",
+    "away1": "#{id} .cell-player:last-child",
+    "home2": "#{id} + .cell-players .cell-player:first-child",
+    "away2": "#{id} + .cell-players .cell-player:last-child",
+    "home":  "#{id} .cell-player:first-child",
+    "away":  "#{id} .cell-player:last-child",
+}
+LAYOUTS = {
+    DEFAULT_LAYOUT: {                  # 2 čtyřhry + 16 singlů (D2:M22)
+        "sheet":    ZDROJ_SHEET,
+        "home_col": "D",
+        "away_col": "E",
+        "set_cols": ["I", "J", "K", "L", "M"],
+        "doubles":  {"first_row": 2, "rows": 2, "count": 2,
+                     "dom_prefix": "c", "dom_first": 0, "event_first": 0},
+        "singles":  {"first_row": ZDROJ_FIRST_SINGLE_ROW, "count": SINGLES_COUNT,
+                     "dom_prefix": "d", "dom_first": 0, "event_first": 2},
+    },
+}
+
 from pathlib import Path
 import os, sys, shutil
+
+def state_dir() -> Path:
+    """Lokální adresář pro stav mezi běhy (latence, historie…); vytvoří se až při prvním použití."""
+    if os.environ.get("STIS_STATE_DIR"):
+        d = Path(os.environ["STIS_STATE_DIR"])
+    else:
+        d = Path(os.environ.get("LOCALAPPDATA") or Path.home() / ".local" / "share") / "stis-uploader"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def _percentile(sorted_vals, q):
+    # nearest-rank percentil nad už seřazeným seznamem
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+class LatencyStore:
+    """
+    Klouzavé okno latencí (ms) po operacích, uložené v JSON mezi běhy.
+    Timeout operace = p95 × LATENCY_MARGIN oříznutý na [podlaha, strop] z ADAPTIVE_OPS;
+    dokud není LATENCY_MIN_SAMPLES vzorků, platí ruční konstanta.
+    Timeout (miss) se zapisuje jako vzorek = použitý timeout, takže pomalý večer
+    posune naučenou hodnotu nahoru.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else state_dir() / LATENCY_FILE
+        self.samples = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.samples = {k: [float(x) for x in v][-LATENCY_WINDOW:]
+                            for k, v in (data.get("samples") or {}).items()}
+        except FileNotFoundError:
+            pass
+        except Exception:
+            self.samples = {}       # poškozený soubor → začni znovu
+
+    def record(self, op, ms):
+        w = self.samples.setdefault(op, [])
+        w.append(round(float(ms), 1))
+        del w[:-LATENCY_WINDOW]
+
+    def learned(self, op, default):
+        """(timeout ms, p95 nebo None, počet vzorků)."""
+        _glob, floor, ceil = ADAPTIVE_OPS[op]
+        vals = sorted(self.samples.get(op) or [])
+        if len(vals) < LATENCY_MIN_SAMPLES:
+            return int(default), None, len(vals)
+        p95 = _percentile(vals, 0.95)
+        return int(min(ceil, max(floor, p95 * LATENCY_MARGIN))), p95, len(vals)
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated": datetime.now().isoformat(timespec="seconds"),
+                       "samples": self.samples}, f)
+        os.replace(tmp, self.path)
+
+_LATENCY = None          # LatencyStore aktuálního běhu (None = neměříme)
+_ADAPTIVE_DEFAULTS = {}  # původní ruční konstanty (před přepsáním naučenými)
+
+def apply_adaptive_timeouts(store, log):
+    """Přepíše FAST_* globály naučenými hodnotami (funkce je čtou přes globals()) a zaloguje je."""
+    global _LATENCY
+    _LATENCY = store
+    g = globals()
+    for op, (name, _floor, _ceil) in ADAPTIVE_OPS.items():
+        default = _ADAPTIVE_DEFAULTS.setdefault(name, g[name])
+        ms, p95, n = store.learned(op, default)
+        g[name] = ms
+        src = f"p95={p95:.0f} ms × {LATENCY_MARGIN}, n={n}" if p95 is not None else f"výchozí, n={n}"
+        log(f"  timeout {op:<12} = {ms:>5} ms  ({src})")
+
+@contextlib.contextmanager
+def _timed_op(op, timeout_ms=None):
+    """Změří operaci Playwright do _LATENCY; timeout se zapíše jako cenzurovaný vzorek = timeout_ms."""
+    t0 = time.monotonic()
+    try:
+        yield
+    except PwTimeout:
+        if _LATENCY is not None and timeout_ms:
+            _LATENCY.record(op, timeout_ms)
+        raise
+    if _LATENCY is not None:
+        _LATENCY.record(op, (time.monotonic() - t0) * 1000)
+
+class StrategyCache:
+    """
+    Naučené pořadí strategií (lokátory, fallbacky) pro druh stránky + otisk DOM (page_fingerprint).
+    Pořadí: naposledy úspěšné → nezkoušené (ve výchozím pořadí) → neúspěšné. Stabilní web tak
+    trefí hned první pokus; strategie, která přestala fungovat, spadne dozadu.
+    Ukládá se v state_dir()/STRATEGY_FILE na konci běhu.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else state_dir() / STRATEGY_FILE
+        self.data = {}      # "druh|otisk" -> {strategie: [ok/fail, čas]}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f).get("strategies") or {}
+        except FileNotFoundError:
+            pass
+        except Exception:
+            self.data = {}
+
+    def order(self, kind, fp, names):
+        seen = self.data.get(f"{kind}|{fp}") or {}
+        def rank(item):
+            i, n = item
+            st, ts = seen.get(n, (None, 0))
+            return (0 if st == "ok" else 2 if st == "fail" else 1, -ts if st == "ok" else 0, i)
+        return [n for _i, n in sorted(enumerate(names), key=rank)]
+
+    def record(self, kind, fp, name, ok):
+        self.data.setdefault(f"{kind}|{fp}", {})[name] = ["ok" if ok else "fail", round(time.time(), 1)]
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        # nejstarší otisky pryč (web se změnil → staré klíče už nikdy nepadnou)
+        keys = sorted(self.data, key=lambda k: max(v[1] for v in self.data[k].values()) if self.data[k] else 0)
+        for k in keys[:max(0, len(keys) - STRATEGY_MAX_KEYS)]:
+            del self.data[k]
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated": datetime.now().isoformat(timespec="seconds"), "strategies": self.data},
+                      f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+_STRATEGIES = None   # StrategyCache – načte se až při prvním použití
+
+def strategies():
+    global _STRATEGIES
+    if _STRATEGIES is None:
+        _STRATEGIES = StrategyCache()
+    return _STRATEGIES
+
+_FINGERPRINT_JS = """
+() => {
+  const names = new Set();
+  for (const el of document.querySelectorAll('select[name], input[name]')) {
+    names.add(el.tagName[0] + ':' + el.name.replace(/\\d+/g, '#'));
+    if (names.size >= 60) break;
+  }
+  const has = s => document.querySelector(s) ? 1 : 0;
+  const editor = has('.cell-player'), widget = has('select.player') || has('input.ui-autocomplete-input, input.ac_input');
+  return {fp: [location.pathname, [...names].sort().join(','),
+               has("a[href*='zapis_start.php?u=']"), has("a[href*='online.php?u=']"),
+               editor, has('select.player'), has('input.ui-autocomplete-input, input.ac_input')].join('|'),
+          // editor bez výběrových prvků se teprve staví (select vzniká až po kliku) → otisk necachovat
+          settled: document.readyState === 'complete' && (!editor || widget)};
+}
+"""
+FINGERPRINT_MAX_PAGES = 32   # víc otevřených stránek nemá ani souběh zápasů; pak se cache vyprázdní
+FINGERPRINT_MAX_PATHS = 16   # cest (URL bez dotazu) na jednu stránku
+_FINGERPRINTS = weakref.WeakKeyDictionary()   # stránka -> {cesta: otisk}; zavřená stránka se maže
+
+def _forget_page(page):
+    _FINGERPRINTS.pop(page, None)
+
+def page_fingerprint(page):
+    """
+    Levný otisk DOM (cesta, jména polí, přítomnost klíčových prvků) → krátký hash.
+    Cachuje se po stránce a cestě URL (?u=… se mezi zápasy liší, DOM ne), jen když je DOM
+    hotový; --watch/worker: zavřená stránka vypadne (close / weakref) a velikost je omezená.
+    """
+    path = urllib.parse.urlsplit(page.url).path
+    per_page = _FINGERPRINTS.get(page)
+    if per_page is not None and path in per_page:
+        return per_page[path]
+    try:
+        res = page.evaluate(_FINGERPRINT_JS)
+        raw, settled = res["fp"], res["settled"]
+    except Exception:
+        raw, settled = path, False
+    fp = hashlib.sha1(str(raw).encode("utf-8")).hexdigest()[:12]
+    if settled:
+        if per_page is None:
+            if len(_FINGERPRINTS) >= FINGERPRINT_MAX_PAGES:
+                _FINGERPRINTS.clear()
+            per_page = _FINGERPRINTS[page] = {}
+            try:
+                page.once("close", lambda _p: _forget_page(page))
+            except Exception:
+                pass
+        if len(per_page) >= FINGERPRINT_MAX_PATHS:
+            per_page.clear()
+        per_page[path] = fp
+    return fp
+
+class BudgetExceeded(RuntimeError):
+    """Vyčerpaný časový rozpočet (buňka / fáze / běh) – přeruší zbytek fallback řetězce."""
+
+class Budget:
+    """
+    Deadline s rozpočtem v ms. Vnořený rozpočet (child) nikdy nepřesáhne rodiče,
+    takže buňka skončí nejpozději s fází a fáze nejpozději s během.
+    - ms(cap)  → timeout pro Playwright = min(cap, zbývá), vždy ≥ 1 (0 = „bez limitu“!)
+    - check()  → před dalším fallbackem; po deadlinu zapíše overrun a vyhodí BudgetExceeded
+    - finish() → na konci úseku zapíše overrun, pokud trval déle než limit
+    - overrun() → ruční zápis (když volající fallback sám přeskočí)
+    Overruny se sbírají v kořenovém rozpočtu (viz RunStats).
+    """
+
+    def __init__(self, name, limit_ms=None, parent=None):
+        self.name = name
+        self.limit_ms = limit_ms
+        self.parent = parent
+        self.t0 = time.monotonic()
+        own = self.t0 + limit_ms / 1000 if limit_ms else None
+        up = parent.deadline if parent else None
+        self.deadline = min(d for d in (own, up) if d is not None) if (own or up) else None
+        self.overruns = parent.overruns if parent else []
+        self._noted = False
+
+    def child(self, name, limit_ms=None):
+        return Budget(name, limit_ms, parent=self)
+
+    def elapsed_ms(self) -> int:
+        return int((time.monotonic() - self.t0) * 1000)
+
+    def remaining_ms(self):
+        if self.deadline is None:
+            return None
+        return int((self.deadline - time.monotonic()) * 1000)
+
+    @property
+    def expired(self) -> bool:
+        rem = self.remaining_ms()
+        return rem is not None and rem <= 0
+
+    def ms(self, cap=None) -> int:
+        rem = self.remaining_ms()
+        if rem is None:
+            return int(cap) if cap is not None else 0
+        return max(1, min(int(cap), rem) if cap is not None else rem)
+
+    def overrun(self, what):
+        if not self._noted:
+            self._noted = True
+            self.overruns.append({"budget": self.name, "at": what,
+                                  "elapsed_ms": self.elapsed_ms(), "limit_ms": self.limit_ms})
+
+    def check(self, what=""):
+        if self.expired:
+            self.overrun(what)
+            raise BudgetExceeded(f"{self.name}: {what} po {self.elapsed_ms()} ms (limit {self.limit_ms} ms)")
+
+    def finish(self, what="konec"):
+        if self.limit_ms and self.elapsed_ms() > self.limit_ms:
+            self.overrun(what)
+
+class RunStats:
+    """
+    Souhrn jednoho běhu: časy fází a překročené rozpočty. Fáze = `with run.phase("login") as b:`,
+    kde `b` je rozpočet fáze (child kořenového rozpočtu běhu). Na konci main() → log_summary().
+    """
+
+    def __init__(self, budget_ms=RUN_BUDGET_MS):
+        self.budget = Budget("run", budget_ms)
+        self.started_at = time.time()
+        self.phases = {}     # fáze -> ms
+        self.cpu = {}        # fáze -> ms CPU Pythonu (process_time); zbytek = čekání na prohlížeč/síť
+        self.limits = {}     # fáze -> rozpočet ms
+        self.cells = []      # výsledky hráčských buněk (viz _fill_player_by_click)
+        self.verify = None   # výsledek kontroly před uložením (viz verify_online)
+        self.save = None     # výsledek 'Uložit změny' (viz save_online)
+        self.editor_ms = None   # od vzniku úlohy po otevřený online editor (time-to-editor)
+        self.submit_retries = 0
+        self.ok = False
+        self.finished_at = None   # unix čas konce (pro metriky)
+        self.rss_peak_mb = None   # RSS prohlížeče (driver + Chromium) během zápasu, viz RssSampler
+        self.rss_end_mb = None
+        self.duration_ms = None   # délka bez čekání na ruční zavření okna
+
+    def finish(self, ok=None):
+        if ok is not None:
+            self.ok = ok
+        self.finished_at = time.time()
+        self.duration_ms = self.budget.elapsed_ms()
+
+    @contextlib.contextmanager
+    def phase(self, name, limit_ms=None):
+        b = self.budget.child(name, limit_ms if limit_ms is not None else PHASE_BUDGET_MS.get(name))
+        c0 = time.process_time()
+        try:
+            yield b
+        finally:
+            b.finish()
+            self.phases[name] = self.phases.get(name, 0) + b.elapsed_ms()
+            self.cpu[name] = self.cpu.get(name, 0) + int((time.process_time() - c0) * 1000)
+            self.limits[name] = b.limit_ms
+
+    @property
+    def overruns(self):
+        return self.budget.overruns
+
+    def cell_counts(self):
+        """({status: počet}, {cesta: počet selhaných})."""
+        by_status, failed = {}, dict.fromkeys(CELL_PATHS, 0)
+        for c in self.cells:
+            by_status[c["status"]] = by_status.get(c["status"], 0) + 1
+            if c["status"] == "failed":
+                failed[c["path"]] = failed.get(c["path"], 0) + 1
+        return by_status, failed
+
+    def log_summary(self, log):
+        log("---- souhrn běhu ----")
+        log(f"Celkem: {self.budget.elapsed_ms()} ms (rozpočet {self.budget.limit_ms} ms)")
+        if self.editor_ms is not None:
+            log(f"Do online editoru: {self.editor_ms} ms")
+        for name, ms in self.phases.items():
+            limit = self.limits.get(name)
+            log(f"  fáze {name:<11} {ms:>7} ms" + (f"  / {limit} ms" if limit else "")
+                + f"  (CPU Pythonu {self.cpu.get(name, 0)} ms)")
+        if self.cells:
+            by_status, failed = self.cell_counts()
+            log("Buňky: " + ", ".join(f"{k}={v}" for k, v in sorted(by_status.items()))
+                + "; selhání podle cesty: " + ", ".join(f"{k}={v}" for k, v in failed.items()))
+        if self.verify is not None:
+            log(f"Kontrola před uložením: rozdílů {len(self.verify['diff'])}, znovu vyplněno "
+                f"{self.verify['retried']}, nesedí {len(self.verify['left'])}")
+        if self.save is not None:
+            log(f"Uložení: {self.save['status']} po {self.save['attempts']} pokusech, {self.save['ms']} ms"
+                + (f" – {self.save['message']}" if self.save.get("message") else ""))
+        if self.submit_retries:
+            log(f"Opakování 'odeslat': {self.submit_retries}")
+        if self.rss_peak_mb is not None:
+            log(f"Paměť prohlížeče (RSS): špička {self.rss_peak_mb} MB, po zápase {self.rss_end_mb} MB")
+        if self.overruns:
+            log(f"Překročené rozpočty: {len(self.overruns)}")
+            for o in self.overruns:
+                log(f"  ⏱ {o['budget']} ({o['at']}): {o['elapsed_ms']} ms / limit {o['limit_ms']} ms")
+        else:
+            log("Překročené rozpočty: žádné")
+
+def _prom_labels(labels):
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}" if labels else ""
+
+def render_metrics(run, labels):
+    """
+    RunStats → text OpenMetrics (čitelný i pro textfile collector node-exporteru).
+    Všechno jsou gauge „poslední běh“ – každý běh soubor přepíše celý;
+    `labels` (družstvo) se přidají ke každé řádce.
+    """
+    lines = []
+    def metric(name, help_, samples):
+        lines.append(f"# HELP {name} {help_}")
+        lines.append(f"# TYPE {name} gauge")
+        for extra, v in samples:
+            lines.append(f"{name}{_prom_labels({**labels, **extra})} {v}")
+
+    by_status, failed = run.cell_counts()
+    metric("stis_run_success", "1 = poslední běh doběhl do konce (online editor vyplněn)",
+           [({}, int(run.ok))])
+    metric("stis_run_timestamp_seconds", "Unix čas konce posledního běhu",
+           [({}, f"{run.finished_at or time.time():.3f}")])
+    metric("stis_run_duration_seconds", "Délka posledního běhu",
+           [({}, f"{(run.duration_ms if run.duration_ms is not None else run.budget.elapsed_ms()) / 1000:.3f}")])
+    metric("stis_phase_duration_seconds", "Délka fáze posledního běhu",
+           [({"phase": k}, f"{ms / 1000:.3f}") for k, ms in run.phases.items()])
+    metric("stis_browser_launch_seconds", "Spuštění prohlížeče (fáze launch)",
+           [({}, f"{run.phases.get('launch', 0) / 1000:.3f}")])
+    if run.editor_ms is not None:
+        metric("stis_time_to_editor_seconds", "Od startu úlohy po otevřený online editor",
+               [({}, f"{run.editor_ms / 1000:.3f}")])
+    metric("stis_cells_filled", "Hráčské buňky vyplněné a ověřené",
+           [({}, by_status.get("filled", 0))])
+    metric("stis_cells_mismatch", "Hráčské buňky vybrané, ale se zobrazeným jiným jménem",
+           [({}, by_status.get("mismatch", 0))])
+    metric("stis_cells_skipped", "Hráčské buňky přeskočené kvůli rozpočtu fáze",
+           [({}, by_status.get("skipped", 0))])
+    metric("stis_cells_failed", "Hráčské buňky, které selhaly, podle poslední zkoušené cesty",
+           [({"path": k}, v) for k, v in failed.items()])
+    metric("stis_submit_retries", "Opakování smyčky 'odeslat' (úvodní formulář)",
+           [({}, run.submit_retries)])
+    metric("stis_budget_overruns", "Překročené časové rozpočty",
+           [({}, len(run.overruns))])
+    if run.rss_peak_mb is not None:
+        metric("stis_browser_rss_peak_bytes", "Špička RSS prohlížeče (driver + Chromium) během zápasu",
+               [({}, run.rss_peak_mb * 1024 * 1024)])
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+def write_metrics(run, metrics_dir, labels, log):
+    """Atomicky zapíše <metrics_dir>/stis_uploader_<družstvo>.prom (collector nikdy nevidí půlku souboru)."""
+    d = Path(metrics_dir)
+    d.mkdir(parents=True, exist_ok=True)
+    tag = re.sub(r"[^0-9A-Za-z_-]+", "_", str(labels.get("team_id") or labels.get("team") or "")).strip("_")
+    path = d / (f"{METRICS_PREFIX}_{tag}.prom" if tag else f"{METRICS_PREFIX}.prom")
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")   # collector čte jen *.prom
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write(render_metrics(run, labels))
+    os.replace(tmp, path)
+    log("Metriky zapsány:", path)
+    return path
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,          -- unix čas startu
+    team TEXT, team_id TEXT, layout TEXT,
+    version TEXT, playwright TEXT, browser TEXT, python TEXT, host TEXT,
+    mode TEXT,                      -- live / record / replay
+    ok INTEGER NOT NULL, error TEXT,
+    duration_ms INTEGER, submit_retries INTEGER, rss_peak_mb INTEGER,
+    editor_ms INTEGER,              -- time-to-editor (RunStats.editor_ms)
+    startup TEXT                    -- pipe / seq (viz --no-pipeline)
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs(id), phase TEXT NOT NULL, ms INTEGER, limit_ms INTEGER
+);
+CREATE TABLE IF NOT EXISTS cells (
+    run_id INTEGER NOT NULL REFERENCES runs(id), key TEXT, field TEXT,
+    path TEXT, status TEXT, reason TEXT, ms INTEGER
+);
+CREATE TABLE IF NOT EXISTS overruns (
+    run_id INTEGER NOT NULL REFERENCES runs(id), budget TEXT, at TEXT, elapsed_ms INTEGER, limit_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS phases_run ON phases(run_id);
+CREATE INDEX IF NOT EXISTS cells_run ON cells(run_id);
+"""
+
+HISTORY_COLUMNS = {"runs": {"mode": "TEXT", "rss_peak_mb": "INTEGER", "editor_ms": "INTEGER", "startup": "TEXT"}}   # sloupce přidané později → ALTER TABLE u starších databází
+
+def open_history(path=None):
+    p = Path(path) if path else state_dir() / HISTORY_FILE
+    con = sqlite3.connect(str(p), timeout=10)
+    con.executescript(HISTORY_SCHEMA)
+    for table, cols in HISTORY_COLUMNS.items():
+        have = {row[1] for row in con.execute(f"PRAGMA table_info({table})")}
+        for col, decl in cols.items():
+            if col not in have:
+                con.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+    return con
+
+def _playwright_version():
+    try:
+        from importlib.metadata import version
+        return version("playwright")
+    except Exception:
+        return None
+
+def record_run(run, meta, path=None):
+    """Zapíše jeden běh (RunStats + meta: team, team_id, layout, browser, startup, error) do historie; vrací id běhu."""
+    con = open_history(path)
+    try:
+        with con:
+            cur = con.execute(
+                "INSERT INTO runs (started, team, team_id, layout, version, playwright, browser, python, host,"
+                " mode, ok, error, duration_ms, submit_retries, rss_peak_mb, editor_ms, startup)"
+                " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (run.started_at, meta.get("team"), meta.get("team_id"), meta.get("layout"),
+                 __version__, _playwright_version(), meta.get("browser"), sys.version.split()[0],
+                 platform.node(), meta.get("mode", "live"),
+                 int(run.ok), meta.get("error"),
+                 run.duration_ms if run.duration_ms is not None else run.budget.elapsed_ms(), run.submit_retries,
+                 run.rss_peak_mb, run.editor_ms, meta.get("startup")))
+            rid = cur.lastrowid
+            con.executemany("INSERT INTO phases VALUES (?,?,?,?)",
+                            [(rid, k, ms, run.limits.get(k)) for k, ms in run.phases.items()])
+            con.executemany("INSERT INTO cells VALUES (?,?,?,?,?,?,?)",
+                            [(rid, c.get("key"), c.get("field"), c.get("path"), c.get("status"),
+                              c.get("reason"), c.get("ms")) for c in run.cells])
+            con.executemany("INSERT INTO overruns VALUES (?,?,?,?,?)",
+                            [(rid, o["budget"], o["at"], o["elapsed_ms"], o["limit_ms"]) for o in run.overruns])
+        return rid
+    finally:
+        con.close()
+
+def _med_change(a, b):
+    """Změna mediánu okna B proti oknu A v % (None = v jednom z oken nejsou data)."""
+    if not a or not b:
+        return None
+    ma, mb = _percentile(sorted(a), 0.5), _percentile(sorted(b), 0.5)
+    return (mb - ma) / ma * 100 if ma else None
+
+def history_report(args, out=print):
+    """
+    Výpis z historie běhů: percentily fází, selhání buněk podle cesty, nejčastější
+    důvody, nejpomalejší kroky a srovnání dvou oken (A = starší, B = novější).
+    Okna dělí --split (datum nebo verze uploaderu), jinak půlka vybraných běhů.
+    """
+    con = open_history(args.history)
+    try:
+        where, params = ["COALESCE(mode, 'live') = ?"], [args.mode]
+        if args.team:
+            where.append("(team = ? OR team_id = ?)")
+            params += [args.team, args.team]
+        if args.days:
+            where.append("started >= ?")
+            params.append(time.time() - args.days * 86400)
+        sql = "SELECT id, started, version, ok, duration_ms, editor_ms, startup FROM runs WHERE " + " AND ".join(where)
+        sql += " ORDER BY started DESC"
+        if not args.days:
+            sql += " LIMIT ?"
+            params.append(args.last)
+        runs = con.execute(sql, params).fetchall()[::-1]   # chronologicky
+        if not runs:
+            out("Historie neobsahuje žádné běhy pro zadaný výběr.")
+            return
+        ids = {r[0] for r in runs}
+        lo = min(ids)
+        phases = [p for p in con.execute("SELECT run_id, phase, ms FROM phases WHERE run_id >= ?", (lo,)) if p[0] in ids]
+        cells = [c for c in con.execute("SELECT run_id, key, field, path, status, reason, ms FROM cells"
+                                        " WHERE run_id >= ?", (lo,)) if c[0] in ids]
+    finally:
+        con.close()
+
+    started = {r[0]: r[1] for r in runs}
+    when = lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+    # okna A/B
+    if args.split:
+        by_version = [r[1] for r in runs if r[2] == args.split]
+        if by_version:
+            cut, label = min(by_version), f"před verzí {args.split} / od ní"
+        else:
+            try:
+                cut = datetime.fromisoformat(args.split).timestamp()
+            except ValueError:
+                raise RuntimeError(f"--split: '{args.split}' není datum (YYYY-MM-DD) ani verze z historie")
+            label = f"před {args.split} / od {args.split}"
+        win_a = {r[0] for r in runs if r[1] < cut}
+    else:
+        win_a = {r[0] for r in runs[:len(runs) // 2]}
+        label = "starší / novější polovina"
+    in_a = lambda rid: rid in win_a
+
+    versions = {}
+    for r in runs:
+        versions[r[2]] = versions.get(r[2], 0) + 1
+    ok = sum(r[3] for r in runs)
+    out(f"Běhy: {len(runs)} ({when(runs[0][1])} … {when(runs[-1][1])}), úspěšné {ok}/{len(runs)}")
+    out("Verze: " + ", ".join(f"{v or '?'} ({n}×)" for v, n in versions.items()))
+    out(f"Okna A/B: {label} – A {len(win_a)} běhů, B {len(runs) - len(win_a)} běhů")
+
+    # fáze (+ celý běh)
+    series = {"celkem": [(r[0], r[4]) for r in runs if r[4] is not None]}
+    for r in runs:   # time-to-editor zvlášť podle startu (pipeline vs. --no-pipeline)
+        if r[5] is not None:
+            series.setdefault(f"editor/{r[6]}" if r[6] else "editor", []).append((r[0], r[5]))
+    for rid, ph, ms in phases:
+        series.setdefault(ph, []).append((rid, ms))
+    out("")
+    out(f"{'fáze [ms]':<12}{'n':>5}{'p50':>8}{'p90':>8}{'p95':>8}{'max':>8}{'A p50':>9}{'B p50':>9}{'změna':>8}")
+    for ph, vals in series.items():
+        allv = sorted(ms for _rid, ms in vals)
+        a = [ms for rid, ms in vals if in_a(rid)]
+        b = [ms for rid, ms in vals if not in_a(rid)]
+        ch = _med_change(a, b)
+        out(f"{ph:<12}{len(allv):>5}" + "".join(f"{_percentile(allv, q):>8}" for q in (0.5, 0.9, 0.95))
+            + f"{allv[-1]:>8}"
+            + f"{_percentile(sorted(a), 0.5) if a else '-':>9}{_percentile(sorted(b), 0.5) if b else '-':>9}"
+            + (f"{ch:>+7.0f}%" if ch is not None else f"{'-':>8}"))
+
+    # hráčské buňky podle cesty
+    if cells:
+        out("")
+        out(f"{'cesta':<13}{'buněk':>6}{'selhalo':>8}{'A %':>7}{'B %':>7}{'p50 ms':>8}{'p95 ms':>8}")
+        for path in CELL_PATHS + (None,):
+            cs = [c for c in cells if c[3] == path]
+            if not cs:
+                continue
+            rate = lambda xs: f"{100 * sum(c[4] == 'failed' for c in xs) / len(xs):.0f}" if xs else "-"
+            ms = sorted(c[6] for c in cs if c[6] is not None) or [0]
+            out(f"{path or 'přeskočeno':<13}{len(cs):>6}{sum(c[4] == 'failed' for c in cs):>8}"
+                f"{rate([c for c in cs if in_a(c[0])]):>7}{rate([c for c in cs if not in_a(c[0])]):>7}"
+                f"{_percentile(ms, 0.5):>8}{_percentile(ms, 0.95):>8}")
+
+        reasons = {}
+        for c in cells:
+            if c[4] != "filled":
+                k = (c[3], c[4], c[5])
+                reasons[k] = reasons.get(k, 0) + 1
+        if reasons:
+            out("")
+            out("Nejčastější problémy:")
+            for (path, status, reason), n in sorted(reasons.items(), key=lambda kv: -kv[1])[:args.top]:
+                out(f"  {n:>5}×  {status:<9} {path or '-':<13} {reason or ''}")
+
+        out("")
+        out(f"Nejpomalejší kroky (top {args.top}):")
+        for rid, key, field, path, status, reason, ms in sorted(
+                (c for c in cells if c[6] is not None), key=lambda c: -c[6])[:args.top]:
+            out(f"  {ms:>6} ms  {when(started[rid])}  {key}.{field:<6} {path or '-':<13} {status}"
+                + (f" ({reason})" if reason else ""))
+
 _A1COL = {c:i for i,c in enumerate("ABCDEFGHIJKLMNOPQRSTUVWXYZ", start=1)}
+_A1_RE = re.compile(r"([A-Z]+)(\d+)")
+
+@functools.lru_cache(maxsize=1024)
 def a1_to_rc(a1: str):
     """
     'D2' -> (row=2, col=4)
     'I3' -> (3, 9)
+    Výsledek se cachuje – cell_value/row_sets volají stejné adresy pořád dokola.
     """
     a1 = a1.strip().upper()
-    m = re.fullmatch(r"([A-Z]+)(\d+)", a1)
+    m = _A1_RE.fullmatch(a1)
     if not m:
         raise ValueError(f"Bad A1 address: {a1}")
     col_s, row_s = m.groups()
@@ -94,18 +849,22 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
                     log(f"  [leaders] '{cb_name}' zaškrtnuto")
             except Exception:
                 pass
-def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, only_from_club=True):
+def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, only_from_club=True, budget=None,
+                          roster=None):
     """
     Vyplní 'Vedoucí družstev' klikem na položku v autocomplete menu.
+    Vedoucí ze soupisky (`roster`, viz load_roster) se zapíše rovnou: text + hidden ID, bez menu.
     Priorita shody:
       1) přesná shoda CELÉHO textu (když předáš display text přesně jako v menu),
       2) když ne, vybere první položku, jejíž text ZAČÍNÁ na zadané jméno (prefix match),
          např. 'Dvořák Jiří' → 'Dvořák Jiří 1970 (TJ ...)'.
     Po výběru provede blur (Tab) a ověří hidden ID (…vedouciid).
+    Každý vedoucí má rozpočet LEADER_BUDGET_MS (child předaného `budget`).
     """
-    MENU_MS  = 1500
+    MENU_MS  = globals().get("LEADER_MENU_MS", 1500)
     TYPE_DLY = 15
     SLEEP_MS = 80
+    root = budget or Budget("leaders")
 
     def _ensure_only_from_club():
         if not only_from_club:
@@ -114,7 +873,7 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
             try:
                 cb = page.locator(f"input[name='{cb_name}']").first
                 if cb.count() and not cb.is_checked():
-                    cb.check(timeout=600)
+                    cb.check(timeout=root.ms(600))
                     log(f"  [leaders] '{cb_name}' zaškrtnuto")
             except Exception:
                 pass
@@ -124,6 +883,17 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
         if not hint:
             log(f"  [leaders] požadovaný text je prázdný pro {input_sel}")
             return False
+        b = root.child(f"leader {input_sel}", LEADER_BUDGET_MS)
+        try:
+            return _pick_click_in(b, input_sel, hidden_sel, hint)
+        except BudgetExceeded as e:
+            log(f"  [leaders] ⏱ {hint!r}: rozpočet vyčerpán ({e})")
+            return False
+        finally:
+            b.finish()
+
+    def _pick_click_in(b, input_sel: str, hidden_sel: str, hint: str) -> bool:
+        page.set_default_timeout(b.ms(1500))
 
         inp = page.locator(input_sel).first
         hid = page.locator(hidden_sel).first
@@ -131,6 +901,19 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
             log(f"  [leaders] input {input_sel} nenalezen")
             return False
 
+        hit = roster_id(roster, "vedouci", hint)
+        if hit and hid.count():
+            page.evaluate("""([inSel, hidSel, id, text]) => {
+                document.querySelector(inSel).value = text;
+                const hid = document.querySelector(hidSel);
+                hid.value = id;
+                hid.dispatchEvent(new Event('change', {bubbles: true}));
+            }""", [input_sel, hidden_sel, hit[0], hit[1]])
+            if (hid.get_attribute("value") or "").strip() == hit[0]:
+                log(f"  [leaders] '{hint}' → OK ze soupisky (hidden={hit[0]}, visible={hit[1]})")
+                return True
+            log(f"  [leaders] '{hint}': ID ze soupisky se nedrží → výběr z menu")
+
         # vynuluj hidden (ať víme, že se po výběru nastaví)
         try:
             if hid.count():
@@ -141,7 +924,7 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
         # napiš dotaz a otevři menu
         try: inp.fill("")
         except Exception: pass
-        inp.focus()
+        inp.focus(timeout=b.ms(1500))
         page.keyboard.type(hint, delay=TYPE_DLY)
         try:
             inp.evaluate("""
@@ -155,11 +938,13 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
 
         menu_sel = "ul.ui-autocomplete:visible, .ui-autocomplete.ui-menu:visible"
         try:
-            page.wait_for_selector(menu_sel, timeout=MENU_MS)
+            with _timed_op("leader_menu", b.ms(MENU_MS)):
+                page.wait_for_selector(menu_sel, timeout=b.ms(MENU_MS))
         except Exception:
+            b.check("jQuery search")
             try:
                 inp.evaluate("el => { if (window.jQuery && jQuery.fn.autocomplete) jQuery(el).autocomplete('search', el.value||''); }")
-                page.wait_for_selector(menu_sel, timeout=MENU_MS)
+                page.wait_for_selector(menu_sel, timeout=b.ms(MENU_MS))
             except Exception:
                 log(f"  [leaders] menu se neukázalo pro {hint!r}")
                 return False
@@ -171,7 +956,7 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
             return False
 
         # načti všechny texty položek najednou
-        items = [ (i, (menu.nth(i).inner_text() or "").strip()) for i in range(cnt) ]
+        items = [ (i, (menu.nth(i).inner_text(timeout=b.ms(800)) or "").strip()) for i in range(cnt) ]
         log("  [leaders] menu:", "; ".join([f"{i}:{t}" for i,t in items[:10]]))
 
         # 1) přesná shoda celého textu
@@ -190,11 +975,11 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
 
         # klik na vybranou li + blur
         try:
-            menu.nth(pick).click(timeout=800)
+            menu.nth(pick).click(timeout=b.ms(800))
         except Exception:
             page.keyboard.press("Enter")
         page.keyboard.press("Tab")
-        page.wait_for_timeout(SLEEP_MS)
+        page.wait_for_timeout(b.ms(SLEEP_MS))
 
         # kontrola hidden ID i viditelného textu
         try:
@@ -202,7 +987,7 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
         except Exception:
             hid_val = ""
         try:
-            vis_val = inp.input_value(timeout=300)
+            vis_val = inp.input_value(timeout=b.ms(300))
         except Exception:
             vis_val = (inp.evaluate("el => el.value") or "").strip()
 
@@ -220,39 +1005,54 @@ def fill_leaders_on_start(page, home_name_text: str, away_name_text: str, log, o
     return ok_home and ok_away
 
 
-def fill_playroom(page, wanted_text: str, log):
+def fill_playroom(page, wanted_text: str, log, budget=None, roster=None):
     """
     Hrací místnost – robustně a „klikově“ přes JS:
       - najde <select name='zapis_id_herna'> (případně nejlepší kandidát),
       - zjistí seznam option (text + value),
-      - vybere buď přesnou shodu podle textu, nebo první reálnou položku (index>0),
+      - vybere položku s ID ze soupisky (`roster`), jinak přesnou shodu podle textu,
+        jinak první reálnou položku (index>0),
       - NÁSILNĚ nastaví selectedIndex a vystřelí input/change/click,
       - propíše vybraný text do input[name='zapis_herna'] a vystřelí jeho input/change.
     """
     CLICK_MS = 600
     SLEEP_MS = 80
+    b = budget or Budget("playroom")
     wanted_text = (wanted_text or "").strip()
 
     def _is_placeholder_text(t: str) -> bool:
         s = (t or "").strip().lower()
         return (s.startswith("- zvolte") or s.startswith("- vyberte") or s == "-" or "hrací místnost" in s)
 
-    # 1) pokus o „oficiální“ select
-    sel = page.locator("select[name='zapis_id_herna']").first
-    if not sel.count():
-        # fallbacky poblíž textu 'Hrací místnost'
-        sel = page.locator("xpath=//*[contains(normalize-space(.),'Hrací místnost')]/following::select[1]").first
-    if not sel.count():
-        # nouzově první select, který nevypadá jako hodiny/minuty
+    # 1) najdi select – „oficiální“ jméno, text 'Hrací místnost', nouzově první ne-časový select;
+    #    pořadí podle toho, co na této stránce naposledy fungovalo (StrategyCache)
+    def by_name():
+        return page.locator("select[name='zapis_id_herna']").first
+
+    def by_label():
+        return page.locator("xpath=//*[contains(normalize-space(.),'Hrací místnost')]/following::select[1]").first
+
+    def first_select():
         for i in range(min(page.locator("select").count(), 10)):
             cand = page.locator("select").nth(i)
             nm = (cand.get_attribute("name") or "").lower()
             if "hodin" in nm or "minut" in nm:
                 continue
+            return cand
+        return None
+
+    finders = {"name": by_name, "label": by_label, "first_select": first_select}
+    fp = page_fingerprint(page)
+    sel = None
+    for how in strategies().order("playroom", fp, list(finders)):
+        cand = finders[how]()
+        ok = cand is not None and bool(cand.count())
+        strategies().record("playroom", fp, how, ok)
+        if ok:
             sel = cand
             break
 
-    if not sel.count():
+    if sel is None:
         log("  [playroom] <select> pro 'Hrací místnost' nenalezen")
         return False
 
@@ -264,7 +1064,10 @@ def fill_playroom(page, wanted_text: str, log):
 
     # 3) vyber index – nejprve přesná shoda podle TEXTU, potom první reálná (index>0, ne placeholder)
     pick_idx = -1
-    if wanted_text:
+    hit = roster_id(roster, "herna", wanted_text)
+    if hit:
+        pick_idx = next((int(o["i"]) for o in options if o.get("v") == hit[0]), -1)
+    if pick_idx < 0 and wanted_text:
         want_norm = _norm_name(_strip_menu_text(wanted_text))
         for o in options:
             if _norm_name(_strip_menu_text(o.get("t",""))) == want_norm:
@@ -290,9 +1093,9 @@ def fill_playroom(page, wanted_text: str, log):
 
     # 4) „klikově“ přes JS: nastav selectedIndex, vystřel input/change/click
     try:
-        try: sel.scroll_into_view_if_needed(timeout=CLICK_MS)
+        try: sel.scroll_into_view_if_needed(timeout=b.ms(CLICK_MS))
         except Exception: pass
-        try: sel.click(timeout=CLICK_MS, force=True)   # nevadí, když nic „nevyskočí“
+        try: sel.click(timeout=b.ms(CLICK_MS), force=True)   # nevadí, když nic „nevyskočí“
         except Exception: pass
 
         sel.evaluate(
@@ -320,7 +1123,7 @@ def fill_playroom(page, wanted_text: str, log):
             pick_idx
         )
 
-        page.wait_for_timeout(SLEEP_MS)
+        page.wait_for_timeout(b.ms(SLEEP_MS))
 
         # 5) ověř – přečti skutečně vybraný text a zkontroluj, že to není placeholder
         chosen = sel.evaluate("el => (el.selectedOptions?.[0]?.textContent || el.options[el.selectedIndex]?.textContent || '').trim()") or ""
@@ -411,10 +1214,10 @@ def _use_bundled_ms_playwright(log):
         log("Bundled ms-playwright detection failed:", repr(e))
     return False
 
-def wait_online_ready(page, log):
+def wait_online_ready(page, log, budget=None):
     # STIS online editor: nahoře jsou tlačítka "Uložit změny" / "Dokončit zápis"
     sel_ready = "button:has-text('Uložit změny'), input[type='button'][value*='Uložit změny'], input[type='submit'][value*='Uložit změny']"
-    page.wait_for_selector(sel_ready, timeout=30000)
+    page.wait_for_selector(sel_ready, timeout=budget.ms(30000) if budget else 30000)
     # pro jistotu ověř, že jsme na online.php
     if "online.php" not in page.url:
         log("Pozn.: nejsem na online.php, aktuální URL:", page.url)
@@ -441,6 +1244,7 @@ def _any_input_in_zapis(page):
 def _diag_dump_cell(page, target, tag, log):
     try:
         ts = int(time.time()*1000)
+        DIAG_DIR.mkdir(exist_ok=True)
         cell_png = DIAG_DIR / f"{tag}_cell_{ts}.png"
         page_png = DIAG_DIR / f"{tag}_zapis_{ts}.png"
         html_snip = DIAG_DIR / f"{tag}_snippet_{ts}.html"
@@ -462,23 +1266,40 @@ def _diag_dump_cell(page, target, tag, log):
         log(f"  [diag] dump selhal: {e!r}")
 
         
-def _fill_player_by_click(page, selector, name, log):
+def _fill_player_by_click(page, selector, name, log, budget=None, roster=None):
     """
     BLESK výběr hráče:
+    0) Je-li jméno v soupisce ze sešitu (`roster`, viz load_roster), select_option rovnou podle ID.
     1) Primárně <select class="player"> v buňce – options si vezmu najednou přes evaluate.
     2) Jen když select není, zkusím rychlý autocomplete.
     Vše POUZE uvnitř hráčské buňky (žádné sety).
+    Celá buňka má rozpočet MAX_PER_NAME_MS (případně child předaného `budget`);
+    každé volání Playwright dostane jako timeout zbývající čas a po vyčerpání
+    se další fallbacky už nezkouší.
+    Vrací výsledek buňky pro metriky: {"status": filled|mismatch|failed, "path", "reason", "ms"},
+    kde path je poslední zkoušená cesta (roster / cell / select / autocomplete / surname).
     """
     name = (name or "").strip()
     if not name:
-        return
+        return None
 
-    # krátké defaulty (když nejsou definované globálně)
-    MENU_MS  = globals().get("FAST_MENU_MS", 700)
-    CLICK_MS = globals().get("FAST_CLICK_MS", 400)
-    SLEEP_MS = globals().get("AFTER_SELECT_SLEEP_MS", 50)
+    b = budget.child(f"cell {selector}", MAX_PER_NAME_MS) if budget else Budget(f"cell {selector}", MAX_PER_NAME_MS)
+    page.set_default_timeout(b.ms(1500))
+    out = {"status": "failed", "path": "cell", "reason": None}
+    try:
+        out["status"], out["reason"] = _pick_player(page, selector, name, log, b, out, roster)
+    except BudgetExceeded as e:
+        out["reason"] = "rozpočet"
+        log(f"  ⏱ {name} → rozpočet buňky vyčerpán ({e})")
+    finally:
+        b.finish()
+        out["ms"] = b.elapsed_ms()
+    return out
 
-    # --- odvoď selektor BUŇKY z dodaného selectoru ---
+
+@functools.lru_cache(maxsize=256)
+def _cell_selector(selector):
+    """Odvoď selektor BUŇKY hráče z dodaného selectoru (None = použij selector tak, jak je)."""
     cell_sel = None
     try:
         if " .cell-player:first-child" in selector or " .cell-player:last-child" in selector:
@@ -490,33 +1311,94 @@ def _fill_player_by_click(page, selector, name, log):
                 cell_sel = selector.split(" .player", 1)[0].replace(".player.host",   ".cell-player:last-child")
     except Exception:
         cell_sel = None
+    return cell_sel
+
+
+def _wait_cell_settled(page, cell, before_txt, name, timeout_ms):
+    """
+    Po výběru hráče čeká, až se text buňky změní proti `before_txt` (nejvýš timeout_ms).
+    Měří se do latencí jako "after_select" – nevyjde-li to, zapíše se cenzurovaný vzorek = timeout,
+    takže AFTER_SELECT_SLEEP_MS se učí z doby, za kterou buňka opravdu ukáže nové jméno.
+    Ukazuje-li buňka hráče `name` už před výběrem, text se nezmění – nečeká se a vzorek se nezapíše.
+    """
+    if before_txt is None:
+        page.wait_for_timeout(timeout_ms)   # původní text neznáme → jen pevná pauza, bez vzorku
+        return
+    if any(_norm_name(before_txt) == _norm_name(v) for v in _name_variants(name)):
+        return
+    try:
+        handle = cell.element_handle(timeout=timeout_ms)
+        with _timed_op("after_select", timeout_ms):
+            page.wait_for_function("([el, before]) => (el.innerText || '').trim() !== before",
+                                   arg=[handle, before_txt], timeout=timeout_ms)
+    except PwTimeout:
+        pass
+
+def _pick_player(page, selector, name, log, b, out, roster=None):
+    # vrací (status, důvod); out["path"] průběžně drží právě zkoušenou cestu
+    # krátké defaulty (když nejsou definované globálně)
+    MENU_MS  = globals().get("FAST_MENU_MS", 700)
+    CLICK_MS = globals().get("FAST_CLICK_MS", 400)
+    FOCUS_MS = globals().get("FAST_FOCUS_MS", 300)
+    SLEEP_MS = globals().get("AFTER_SELECT_SLEEP_MS", 50)
 
+    cell_sel = _cell_selector(selector)
     cell = page.locator(cell_sel).first if cell_sel else page.locator(selector).first
     if not cell.count():
         log(f"  ✗ {name} → Nenalezen element: {cell_sel or selector}")
-        return
+        return "failed", "element nenalezen"
 
     # krátký log „před“
+    before_txt = None
     try:
         before_txt = (cell.inner_text() or "").strip()
         log(f"  → {name!r} @ {cell_sel or selector}  [before='{before_txt}']")
     except Exception:
         pass
 
+    # ---------- SOUPISKA: ID ze sešitu → žádné čtení nabídky, jen kontrola zobrazeného jména ----------
+    hit = roster_id(roster, "hrac", name)
+    if hit:
+        out["path"] = "roster"
+        sel = cell.locator("select.player").first
+        if sel.count():
+            try:
+                sel.select_option(value=hit[0], timeout=b.ms(500))
+            except Exception as e:
+                log(f"  ~ {name}: ID {hit[0]} ze soupisky v nabídce není ({type(e).__name__}) → běžný výběr")
+            else:
+                _wait_cell_settled(page, cell, before_txt, name, b.ms(SLEEP_MS))
+                after_txt = (cell.inner_text(timeout=b.ms(CLICK_MS)) or "").strip()
+                if after_txt and after_txt != "----":
+                    if any(_norm_name(after_txt) == _norm_name(v) for v in _name_variants(name)):
+                        log(f"  ✓ {name} → {cell_sel or selector} (soupiska, ID {hit[0]})  [after='{after_txt}']")
+                        return "filled", None
+                    log(f"  ~ {name} → {cell_sel or selector} ID {hit[0]} ze soupisky vybráno, ale zobrazeno '{after_txt}'")
+                    return "mismatch", f"soupiska ID {hit[0]}: zobrazeno '{after_txt}'"
+                log(f"  ⚠ {name} → po výběru ID {hit[0]} ze soupisky žádná změna (stále '{after_txt or ''}')")
+                return "failed", "žádná změna"
+
     # ---------- FAST SELECT PATH ----------
+    out["path"] = "select"
+    fp = page_fingerprint(page)
+    learned = strategies().order("cell", fp, ["select", "autocomplete"])
     sel = cell.locator("select.player").first
-    if not sel.count():
-        # jeden nenáročný klik, kdyby select vznikal až po kliku
+    if not sel.count() and learned[0] == "select":
+        # jeden nenáročný klik, kdyby select vznikal až po kliku (na stránkách, kde naposledy
+        # vyhrál autocomplete, se přeskočí)
+        b.check("klik na buňku")
         try:
-            try: cell.scroll_into_view_if_needed(timeout=CLICK_MS)
+            try: cell.scroll_into_view_if_needed(timeout=b.ms(CLICK_MS))
             except Exception: pass
-            cell.click(timeout=CLICK_MS, force=True)
-            page.wait_for_timeout(40)
+            with _timed_op("click", b.ms(CLICK_MS)):
+                cell.click(timeout=b.ms(CLICK_MS), force=True)
+            page.wait_for_timeout(b.ms(40))
         except Exception:
             pass
         sel = cell.locator("select.player").first
 
     if sel.count():
+        strategies().record("cell", fp, "select", True)
         try:
             # vyčti všechny možnosti jedním JS voláním (žádné pomalé per-option dotazy)
             opts = sel.evaluate("el => Array.from(el.options).map(o => ({v:o.value, t:(o.textContent||'').trim()}))")
@@ -541,49 +1423,57 @@ def _fill_player_by_click(page, selector, name, log):
             pick_val = pick_value_from_options(opts)
             if not pick_val:
                 log("  žádná shoda v <select> – přeskočeno")
-                return
+                return "failed", "žádná shoda"
 
             # vyber s krátkým timeoutem a vyvolej change
             try:
-                sel.select_option(value=pick_val, timeout=500)
+                sel.select_option(value=pick_val, timeout=b.ms(500))
             except Exception:
                 # poslední pokus: změň value přes JS + change
                 sel.evaluate("(el, v) => { el.value = v; el.dispatchEvent(new Event('change', {bubbles:true})); }", pick_val)
 
-            page.wait_for_timeout(SLEEP_MS)
+            _wait_cell_settled(page, cell, before_txt, name, b.ms(SLEEP_MS))
 
-            after_txt = (cell.inner_text() or "").strip()
+            after_txt = (cell.inner_text(timeout=b.ms(CLICK_MS)) or "").strip()
             if after_txt and after_txt != "----":
                 if any(_norm_name(after_txt) == _norm_name(v) for v in _name_variants(name)):
                     log(f"  ✓ {name} → {cell_sel or selector} (select)  [after='{after_txt}']")
-                else:
-                    log(f"  ~ {name} → {cell_sel or selector} vybráno (select), ale zobrazeno '{after_txt}'")
-            else:
-                log(f"  ⚠ {name} → po selectu žádná změna (stále '{after_txt or ''}')")
-            return
+                    return "filled", None
+                log(f"  ~ {name} → {cell_sel or selector} vybráno (select), ale zobrazeno '{after_txt}'")
+                return "mismatch", f"zobrazeno '{after_txt}'"
+            log(f"  ⚠ {name} → po selectu žádná změna (stále '{after_txt or ''}')")
+            return "failed", "žádná změna"
 
         except Exception as e:
             log(f"  ✗ {name} → práce se <select> selhala: {e!r}")
-            return
+            return "failed", type(e).__name__
 
     # ---------- FALLBACK: AUTOCOMPLETE (jen pokud select není) ----------
+    if learned[0] == "select":
+        strategies().record("cell", fp, "select", False)
+    out["path"] = "autocomplete"
+    b.check("autocomplete")
     ac = cell.locator("input.ui-autocomplete-input, input.ac_input").first
     if not ac.count():
         # poslední možnost: libovolný text input v buňce, ale NE sety
         ac = cell.locator("input[type='text']:not(.zapas-set):not([name^='set'])").first
     if not ac.count():
+        strategies().record("cell", fp, "autocomplete", False)
         log(f"  ✗ {name} → žádný hráčský input/select v buňce ({cell_sel or selector})")
-        return
+        return "failed", "žádný input"
+    strategies().record("cell", fp, "autocomplete", True)
 
     try:
         try: ac.fill("")
         except Exception: pass
-        ac.focus()
-        ac.type(name, delay=0)
-        page.wait_for_timeout(50)
+        with _timed_op("focus", b.ms(FOCUS_MS)):
+            ac.focus(timeout=b.ms(FOCUS_MS))
+        ac.type(name, delay=0, timeout=b.ms(CLICK_MS))
+        page.wait_for_timeout(b.ms(50))
 
         menu_sel = "ul.ui-autocomplete:visible, .ui-autocomplete.ui-menu:visible"
-        page.wait_for_selector(menu_sel, timeout=MENU_MS)
+        with _timed_op("menu", b.ms(MENU_MS)):
+            page.wait_for_selector(menu_sel, timeout=b.ms(MENU_MS))
         menu = page.locator(menu_sel).first.locator("li")
 
         # rychlý výběr shody
@@ -596,8 +1486,12 @@ def _fill_player_by_click(page, selector, name, log):
                 pick = i; break
 
         if pick < 0 and " " in name:
-            ac.fill(""); ac.focus(); ac.type(name.split()[-1], delay=0)
-            page.wait_for_selector(menu_sel, timeout=MENU_MS)
+            out["path"] = "surname"
+            b.check("příjmení")
+            ac.fill("", timeout=b.ms(CLICK_MS)); ac.focus(timeout=b.ms(FOCUS_MS))
+            ac.type(name.split()[-1], delay=0, timeout=b.ms(CLICK_MS))
+            with _timed_op("menu", b.ms(MENU_MS)):
+                page.wait_for_selector(menu_sel, timeout=b.ms(MENU_MS))
             menu = page.locator(menu_sel).first.locator("li")
             n = min(menu.count(), 20)
             for i in range(n):
@@ -606,26 +1500,330 @@ def _fill_player_by_click(page, selector, name, log):
                     pick = i; break
 
         if pick >= 0:
-            menu.nth(pick).click(timeout=CLICK_MS)
-            page.wait_for_timeout(SLEEP_MS)
+            with _timed_op("click", b.ms(CLICK_MS)):
+                menu.nth(pick).click(timeout=b.ms(CLICK_MS))
+            page.wait_for_timeout(b.ms(SLEEP_MS))
         else:
             log("  žádná shoda v autocomplete – přeskočeno")
-            return
+            return "failed", "žádná shoda"
 
-        after_txt = (cell.inner_text() or "").strip()
+        after_txt = (cell.inner_text(timeout=b.ms(CLICK_MS)) or "").strip()
         if after_txt and after_txt != "----":
             if any(_norm_name(after_txt) == _norm_name(v) for v in _name_variants(name)):
                 log(f"  ✓ {name} → {cell_sel or selector} (autocomplete)  [after='{after_txt}']")
-            else:
-                log(f"  ~ {name} → {cell_sel or selector} vybráno (autocomplete), ale zobrazeno '{after_txt}'")
-        else:
-            log(f"  ⚠ {name} → žádná změna v buňce (stále '{after_txt or ''}')")
+                return "filled", None
+            log(f"  ~ {name} → {cell_sel or selector} vybráno (autocomplete), ale zobrazeno '{after_txt}'")
+            return "mismatch", f"zobrazeno '{after_txt}'"
+        log(f"  ⚠ {name} → žádná změna v buňce (stále '{after_txt or ''}')")
+        return "failed", "žádná změna"
 
+    except BudgetExceeded:
+        raise
     except Exception as e:
         log(f"  ✗ {name} → autocomplete selhal: {e!r}")
+        return "failed", type(e).__name__
+
+
+
+
+_SNAPSHOT_JS = """
+(cells) => {
+  const text = (s) => {
+    try { const el = document.querySelector(s); return el ? (el.innerText || '').trim() : null; }
+    catch (e) { return null; }   // selektor, který querySelector nezná
+  };
+  return {
+    cells: cells.map(text),
+    // sety VŠECH eventů (i těch, které vstup nevyplňuje – zbytky z dřívějšího nahrání)
+    sets: Array.from(document.querySelectorAll('.event')).map((ev) =>
+      [1, 2, 3, 4, 5].map((i) => {
+        const inp = ev.querySelector(`.zapas-set[data-set='${i}']`);
+        return inp ? inp.value : null;
+      })),
+  };
+}
+"""
+
+def _set_winner(v):
+    """Hodnota setu ve tvaru STIS ('7', '-9', '101') nebo '11:7' → 1 domácí, -1 hosté, 0 neznámo/prázdno."""
+    s = str(_map_wo(v) or "").strip()
+    if ":" in s:
+        a, _, b = s.partition(":")
+        try:
+            return (int(a) > int(b)) - (int(a) < int(b))
+        except ValueError:
+            return 0
+    if not s:
+        return 0
+    return -1 if s.startswith("-") else 1 if s.lstrip("+").isdigit() else 0
+
+def _set_totals(sets_by_event):
+    """{event: [sety]} → ({event: (sety domácí, sety hosté)}, (zápasy domácí, zápasy hosté))."""
+    per_event, home, away = {}, 0, 0
+    for ev, sets in sets_by_event.items():
+        w = [_set_winner(v) for v in (sets or [])[:5]]
+        h, a = w.count(1), w.count(-1)
+        per_event[ev] = (h, a)
+        home, away = home + (h > a), away + (a > h)
+    return per_event, (home, away)
+
+def read_online_state(page, filled):
+    """Jedno evaluate: texty hráčských buněk z `filled["cells"]` + sety všech eventů."""
+    cells = filled.get("cells", [])
+    return page.evaluate(_SNAPSHOT_JS, [c.get("cell") or "" for c in cells]) or {}
+
+def reconcile_online(filled, snap):
+    """
+    Porovná stav editoru (read_online_state) se vstupem (read_zdroj_data přes fill_online_from_zdroj).
+    Vrací řádky {kind, key, field, requested, shown, status, path?, event?, set?} –
+    kind player / set / total, status ok / mismatch / empty / unknown.
+    Součty (sety v eventu, skóre utkání) se počítají z přečtených setů na obou stranách;
+    nesedí-li, ukazují na set, který se nepropsal, nebo na zbytek z dřívějška.
+    """
+    cells = filled.get("cells", [])
+    set_jobs = filled.get("sets", [])
+    shown_sets = snap.get("sets") or []
+
+    rows = []
+    for c, shown in zip(cells, snap.get("cells") or [None] * len(cells)):
+        if shown is None:
+            status = "unknown"
+        elif not shown or shown == "----":
+            status = "empty"
+        elif any(_norm_name(shown) == _norm_name(v) for v in _name_variants(c["name"])):
+            status = "ok"
+        else:
+            status = "mismatch"
+        rows.append({"kind": "player", "key": c["key"], "field": c["field"], "requested": c["name"],
+                     "shown": shown, "status": status, "path": c.get("path")})
+
+    want_sets, got_sets = {}, {}
+    for key, ev, sets in set_jobs:
+        shown = shown_sets[ev] if 0 <= ev < len(shown_sets) else None
+        want_sets[ev] = [str(_map_wo(v)) if v else "" for v in sets[:5]]
+        got_sets[ev] = [(v or "").strip() for v in shown] if shown else []
+        for i, v in enumerate(sets[:5]):
+            if not v:
+                continue
+            want = str(_map_wo(v))
+            got = shown[i] if shown and i < len(shown) else None
+            status = "unknown" if got is None else "ok" if got.strip() == want else "empty" if not got.strip() else "mismatch"
+            rows.append({"kind": "set", "key": key, "field": f"set{i + 1}", "requested": want,
+                         "shown": got, "status": status, "event": ev, "set": i + 1})
+
+    if shown_sets:
+        want_ev, want_total = _set_totals(want_sets)
+        got_ev, got_total = _set_totals(got_sets)
+        fmt = lambda t: f"{t[0]}:{t[1]}"
+        for key, ev, _sets in set_jobs:
+            if not got_sets.get(ev):
+                continue   # event na stránce chybí – už je vidět u setů (unknown)
+            rows.append({"kind": "total", "key": key, "field": "sety", "requested": fmt(want_ev[ev]),
+                         "shown": fmt(got_ev[ev]), "status": "ok" if want_ev[ev] == got_ev[ev] else "mismatch"})
+        # skóre utkání ze VŠECH eventů na stránce – odhalí i sety, které vstup nezná
+        _ev, page_total = _set_totals({ev: v for ev, v in enumerate(shown_sets) if v})
+        rows.append({"kind": "total", "key": "utkání", "field": "skóre", "requested": fmt(want_total),
+                     "shown": fmt(page_total), "status": "ok" if page_total == want_total else "mismatch"})
+    return rows
+
+def snapshot_online(page, filled):
+    """Kontrolní report: read_online_state + reconcile_online (viz tam)."""
+    return reconcile_online(filled, read_online_state(page, filled))
+
+def verify_online(page, filled, log, budget=None, rounds=VERIFY_ROUNDS, roster=None):
+    """
+    Kontrola před uložením: jedním evaluate přečte editor, porovná se vstupem a znovu vyplní
+    JEN buňky / sety, které nesedí (nejvýš `rounds` kol). Buňky, kde hráč v nabídce vůbec není
+    („žádná shoda“), se neopakují – výsledek by byl stejný. `roster` = soupiska (load_roster),
+    opravy pak vybírají podle ID stejně jako první vyplnění.
+    Rozdíl se zaloguje jako JSON ([VERIFY] …). Vrací {"diff": řádky prvního čtení mimo ok,
+    "left": řádky mimo ok po opravách, "retried": počet znovu vyplněných polí}.
+    """
+    cells = filled.get("cells", [])
+    by_cell = {(c["key"], c["field"]): i for i, c in enumerate(cells)}
+    rows = reconcile_online(filled, read_online_state(page, filled))
+    diff = [r for r in rows if r["status"] != "ok"]
+    if diff:
+        log("[VERIFY] " + json.dumps(diff, ensure_ascii=False, default=str))
+    retried = 0
+    for _ in range(rounds):
+        bad = [r for r in rows if r["status"] in ("mismatch", "empty")]
+        redo_cells = [by_cell[(r["key"], r["field"])] for r in bad if r["kind"] == "player"
+                      and cells[by_cell[(r["key"], r["field"])]].get("reason") != "žádná shoda"]
+        redo_sets = {}
+        for r in bad:
+            if r["kind"] == "set":
+                redo_sets.setdefault(r["event"], [""] * 5)[r["set"] - 1] = r["requested"]
+        if not redo_cells and not redo_sets:
+            break
+        if budget is not None and budget.expired:
+            log("  ⏱ rozpočet fáze vyčerpán – nesedící pole se znovu nevyplňují")
+            break
+        log(f"Kontrola: znovu vyplňuji {len(redo_cells)} hráčů a sety {len(redo_sets)} eventů")
+        for i in redo_cells:
+            c = cells[i]
+            res = _fill_player_by_click(page, c["sel"], c["name"], log, budget, roster=roster)
+            if res:
+                cells[i] = dict(c, **res, retried=True)
+        _fill_sets_batch(page, sorted(redo_sets.items()), log)
+        retried += len(redo_cells) + sum(1 for v in redo_sets.values() for x in v if x)
+        rows = reconcile_online(filled, read_online_state(page, filled))
+    left = [r for r in rows if r["status"] != "ok"]
+    if diff:
+        log(f"Kontrola: rozdílů {len(diff)}, znovu vyplněno {retried}, zbývá {len(left)}"
+            + ("" if not left else " → " + json.dumps(left, ensure_ascii=False, default=str)))
+    else:
+        log(f"Kontrola: vše sedí ({len(rows)} polí)")
+    return {"diff": diff, "left": left, "retried": retried}
+
+def write_review(xlsx_path, rows, meta, log):
+    """<xlsx>.review.json + <xlsx>.review.html (požadováno vs. zobrazeno); vrací cestu k HTML."""
+    base = Path(xlsx_path)
+    counts = {}
+    for r in rows:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    doc = dict(meta, created=datetime.now().isoformat(timespec="seconds"), counts=counts, rows=rows)
+    json_path = base.with_suffix(".review.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=1)
+
+    esc = lambda v: html.escape("" if v is None else str(v))
+    colors = {"ok": "#e6f4ea", "mismatch": "#fde7e9", "empty": "#fff4ce", "unknown": "#eee"}
+    trs = "\n".join(
+        f'<tr style="background:{colors.get(r["status"], "#fff")}"><td>{esc(r["key"])}</td><td>{esc(r["field"])}</td>'
+        f'<td>{esc(r["requested"])}</td><td>{esc(r["shown"])}</td><td>{esc(r["status"])}</td><td>{esc(r.get("path"))}</td></tr>'
+        for r in rows)
+    head = " · ".join(f"{esc(k)}: {v}" for k, v in sorted(counts.items()))
+    html_path = base.with_suffix(".review.html")
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(f"""<!doctype html><meta charset="utf-8"><title>STIS kontrola – {esc(meta.get("team"))}</title>
+<style>body{{font:14px sans-serif;margin:1em}}td,th{{padding:2px 8px;text-align:left}}table{{border-collapse:collapse}}</style>
+<h3>{esc(meta.get("team"))} – {esc(meta.get("url"))}</h3>
+<p>{esc(doc["created"])} · uloženo: {esc(meta.get("saved"))} · {head}</p>
+<table><tr><th>zápas</th><th>pole</th><th>požadováno</th><th>zobrazeno</th><th>stav</th><th>cesta</th></tr>
+{trs}
+</table>
+""")
+    log(f"Kontrolní report → {html_path.name}, {json_path.name} ({head})")
+    return html_path
+
+def _save_outcome(page, resp, b):
+    """
+    Odpověď na 'Uložit změny' → (status, zpráva): saved / rejected (hláška serveru) / http_error.
+    Klasický submit: `resp` je odpověď navigace z expect_navigation – nová stránka je už načtená,
+    hlášku čteme z ní (None = navigace bez odpovědi serveru, např. jen změna #kotvy).
+    """
+    if resp is not None and resp.status >= 400:
+        return "http_error", f"HTTP {resp.status}"
+    if resp is None:
+        msg = "nová stránka"
+    elif resp.request.resource_type == "document":
+        msg = f"HTTP {resp.status}"
+    else:
+        msg = " ".join((resp.text() or "").split())[:300] or f"HTTP {resp.status}"
+    return _save_page_outcome(page, b, "saved", msg)
+
+def _save_page_outcome(page, b, status, message):
+    """Hláška `.exception` na stránce po odeslání → rejected, jinak (status, message)."""
+    err = page.locator(SAVE_ERROR_SEL)
+    if err.count():
+        return "rejected", " ".join((err.first.inner_text(timeout=b.ms(1000)) or "").split())[:300]
+    return status, message
+
+_SAVE_MARK_JS = "() => { window.__stisSaveClick = true; }"   # zmizí, jakmile submit vymění stránku
+_SAVE_FORM_JS = """
+b => ({action: (b.form && b.form.action) || location.href,
+       submit: !!b.form && (b.type === 'submit' || b.type === 'image')})
+"""
+
+def _editor_state(page, b):
+    """
+    Po kliku, který nedopadl (timeout, chyba, HTTP 5xx): "same" = pořád původní stránka
+    (značka _SAVE_MARK_JS trvá) → klik lze bezpečně zopakovat; "replaced" = submit stránku
+    vyměnil, tj. odešel; "loading" = navigace se nedokončila – nový klik by mohl odeslat zápis podruhé.
+    """
+    try:
+        page.wait_for_load_state("load", timeout=b.ms(SAVE_TIMEOUT_MS))
+        return "same" if page.evaluate("() => window.__stisSaveClick === true") else "replaced"
+    except Exception:
+        return "loading"
 
+def _save_request(action):
+    """Predikát pro expect_response: POST formuláře 'ulozit' v hlavním rámu (ne autosave/change XHR)."""
+    action = action.split("#")[0]
+    return lambda r: (r.request.method == "POST" and r.url.split("#")[0] == action
+                      and r.request.frame.parent_frame is None)
 
-
+def save_online(page, log):
+    """
+    Klik na 'Uložit změny' a čekání na SKUTEČNOU odpověď serveru, ne pevnou pauzu: submit
+    formuláře přes expect_navigation (hlášku čteme až z nové stránky), tlačítko bez formuláře
+    přes expect_response na POST na action (viz _save_request). Hláška `.exception` = server
+    uložení odmítl (opakovat nemá smysl), stejně jako HTTP 4xx; HTTP 5xx, chyba nebo žádná
+    odpověď do SAVE_TIMEOUT_MS → nový pokus po SAVE_BACKOFF_MS, 2×, 4× … (nejvýš SAVE_ATTEMPTS),
+    ale jen když je stránka pořád ta původní (_editor_state) – jinak by se zápis odeslal dvakrát.
+    Uložení se nepřeskakuje ani po vyčerpání rozpočtu fáze – jinak by se ztratilo vše vyplněné,
+    proto má vlastní rozpočet (ne child fáze) a guarded(force=True).
+    Vrací {"status": saved|rejected|http_error|timeout|failed, "message", "attempts", "ms"}.
+    """
+    b = Budget("ulozit", SAVE_TIMEOUT_MS * SAVE_ATTEMPTS)
+    out = {"status": "failed", "message": None, "attempts": 0}
+    backoff = SAVE_BACKOFF_MS
+    try:
+        for attempt in range(1, SAVE_ATTEMPTS + 1):
+            out["attempts"] = attempt
+            log(f"Klikám 'Uložit změny'… (pokus {attempt}/{SAVE_ATTEMPTS})")
+            retry, clicked = True, False
+            try:
+                btn = page.locator("input[name='ulozit']")
+                form = btn.evaluate(_SAVE_FORM_JS, timeout=5000)
+                page.evaluate(_SAVE_MARK_JS)
+                with guarded("ulozit", log, force=True):
+                    if form["submit"]:
+                        with page.expect_navigation(wait_until="domcontentloaded", timeout=SAVE_TIMEOUT_MS) as info:
+                            clicked = True
+                            btn.click(timeout=5000)
+                    else:
+                        with page.expect_response(_save_request(form["action"]), timeout=SAVE_TIMEOUT_MS) as info:
+                            clicked = True
+                            btn.click(timeout=5000)
+                resp = info.value
+                out["status"], out["message"] = _save_outcome(page, resp, b)
+                retry = out["status"] == "http_error" and resp.status >= 500
+            except PwTimeout:
+                out["status"], out["message"] = "timeout", f"bez odpovědi do {SAVE_TIMEOUT_MS} ms"
+            except Exception as e:
+                out["status"], out["message"] = "failed", repr(e)
+
+            if retry and clicked and out["status"] != "saved":
+                state = _editor_state(page, b)
+                if state == "loading":
+                    out["status"], out["message"] = "timeout", ("stránka se po odeslání stále načítá – "
+                                                               "nový klik by mohl zápis odeslat podruhé")
+                    retry = False
+                elif state == "replaced":
+                    retry = False
+                    if out["status"] != "http_error":   # submit odešel, jen jsme nezachytili odpověď
+                        out["status"], out["message"] = _save_page_outcome(
+                            page, b, "saved", "nová stránka po odeslání (odpověď serveru nezachycena)")
+
+            if out["status"] == "saved":
+                log(f"Změny uloženy ({out['message']}).")
+                break
+            if out["status"] == "rejected":
+                log(f"Server uložení odmítl: {out['message']}")
+                break
+            log(f"Uložení selhalo ({out['status']}): {out['message']}")
+            if not retry:
+                break
+            if attempt < SAVE_ATTEMPTS:
+                log(f"  další pokus za {backoff} ms")
+                page.wait_for_timeout(backoff)
+                backoff *= 2
+    finally:
+        b.finish()
+        out["ms"] = b.elapsed_ms()
+    return out
 
 def _fill_sets_by_event_index(page, event_index, sets, log):
     """
@@ -684,36 +1882,111 @@ def cnt(page, css):  # krátká pomůcka do logu
     except Exception:
         return -1
 
-def fill_online_from_zdroj(page, data, log, xlsx_path=None):
+def _fill_sets_batch(page, jobs, log):
+    """
+    Vyplní sety všech eventů jedním evaluate (místo fill() po jednom inputu).
+    `jobs` = [(event_index, sets), ...]. Co se hromadně nepovede, doplní
+    _fill_sets_by_event_index po jednom.
+    """
+    jobs = [(int(ev), ["" if not v else str(_map_wo(v)) for v in sets[:5]])
+            for ev, sets in jobs if sets]
+    if not jobs:
+        return
+
+    try:
+        res = page.evaluate(
+            """
+            (jobs) => {
+              const evs = document.querySelectorAll('.event');
+              return jobs.map(([ei, sets]) => {
+                const ev = evs[ei];
+                if (!ev) return {ev: ei, ok: [], missing: null};
+                const ok = [], missing = [];
+                sets.forEach((v, i) => {
+                  if (!v) return;
+                  const inp = ev.querySelector(`.zapas-set[data-set='${i+1}']`);
+                  if (!inp) { missing.push(i+1); return; }
+                  inp.value = v;
+                  inp.dispatchEvent(new Event('input',  {bubbles:true}));
+                  inp.dispatchEvent(new Event('change', {bubbles:true}));
+                  ok.push(i+1);
+                });
+                return {ev: ei, ok, missing};
+              });
+            }
+            """,
+            jobs,
+        ) or []
+    except Exception as e:
+        log(f"  Hromadné sety selhaly: {e!r} → vyplňuji po jednom")
+        res = []
+
+    done = {int(r.get("ev", -1)): r for r in res}
+    for ev, sets in jobs:
+        r = done.get(ev)
+        if not r or r.get("missing") is None or r.get("missing"):
+            # event nebo některý input nenalezen → klasická cesta (s vlastním logem)
+            _fill_sets_by_event_index(page, ev, sets, log)
+            continue
+        for n in r.get("ok", []):
+            log(f"  set{n} ← {sets[n-1]} (event #{ev})")
+
+
+def _plan_target(plan, kind, pos, entry):
+    """Najde cíl v plánu pro jeden záznam z read_zdroj_data (podle 'key', jinak postaru)."""
+    key = (entry or {}).get("key")
+    t = plan["by_key"].get(key) if key else None
+    if t is not None and t["kind"] == kind:
+        return t
+    if kind == "double":
+        return plan["doubles"][pos] if pos < len(plan["doubles"]) else None
+    # starý tvar singlů: "idx" = index eventu (2..17)
+    try:
+        ev = int(entry.get("idx", -1))
+    except (TypeError, ValueError):
+        return None
+    return next((s for s in plan["singles"] if s["event"] == ev), None)
+
+
+def fill_online_from_zdroj(page, data, log, xlsx_path=None, layout=None, budget=None, roster=None):
     """
-    Vyplní online formulář STIS podle skutečné struktury DOM.
+    Vyplní online formulář STIS podle zkompilovaného layoutu (viz compile_layout).
 
     Očekávaný tvar `data` (z read_zdroj_data):
     {
       "doubles": [
-        {"home1": "...", "home2": "...", "away1": "...", "away2": "...", "sets": ["11:7","..."]},  # c0
-        {"home1": "...", "home2": "...", "away1": "...", "away2": "...", "sets": [...]},           # c1
+        {"key": "c0", "event": 0, "home1": "...", "home2": "...", "away1": "...", "away2": "...", "sets": ["11:7","..."]},
+        ...
       ],
       "singles": [
-        {"idx": 2,  "home": "...", "away": "...", "sets": [...]},  # → d0
+        {"key": "d0", "event": 2, "idx": 2, "home": "...", "away": "...", "sets": [...]},
         ...
-        {"idx": 17, "home": "...", "away": "...", "sets": [...]},  # → d15
       ]
     }
+    Záznamy bez "key" se mapují postaru (pořadí čtyřher, "idx" singlu = event).
+    `budget` = rozpočet fáze; každá hráčská buňka dostane child s MAX_PER_NAME_MS.
+    `roster` = soupiska ze sešitu (load_roster) – známá jména se vyberou rovnou podle ID.
+    Před uložením proběhne verify_online (jedno čtení editoru, oprava jen nesedících polí).
+    Vrací {"cells": [výsledek buňky + key/field/name/cell/sel, …], "sets": [(key, event, sety), …],
+    "verify": výsledek verify_online, "save": výsledek save_online, "saved": bool}
+    pro RunStats/metriky a kontrolní report (snapshot_online).
     """
     doubles = (data or {}).get("doubles", []) or []
     singles = (data or {}).get("singles", []) or []
+    plan = compile_layout(layout, extra_dirs=(Path(xlsx_path).parent,) if xlsx_path else ())
 
     log(
         "fill_online_from_zdroj: start – singles:",
         len(singles),
         "doubles:",
-        len(doubles)
+        len(doubles),
+        "layout:",
+        plan["name"]
     )
 
     # --- čekej na připravenost online formuláře ---
     try:
-        wait_online_ready(page, log)
+        wait_online_ready(page, log, budget)
     except Exception:
         log("Inputs se neobjevily – dělám dump DOMu.")
         if xlsx_path:
@@ -731,181 +2004,641 @@ def fill_online_from_zdroj(page, data, log, xlsx_path=None):
     log("CSS hack pro .button-karta a .player-name aplikován.")
 
     # ==========================
-    # ČTYŘHRA #1 (ID: c0)
+    # Hráči podle plánu (čtyřhry, pak singly), sety sbírám na konec
     # ==========================
-    if len(doubles) >= 1:
-        dbl = doubles[0]
-        log("Vyplňuji čtyřhru #1 (c0)")
-
-        if dbl.get("home1"):
-            log(f"[c0] home1 sel=#c0 .cell-player:first-child  name={dbl['home1']!r}")
-            _fill_player_by_click(page, "#c0 .cell-player:first-child", dbl["home1"], log)
-
-        if dbl.get("away1"):
-            log(f"[c0] away1 sel=#c0 .cell-player:last-child   name={dbl['away1']!r}")
-            _fill_player_by_click(page, "#c0 .cell-player:last-child",  dbl["away1"], log)
-
-        # druhý pár (sourozenec #c0)
-        if dbl.get("home2"):
-            log(f"[c0] home2 sel=#c0 + .cell-players .cell-player:first-child  name={dbl['home2']!r}")
-            _fill_player_by_click(page, "#c0 + .cell-players .cell-player:first-child", dbl["home2"], log)
-
-        if dbl.get("away2"):
-            log(f"[c0] away2 sel=#c0 + .cell-players .cell-player:last-child   name={dbl['away2']!r}")
-            _fill_player_by_click(page, "#c0 + .cell-players .cell-player:last-child",  dbl["away2"], log)
+    set_jobs, set_rows, cells = [], [], []
+    for kind, entries in (("double", doubles), ("single", singles)):
+        for pos, entry in enumerate(entries):
+            t = _plan_target(plan, kind, pos, entry)
+            if t is None:
+                log(f"Záznam {kind} #{pos} ({entry.get('key') or entry.get('idx')}) nemá v layoutu '{plan['name']}' cíl – přeskočeno")
+                continue
 
-        if dbl.get("sets"):
-            _fill_sets_by_event_index(page, 0, dbl["sets"], log)
+            log(f"Vyplňuji {t['key']} (řádek {t['row']} → event #{t['event']})")
+            for field, _rc, _a1 in t["cells"]:
+                name = entry.get(field)
+                if name:
+                    sel = t["dom"][field]
+                    log(f"[{t['key']}] {field} sel={sel}  name={name!r}")
+                    if budget is not None and budget.expired:
+                        log(f"  ⏱ rozpočet fáze vyčerpán – {name!r} přeskočeno")
+                        res = {"status": "skipped", "path": None, "reason": "rozpočet fáze", "ms": 0}
+                    else:
+                        res = _fill_player_by_click(page, sel, name, log, budget, roster)
+                    if res:
+                        cells.append(dict(res, key=t["key"], field=field, name=name,
+                                          cell=_cell_selector(sel) or sel, sel=sel))
+
+            if entry.get("sets"):
+                set_jobs.append((t["event"], entry["sets"]))
+                set_rows.append((t["key"], t["event"], entry["sets"]))
 
     # ==========================
-    # ČTYŘHRA #2 (ID: c1)
+    # Sety – hromadně jedním voláním
     # ==========================
-    if len(doubles) >= 2:
-        dbl = doubles[1]
-        log("Vyplňuji čtyřhru #2 (c1)")
-
-        if dbl.get("home1"):
-            log(f"[c1] home1 sel=#c1 .cell-player:first-child  name={dbl['home1']!r}")
-            _fill_player_by_click(page, "#c1 .cell-player:first-child", dbl["home1"], log)
-
-        if dbl.get("away1"):
-            log(f"[c1] away1 sel=#c1 .cell-player:last-child   name={dbl['away1']!r}")
-            _fill_player_by_click(page, "#c1 .cell-player:last-child",  dbl["away1"], log)
+    _fill_sets_batch(page, set_jobs, log)
 
-        # druhý pár (sourozenec #c1)
-        if dbl.get("home2"):
-            log(f"[c1] home2 sel=#c1 + .cell-players .cell-player:first-child  name={dbl['home2']!r}")
-            _fill_player_by_click(page, "#c1 + .cell-players .cell-player:first-child", dbl["home2"], log)
-
-        if dbl.get("away2"):
-            log(f"[c1] away2 sel=#c1 + .cell-players .cell-player:last-child   name={dbl['away2']!r}")
-            _fill_player_by_click(page, "#c1 + .cell-players .cell-player:last-child",  dbl["away2"], log)
-
-        if dbl.get("sets"):
-            _fill_sets_by_event_index(page, 1, dbl["sets"], log)
+    # ==========================
+    # Kontrola jedním čtením + oprava jen nesedících polí
+    # ==========================
+    filled = {"cells": cells, "sets": set_rows, "saved": False, "verify": None}
+    try:
+        filled["verify"] = verify_online(page, filled, log, budget, roster=roster)
+    except BudgetExceeded as e:
+        # vyplněné už v editoru je – neuložit by znamenalo o vše přijít, save má vlastní rozpočet
+        log(f"  ⏱ kontrola před uložením nedokončena, rozpočet fáze vyčerpán ({e}) – ukládám i tak")
+    except Exception as e:
+        log(f"Kontrola před uložením selhala: {e!r}")
 
     # ==========================
-    # SINGLY d0..d15 (Excel idx 2..17)
+    # Uložit změny (potvrzené odpovědí serveru)
     # ==========================
-    for match_data in singles:
-        excel_idx = int(match_data.get("idx", 0))  # 2..17
-        if excel_idx < 2 or excel_idx > 17:
+    page.set_default_timeout(1500)
+    filled["save"] = save_online(page, log)
+    filled["saved"] = filled["save"]["status"] == "saved"
+    return filled
+
+
+_LAYOUT_FILES = {}   # cesta -> (mtime, obsah) – stis_layouts.json čteme jen jednou
+_PLAN_CACHE   = {}   # JSON layoutu -> zkompilovaný plán
+
+def _rc_to_a1(r: int, c: int) -> str:
+    col = ""
+    while c:
+        c, rem = divmod(c - 1, 26)
+        col = chr(65 + rem) + col
+    return f"{col}{r}"
+
+def _read_layout_file(p: Path):
+    mt = p.stat().st_mtime
+    cached = _LAYOUT_FILES.get(p)
+    if cached and cached[0] == mt:
+        return cached[1]
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            content = json.load(f)
+    except Exception as e:
+        raise RuntimeError(f"Nelze načíst layout {p}: {e}")
+    if not isinstance(content, dict):
+        raise RuntimeError(f"Layout {p} musí být JSON objekt.")
+    _LAYOUT_FILES[p] = (mt, content)
+    return content
+
+def load_layouts(extra_dirs=()):
+    """Vestavěné LAYOUTS + stis_layouts.json (vedle EXE, v cwd, v extra_dirs; pozdější přepisují)."""
+    out = dict(LAYOUTS)
+    seen = set()
+    for d in (EXE_DIR, Path.cwd(), *extra_dirs):
+        p = (Path(d) / LAYOUTS_FILE).resolve()
+        if p in seen or not p.is_file():
             continue
+        seen.add(p)
+        out.update(_read_layout_file(p))
+    return out
 
-        dom_idx   = excel_idx - 2              # 0..15 → #d{dom_idx}
-        event_idx = excel_idx                  # pro sety zůstává excelový index
+def resolve_layout(spec=None, extra_dirs=()):
+    """
+    `spec` = jméno layoutu (case-insensitive), cesta k .json s jedním layoutem,
+    nebo None → DEFAULT_LAYOUT. Vrací (jméno, dict layoutu).
+    """
+    spec = str(spec or "").strip() or DEFAULT_LAYOUT
+    if spec.lower().endswith(".json") and Path(spec).is_file():
+        p = Path(spec).resolve()
+        return p.stem, _read_layout_file(p)
+    layouts = load_layouts(extra_dirs)
+    for name, lay in layouts.items():
+        if name.lower() == spec.lower():
+            return name, lay
+    raise RuntimeError(f"Neznámý layout '{spec}'. Dostupné: {', '.join(sorted(layouts))}")
+
+def compile_layout(spec=None, extra_dirs=()):
+    """
+    Zkompiluje deklarativní layout do plánu (Excel adresa → DOM cíl):
+    {
+      "name": .., "sheet": "zdroj", "bounds": (r0, c0, r1, c1),
+      "doubles": [{"kind":"double","key":"c0","event":0,"row":2,
+                   "cells":(("home1",(2,4),"D2"), ...), "sets":((3,9),..), "sets_a1":"I3–M3",
+                   "dom":{"home1":"#c0 .cell-player:first-child", ...}}, ...],
+      "singles": [... "kind":"single", "key":"d0", "event":2 ...],
+      "by_key": {"c0": .., "d0": ..}
+    }
+    Plán se cachuje podle obsahu layoutu, takže se kompiluje jednou za běh.
+    """
+    name, lay = resolve_layout(spec, extra_dirs)
+    cache_key = json.dumps(lay, sort_keys=True, ensure_ascii=False)
+    plan = _PLAN_CACHE.get(cache_key)
+    if plan is not None:
+        return plan
 
-        log(f"Zpracovávám singl Excel#{excel_idx} → DOM d{dom_idx} → event #{event_idx}")
+    try:
+        home_c = a1_to_rc(f"{lay['home_col']}1")[1]
+        away_c = a1_to_rc(f"{lay['away_col']}1")[1]
+        set_cs = [a1_to_rc(f"{c}1")[1] for c in lay["set_cols"]]
+        dom_t  = dict(DOM_PLAYER_TARGETS, **(lay.get("dom") or {}))
+
+        def group(kind, g, fields):
+            out = []
+            rows = int(g.get("rows", 2 if kind == "double" else 1))
+            events = g.get("events")
+            for i in range(int(g.get("count", 0))):
+                top = int(g["first_row"]) + i * rows
+                sets_row = top + rows - 1
+                dom_id = f"{g.get('dom_prefix', 'c' if kind == 'double' else 'd')}{int(g.get('dom_first', 0)) + i}"
+                cells = []
+                for field in fields:
+                    r = top + (1 if field.endswith("2") else 0)
+                    c = home_c if field.startswith("home") else away_c
+                    cells.append((field, (r, c), _rc_to_a1(r, c)))
+                out.append({
+                    "kind":    kind,
+                    "key":     dom_id,
+                    "event":   int(events[i]) if events else int(g.get("event_first", 0)) + i,
+                    "row":     top,
+                    "cells":   tuple(cells),
+                    "sets":    tuple((sets_row, c) for c in set_cs),
+                    "sets_a1": f"{_rc_to_a1(sets_row, set_cs[0])}–{_rc_to_a1(sets_row, set_cs[-1])}" if set_cs else "",
+                    "dom":     {f: dom_t[f].replace("{id}", dom_id) for f in fields},
+                })
+            return out
+
+        doubles = group("double", lay.get("doubles") or {}, ("home1", "away1", "home2", "away2"))
+        singles = group("single", lay.get("singles") or {}, ("home", "away"))
+    except (KeyError, ValueError, TypeError, IndexError) as e:
+        raise RuntimeError(f"Layout '{name}' je neúplný nebo chybný: {e!r}")
+
+    addrs = [rc for t in doubles + singles for rc in [x[1] for x in t["cells"]] + list(t["sets"])]
+    if not addrs:
+        raise RuntimeError(f"Layout '{name}' nemá žádné buňky.")
+    plan = {
+        "name":    name,
+        "sheet":   lay.get("sheet") or ZDROJ_SHEET,
+        "bounds":  (min(r for r, _ in addrs), min(c for _, c in addrs),
+                    max(r for r, _ in addrs), max(c for _, c in addrs)),
+        "doubles": doubles,
+        "singles": singles,
+        "by_key":  {t["key"]: t for t in doubles + singles},
+    }
+    _PLAN_CACHE[cache_key] = plan
+    return plan
 
-        if match_data.get("home"):
-            log(f"[d{dom_idx}] home sel=#d{dom_idx} .cell-player:first-child  name={match_data['home']!r}")
-            _fill_player_by_click(page, f"#d{dom_idx} .cell-player:first-child", match_data["home"], log)
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL  = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PREL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_SST_REF = object()   # značka „hodnota je index do sharedStrings“ (dořeší se až na konci)
 
-        if match_data.get("away"):
-            log(f"[d{dom_idx}] away sel=#d{dom_idx} .cell-player:last-child   name={match_data['away']!r}")
-            _fill_player_by_click(page, f"#d{dom_idx} .cell-player:last-child",  match_data["away"], log)
+@functools.lru_cache(maxsize=4096)
+def _ref_to_rc(ref: str):
+    """'D2' -> (2, 4) bez regexu (adresy v sheet XML jsou vždy velkými písmeny)."""
+    col = 0
+    for i, ch in enumerate(ref):
+        if ch.isdigit():
+            return int(ref[i:]), col
+        col = col * 26 + (ord(ch) - 64)
+    raise ValueError(f"Bad A1 address: {ref}")
+
+def _xlsx_number(s: str):
+    # stejná pravidla jako openpyxl: desetinná tečka / exponent → float, jinak int
+    if "." in s or "E" in s or "e" in s:
+        return float(s)
+    return int(s)
+
+def _si_text(si) -> str:
+    # <si> = přímo <t>, nebo rich-text běhy <r><t>; fonetické <rPh> vynech
+    parts = []
+    for ch in si:
+        if ch.tag == f"{_NS_MAIN}t":
+            parts.append(ch.text or "")
+        elif ch.tag == f"{_NS_MAIN}r":
+            parts.extend(t.text or "" for t in ch.iter(f"{_NS_MAIN}t"))
+    return "".join(parts)
+
+# formáty čísel jako datum/čas – stejná pravidla jako openpyxl (is_date_format / is_timedelta_format)
+_NUMFMT_STRIP_RE = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+_NUMFMT_DATE_RE  = re.compile(r"(?<![_\\])[dmhysDMHYS]")
+_NUMFMT_TD_RE    = re.compile(r"\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?|\[ss?\](\.0*)?")
+_BUILTIN_DATE_FMTS = {14: "d", 15: "d", 16: "d", 17: "d", 18: "d", 19: "d", 20: "d", 21: "d", 22: "d",
+                      45: "d", 46: "td", 47: "d"}   # vestavěné numFmtId (46 = [h]:mm:ss)
+_EPOCH_1900 = datetime(1899, 12, 30)
+_EPOCH_1904 = datetime(1904, 1, 1)
+
+def _numfmt_kind(code):
+    """Kód formátu → "td" (trvání), "d" (datum/čas) nebo None (číslo)."""
+    first = code.split(";")[0]
+    if _NUMFMT_TD_RE.search(first):
+        return "td"
+    return "d" if _NUMFMT_DATE_RE.search(_NUMFMT_STRIP_RE.sub("", first)) else None
+
+def _excel_date(value, date1904=False, kind="d"):
+    """Sériové číslo Excelu → datetime / time (jen zlomek dne) / timedelta – jako openpyxl from_excel."""
+    if kind == "td":
+        td = timedelta(days=value)
+        if td.microseconds:
+            td = timedelta(seconds=td.total_seconds() // 1, microseconds=round(td.microseconds, -3))
+        return td
+    day, fraction = divmod(value, 1)
+    diff = timedelta(milliseconds=round(fraction * 86400 * 1000))
+    if 0 <= value < 1 and diff.days == 0:
+        return (datetime.min + diff).time()
+    if 0 < value < 60 and not date1904:
+        day += 1        # fiktivní 29. 2. 1900
+    return (_EPOCH_1904 if date1904 else _EPOCH_1900) + timedelta(days=day) + diff
+
+class FastXlsx:
+    """
+    Minimální čtečka XLSX jen pro čtení hodnot (data_only): otevře zip, najde list
+    podle workbook.xml, streamuje jeho XML přes iterparse a skončí, jakmile má
+    potřebné řádky. Vzorce ani ostatní listy se neparsují. sharedStrings se čtou
+    až na konci a jen do nejvyššího potřebného indexu; styles.xml až u prvního
+    čísla se stylem – datum/čas pak vrací jako datetime/time stejně jako openpyxl
+    (v Excelu napsané „11:7“ je čas, ne set).
+    """
 
-        if match_data.get("sets"):
-            _fill_sets_by_event_index(page, event_idx, match_data["sets"], log)
+    def __init__(self, path):
+        self.zf = zipfile.ZipFile(path)
+        self.date1904 = False
+        self.sheets = self._sheet_paths()   # {název: cesta v zipu}, v pořadí sešitu
+        self._sst = []
+        self._sst_fh = self._sst_iter = None
+        self._xf_kinds = None               # index stylu buňky (s=) → "d" / "td"; viz _style_kind
+
+    def close(self):
+        if self._sst_fh is not None:
+            self._sst_fh.close()
+        self.zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def _sheet_paths(self):
+        rels = {}
+        with self.zf.open("xl/_rels/workbook.xml.rels") as f:
+            for _ev, el in ET.iterparse(f):
+                if el.tag == f"{_NS_PREL}Relationship":
+                    tgt = el.get("Target", "")
+                    rels[el.get("Id")] = tgt.lstrip("/") if tgt.startswith("/") else f"xl/{tgt}"
+        out = {}
+        with self.zf.open("xl/workbook.xml") as f:
+            for _ev, el in ET.iterparse(f):
+                if el.tag == f"{_NS_MAIN}sheet":
+                    out[el.get("name")] = rels.get(el.get(f"{_NS_REL}id"))
+                elif el.tag == f"{_NS_MAIN}workbookPr":
+                    self.date1904 = el.get("date1904") in ("1", "true")
+        return out
+
+    def _style_kind(self, s: int):
+        """Index stylu buňky → "d" / "td" / None; cellXfs a numFmts se čtou jednou, až při potřebě."""
+        if self._xf_kinds is None:
+            self._xf_kinds = {}
+            if "xl/styles.xml" in self.zf.namelist():
+                custom, in_xfs, idx = {}, False, 0
+                with self.zf.open("xl/styles.xml") as f:
+                    for ev, el in ET.iterparse(f, events=("start", "end")):
+                        tag = el.tag
+                        if tag == f"{_NS_MAIN}cellXfs":
+                            in_xfs = ev == "start"
+                        elif ev == "start":
+                            continue
+                        elif tag == f"{_NS_MAIN}numFmt":
+                            custom[int(el.get("numFmtId"))] = el.get("formatCode") or ""
+                        elif tag == f"{_NS_MAIN}xf" and in_xfs:
+                            fid = int(el.get("numFmtId") or 0)
+                            kind = _numfmt_kind(custom[fid]) if fid in custom else _BUILTIN_DATE_FMTS.get(fid)
+                            if kind:
+                                self._xf_kinds[idx] = kind
+                            idx += 1
+        return self._xf_kinds.get(s)
+
+    def _shared_string(self, i: int) -> str:
+        # sharedStrings čteme inkrementálně – jen tak daleko, jak je potřeba
+        if self._sst_iter is None:
+            if "xl/sharedStrings.xml" not in self.zf.namelist():
+                raise IndexError(i)
+            self._sst_fh = self.zf.open("xl/sharedStrings.xml")
+            self._sst_iter = ET.iterparse(self._sst_fh)
+        while len(self._sst) <= i:
+            for _ev, el in self._sst_iter:
+                if el.tag == f"{_NS_MAIN}si":
+                    self._sst.append(_si_text(el))
+                    el.clear()
+                    break
+            else:
+                raise IndexError(i)
+        return self._sst[i]
+
+    def _iter_raw_rows(self, sheet, max_row=None, max_col=None):
+        """Yielduje (číslo řádku, {sloupec: surová hodnota}) – sdílené řetězce jako (_SST_REF, idx)."""
+        path = self.sheets.get(sheet)
+        if not path:
+            raise KeyError(sheet)
+        with self.zf.open(path) as f:
+            cells, row_no = {}, 0
+            for ev, el in ET.iterparse(f, events=("start", "end")):
+                tag = el.tag
+                if ev == "start":
+                    if tag == f"{_NS_MAIN}row":
+                        row_no = int(el.get("r") or row_no + 1)
+                        if max_row and row_no > max_row:
+                            return
+                        cells, col_no = {}, 0
+                    continue
+                if tag == f"{_NS_MAIN}c":
+                    ref = el.get("r")
+                    col_no = _ref_to_rc(ref)[1] if ref else col_no + 1
+                    if max_col and col_no > max_col:
+                        el.clear()
+                        continue
+                    t = el.get("t", "n")
+                    if t == "inlineStr":
+                        v = "".join(x.text or "" for x in el.iter(f"{_NS_MAIN}t")) or None
+                    else:
+                        v_el = el.find(f"{_NS_MAIN}v")
+                        s = v_el.text if v_el is not None else None
+                        if s is None:
+                            v = None
+                        elif t == "s":
+                            v = (_SST_REF, int(s))
+                        elif t == "n":
+                            v = _xlsx_number(s)
+                            st = el.get("s")
+                            if st and st != "0":
+                                kind = self._style_kind(int(st))
+                                if kind:
+                                    try:
+                                        v = _excel_date(v, self.date1904, kind)
+                                    except (OverflowError, ValueError):
+                                        v = "#VALUE!"   # jako openpyxl: číslo mimo rozsah data
+                        elif t == "b":
+                            v = s == "1"
+                        else:       # str / e / d
+                            v = s
+                    if v is not None:
+                        cells[col_no] = v
+                    el.clear()
+                elif tag == f"{_NS_MAIN}row":
+                    yield row_no, cells
+                    el.clear()
+                elif tag == f"{_NS_MAIN}sheetData":
+                    return
+
+    def _resolve(self, v):
+        if type(v) is tuple and v[0] is _SST_REF:
+            return self._shared_string(v[1])
+        return v
+
+    def read_block(self, sheet, bounds):
+        """Obdélník bounds=(r0,c0,r1,c1) → {(r,c): hodnota}; stejný tvar jako _read_block."""
+        r0, c0, r1, c1 = bounds
+        grid = {}
+        for r, cells in self._iter_raw_rows(sheet, max_row=r1, max_col=c1):
+            if r < r0:
+                continue
+            for c, v in cells.items():
+                if c >= c0:
+                    grid[(r, c)] = v
+        return {rc: self._resolve(v) for rc, v in grid.items()}
+
+    def iter_rows(self, sheet, max_col=None):
+        """Jako openpyxl iter_rows(values_only=True): řádky od 1, chybějící řádky jako ()."""
+        expect = 1
+        for r, cells in self._iter_raw_rows(sheet, max_col=max_col):
+            while expect < r:
+                yield ()
+                expect += 1
+            width = max(cells) if cells else 0
+            yield tuple(self._resolve(cells.get(c)) for c in range(1, width + 1))
+            expect = r + 1
+
+def _read_block(sh, bounds):
+    """Načte obdélník bounds=(r0,c0,r1,c1) jedním iter_rows → {(r,c): hodnota} (jen neprázdné)."""
+    r0, c0, r1, c1 = bounds
+    grid = {}
+    for r, row in enumerate(sh.iter_rows(min_row=r0, max_row=r1, min_col=c0, max_col=c1,
+                                         values_only=True), start=r0):
+        for c, v in enumerate(row, start=c0):
+            if v is not None:
+                grid[(r, c)] = v
+    return grid
+
+def _plan_values(t, grid):
+    """Hodnoty jednoho cíle plánu z načteného bloku (stejná pravidla jako cell_value/row_sets)."""
+    def txt(rc):
+        v = grid.get(rc)
+        return ("" if v is None else str(v)).strip()
+
+    out = {"key": t["key"], "event": t["event"]}
+    if t["kind"] == "single":
+        out["idx"] = t["event"]     # zpětná kompatibilita (idx = index eventu)
+    for field, rc, _a1 in t["cells"]:
+        out[field] = txt(rc)
+    sets = [txt(rc) or None for rc in t["sets"]]
+    # ořízni trailing None (I…M často nemají všech 5 setů)
+    while sets and sets[-1] is None:
+        sets.pop()
+    out["sets"] = sets
+    return out
 
-    # ==========================
-    # Uložit změny
-    # ==========================
-    log("Klikám 'Uložit změny'…")
+def _read_sheet_block(xlsx_path, sheet, bounds, engine=None, log=None):
+    """
+    Blok buněk listu → ({(r,c): hodnota}, použitý engine). Výchozí je FastXlsx;
+    při jeho selhání (nebo engine='openpyxl') čte openpyxl v read-only režimu.
+    """
+    if (engine or XLSX_ENGINE) == "fast":
+        try:
+            with FastXlsx(xlsx_path) as x:
+                if sheet in x.sheets:
+                    return x.read_block(sheet, bounds), "fast"
+                names = x.sheetnames
+            raise RuntimeError(f"V sešitu chybí list '{sheet}'. Máš: {', '.join(names)}")
+        except RuntimeError:
+            raise
+        except Exception as e:
+            if log:
+                log(f"[EXCEL] rychlá čtečka selhala ({e!r}) → openpyxl")
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
     try:
-        page.locator("input[name='ulozit']").click(timeout=5000)
-        page.wait_for_timeout(1000)
-        log("Změny uloženy.")
-    except Exception as e:
-        log(f"Uložení selhalo: {e!r}")
-
+        if sheet not in wb.sheetnames:
+            raise RuntimeError(f"V sešitu chybí list '{sheet}'. Máš: {', '.join(wb.sheetnames)}")
+        return _read_block(wb[sheet], bounds), "openpyxl"
+    finally:
+        wb.close()
 
-def read_zdroj_data(xlsx_path, log):
+def read_zdroj_data(xlsx_path, log, layout=None, engine=None):
     """
+    Načte list "zdroj" podle layoutu (viz compile_layout) – jedním blokovým čtením.
     Vrátí:
     {
       "doubles": [
-        {"home1":..,"home2":..,"away1":..,"away2":..,"sets":[...]} ,   # c0
-        {"home1":..,"home2":..,"away1":..,"away2":..,"sets":[...]}     # c1
+        {"key":"c0","event":0,"home1":..,"away1":..,"home2":..,"away2":..,"sets":[...]},
+        ...
       ],
       "singles": [
-        {"idx": 2, "home":.., "away":.., "sets":[...]},   # d0 (Excel ř.7)
+        {"key":"d0","event":2,"idx":2,"home":..,"away":..,"sets":[...]},   # výchozí layout: Excel ř.7
         ...
-        {"idx":17, "home":.., "away":.., "sets":[...]}    # d15 (Excel ř.22)
       ]
     }
     """
-    wb = load_workbook(xlsx_path, data_only=True)
-    if "zdroj" not in wb.sheetnames:
-        raise RuntimeError(f"V sešitu chybí list 'zdroj'. Máš: {', '.join(wb.sheetnames)}")
-    sh = wb["zdroj"]
+    plan = compile_layout(layout, extra_dirs=(Path(xlsx_path).parent,))
+    grid, used = _read_sheet_block(xlsx_path, plan["sheet"], plan["bounds"], engine, log)
 
     log("== DEBUG EXCEL START ==")
+    log(f"[EXCEL] layout={plan['name']} list={plan['sheet']} blok={_rc_to_a1(*plan['bounds'][:2])}:{_rc_to_a1(*plan['bounds'][2:])} engine={used}")
 
-    # ---- Doubles #1 (c0) ----
-    c0 = {
-        "home1": cell_value(sh, "D2"),
-        "home2": cell_value(sh, "D3"),
-        "away1": cell_value(sh, "E2"),
-        "away2": cell_value(sh, "E3"),
-        "sets":  row_sets(sh, 3)
-    }
-    log(f"[EXCEL] c0.home1 D2 = {c0['home1']!r}")
-    log(f"[EXCEL] c0.home2 D3 = {c0['home2']!r}")
-    log(f"[EXCEL] c0.away1 E2 = {c0['away1']!r}")
-    log(f"[EXCEL] c0.away2 E3 = {c0['away2']!r}")
-    log(f"[EXCEL] c0.sets  I3–M3 = {c0['sets']}")
-
-    # ---- Doubles #2 (c1) ----
-    c1 = {
-        "home1": cell_value(sh, "D4"),
-        "home2": cell_value(sh, "D5"),
-        "away1": cell_value(sh, "E4"),
-        "away2": cell_value(sh, "E5"),
-        "sets":  row_sets(sh, 5)
-    }
-    log(f"[EXCEL] c1.home1 D4 = {c1['home1']!r}")
-    log(f"[EXCEL] c1.home2 D5 = {c1['home2']!r}")
-    log(f"[EXCEL] c1.away1 E4 = {c1['away1']!r}")
-    log(f"[EXCEL] c1.away2 E5 = {c1['away2']!r}")
-    log(f"[EXCEL] c1.sets  I5–M5 = {c1['sets']}")
-
-    doubles = [c0, c1]
-
-    # ---- Singles d0..d15 (Excel řádky 7..22) ----
-    singles = []
-    excel_row = 7
-    for excel_idx in range(2, 18):  # 2..17
-        home = cell_value(sh, f"D{excel_row}")
-        away = cell_value(sh, f"E{excel_row}")
-        sets = row_sets(sh, excel_row)
-
-        log(f"[EXCEL] d{excel_idx-2}: idx={excel_idx}  D{excel_row}='{home}'  E{excel_row}='{away}'  I{excel_row}-M{excel_row}={sets}")
-
-        singles.append({
-            "idx":  excel_idx,   # POZOR: tohle používáme pro event_idx (sety)
-            "home": home,
-            "away": away,
-            "sets": sets
-        })
-        excel_row += 1
+    doubles, singles = [], []
+    for t in plan["doubles"] + plan["singles"]:
+        vals = _plan_values(t, grid)
+        cells = "  ".join(f"{f}@{a1}={vals[f]!r}" for f, _rc, a1 in t["cells"])
+        log(f"[EXCEL] {t['key']}: event={t['event']}  {cells}  {t['sets_a1']}={vals['sets']}")
+        (doubles if t["kind"] == "double" else singles).append(vals)
 
     out = {"doubles": doubles, "singles": singles}
 
     # Souhrn
     log(f"[EXCEL] SUMMARY doubles: {[(d['home1'],d['home2'],d['away1'],d['away2'],d['sets']) for d in doubles]}")
-    log(f"[EXCEL] SUMMARY singles count={len(singles)} first={singles[0]} last={singles[-1]}")
+    if singles:
+        log(f"[EXCEL] SUMMARY singles count={len(singles)} first={singles[0]} last={singles[-1]}")
     log("== DEBUG EXCEL END ==")
     return out
-        
+
+_SET_RE = re.compile(r"-?\d{1,2}|\d{1,2}:\d{1,2}")
+
+def _check_set(v) -> bool:
+    s = str(v).strip()
+    return bool(_SET_RE.fullmatch(s)) or str(_map_wo(s)) in ("101", "-101")
+
+def _validate_match(data, team, index):
+    """Kontroly bez prohlížeče → (chyby, varování)."""
+    errors, warnings = [], []
+    if not index.get("login") or not index.get("pwd"):
+        errors.append("chybí login/heslo")
+    if team is not None and not re.fullmatch(r"\d+", str(team.get("id") or "")):
+        errors.append(f"družstvo '{team.get('name')}' nemá číselné ID ({team.get('id')!r})")
+    for e in (data.get("doubles") or []) + (data.get("singles") or []):
+        fields = ("home1", "away1", "home2", "away2") if "home1" in e else ("home", "away")
+        names = [e.get(f) for f in fields]
+        sets = e.get("sets") or []
+        if any(names) and not all(names):
+            warnings.append(f"{e.get('key')}: chybí hráč ({', '.join(f for f, n in zip(fields, names) if not n)})")
+        if sets and not any(names):
+            warnings.append(f"{e.get('key')}: sety bez hráčů")
+        if any(names) and not sets:
+            warnings.append(f"{e.get('key')}: hráči bez setů")
+        if None in sets:
+            warnings.append(f"{e.get('key')}: mezera mezi sety {sets}")
+        bad = [s for s in sets if s is not None and not _check_set(s)]
+        if bad:
+            errors.append(f"{e.get('key')}: neznámý formát setu {bad}")
+    return errors, warnings
+
+def _bulk_worker(task):
+    """Jeden sešit v procesu poolu → dict pro JSON řádek (musí být top-level kvůli pickle)."""
+    path, mode, team_name, layout, engine = task
+    t0 = time.perf_counter()
+    out = {"file": str(path), "ok": False}
+    quiet = lambda *a: None
+    try:
+        index = load_team_index(path, engine)
+        team = None
+        if team_name:
+            _login, _pwd, team = read_excel_config(path, team_name, engine=engine)
+        elif not index["teams"]:
+            raise RuntimeError("V sešitu jsem nenašel tabulku Teams.")
+        lay = layout or (team or {}).get("layout")
+        data = read_zdroj_data(path, quiet, layout=lay, engine=engine)
+        out["layout"] = compile_layout(lay, extra_dirs=(Path(path).parent,))["name"]
+        if mode == "validate":
+            errors, warnings = _validate_match(data, team, index)
+            out.update(ok=not errors, errors=errors, warnings=warnings)
+        else:
+            # přihlašovací údaje do výstupu nikdy nepatří
+            out.update(ok=True, team=team,
+                       teams=None if team else [{"name": t["name"], "id": t["id"]} for t in index["teams"].values()],
+                       doubles=data["doubles"], singles=data["singles"])
+    except Exception as e:
+        out.update(error=str(e) or repr(e))
+        if mode == "validate":
+            out.update(errors=[str(e) or repr(e)], warnings=[])
+    out["ms"] = int((time.perf_counter() - t0) * 1000)
+    return out
+
+def _bulk_paths(inputs):
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            for f in sorted(p.rglob("*.xlsx")):
+                if not f.name.startswith("~$"):   # zámky otevřených sešitů
+                    yield f
+        else:
+            yield p
+
+def _std_stream(name, hint):
+    """sys.stdin / sys.stdout – v EXE bez konzole (--noconsole) jsou None → srozumitelná chyba místo AttributeError."""
+    stream = getattr(sys, name)
+    if stream is None:
+        raise RuntimeError(f"Program běží bez konzole (sys.{name} není k dispozici) – {hint}.")
+    return stream
+
+def bulk_process(inputs, mode="parse", team=None, layout=None, engine=None, workers=None,
+                 chunk=None, out=None):
+    """
+    Hromadné parse/validate sešitů přes ProcessPoolExecutor; výsledky průběžně jako JSON lines do `out`.
+    Rozpracovaných je najednou nejvýš `chunk` sešitů (výchozí 4× workers) → paměť nezávisí na počtu souborů.
+    workers=1 běží bez poolu v aktuálním procesu. Vrací {"files", "ok", "failed", "seconds"}.
+    """
+    out = out or _std_stream("stdout", "zadej výstupní soubor (--out)")
+    workers = max(1, workers or os.cpu_count() or 1)
+    chunk = max(1, chunk or workers * 4)
+    tasks = ((p, mode, team, layout, engine) for p in _bulk_paths(inputs))
+    stats = {"files": 0, "ok": 0, "failed": 0}
+    t0 = time.perf_counter()
+
+    def emit(res):
+        stats["files"] += 1
+        stats["ok" if res["ok"] else "failed"] += 1
+        out.write(json.dumps(res, ensure_ascii=False, default=str) + "\n")
+
+    if workers == 1:
+        for task in tasks:
+            emit(_bulk_worker(task))
+    else:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+            pending = set()
+            for task in tasks:
+                pending.add(ex.submit(_bulk_worker, task))
+                if len(pending) >= chunk:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for f in done:
+                        emit(f.result())
+            for f in concurrent.futures.as_completed(pending):
+                emit(f.result())
+    out.flush()
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+_BOOT_LINES = []   # řádky boot logu čekající na boot_flush()
+
 def boot(msg: str):
-    """Zapíš krátkou zprávu ještě před main() – přežije i selhání argparse."""
-    line = f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {msg}\n"
+    """Poznamenej krátkou zprávu do boot logu; na disk ji zapíše až boot_flush() (konec, pád, atexit)."""
+    _BOOT_LINES.append(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {msg}\n")
+
+def boot_flush():
+    """Zapiš nasbírané řádky boot logu na obě místa jedním otevřením souboru – přežije i selhání argparse."""
+    if not _BOOT_LINES:
+        return
+    text = "".join(_BOOT_LINES)
+    _BOOT_LINES.clear()
     for p in BOOT_FILES:
         try:
             p.parent.mkdir(parents=True, exist_ok=True)
             with open(p, "a", encoding="utf-8") as f:
-                f.write(line)
+                f.write(text)
         except Exception:
             pass
 
@@ -921,11 +2654,13 @@ def make_logger(xlsx_path: Path):
     """Vrátí (log_fn, file_handle, log_path) – loguje s časovou značkou."""
     log_path = xlsx_path.with_suffix(".stislog.txt")
     f = open(log_path, "a", encoding="utf-8")
+    lock = threading.Lock()   # pipeline startu: sešit se čte (a loguje) ve vlákně
     def log(*parts):
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         line = " ".join(str(p) for p in parts)
-        f.write(f"[{ts}] {line}\n")
-        f.flush()
+        with lock:
+            f.write(f"[{ts}] {line}\n")
+            f.flush()
     return log, f, log_path
 
 def ensure_pw_browsers(log=None):
@@ -1028,194 +2763,429 @@ def get_setup_sheet(wb):
             return ws
     return wb.active
 
-def find_login_pwd(ws):
-    """Vrátí login/heslo. Nejprve z B1/B2, když chybí, zkusí popisky 'login' / 'heslo' v horní části listu."""
-    login = str(ws["B1"].value or "").strip()
-    pwd   = str(ws["B2"].value or "").strip()
-    if login and pwd:
-        return login, pwd
+TEAMS_ID_MARKERS = ("druzstvoid", "id_druzstva", "iddruzstva")  # žádné volné "id" jako podřetězec!
+TEAMS_HDR_MAX_ROW = 60   # hlavičku Teams hledáme jen v horní části listu…
+TEAMS_HDR_MAX_COL = 80   # …a v prvních sloupcích
+LOGIN_MAX_ROW     = 30   # popisky 'login'/'heslo'
+LOGIN_MAX_COL     = 20
 
-    max_r = min(30, ws.max_row or 0)
-    max_c = min(20, ws.max_column or 0)
-    found_login = found_pwd = ""
-    for r in range(1, max_r + 1):
-        for c in range(1, max_c + 1):
-            v = norm(ws.cell(r, c).value or "")
-            if v == "login" and c + 1 <= (ws.max_column or 0):
-                found_login = str(ws.cell(r, c + 1).value or "").strip()
-            if v == "heslo" and c + 1 <= (ws.max_column or 0):
-                found_pwd = str(ws.cell(r, c + 1).value or "").strip()
-    return found_login, found_pwd
+_TEAM_INDEX_CACHE = {}   # (cesta, mtime, velikost) -> index z index_teams_rows
 
-def find_teams_header_anywhere(wb):
-    """
-    Projdi všechny listy a najdi první řádek, kde je hlavička tabulky Teams:
-      - obsahuje 'druzstvo' (ale ne 'id' / 'vedouci')
-      - a zároveň některý JASNÝ marker ID ('druzstvoid', 'id_druzstva', 'iddruzstva') nebo PŘESNĚ 'id'
-    Vrací (sheet, hdr_row) nebo (None, None).
-    """
-    strict_id_markers = ("druzstvoid", "id_druzstva", "iddruzstva")  # žádné volné "id" jako podřetězec!
-    for ws in wb.worksheets:
-        max_r = min(60, ws.max_row or 0)
-        max_c = min(80, ws.max_column or 0)
-        for r in range(1, max_r + 1):
-            row_norm = [norm(ws.cell(r, c).value or "") for c in range(1, max_c + 1)]
-            has_name = any(("druzstvo" in v and "id" not in v and "vedouci" not in v) for v in row_norm)
-            has_id   = any(any(m in v for m in strict_id_markers) or (v == "id") for v in row_norm)
-            if has_name and has_id:
-                return ws, r
-    return None, None
+@functools.lru_cache(maxsize=8192)
+def _norm_text(s: str) -> str:
+    return norm(s)
 
-def open_match_form(page, log):
-    """Na stránce družstva otevře formulář – preferuje 'vložit zápis', jinak 'upravit zápis'.
-       Zkouší text i href (zapis_start.php / online.php). Vrací True/False.
-    """
-    try:
-        page.wait_for_selector(
-            "a:has-text('vložit zápis'), a:has-text('upravit zápis'), "
-            "a[href*='zapis_start.php?u='], a[href*='online.php?u=']",
-            timeout=15000
-        )
-    except Exception:
-        log("Nenalezl jsem žádný z očekávaných odkazů do 15 s.")
-        return False
+def _norm_row(row, max_c):
+    # čísla/datumy nikdy nejsou popisek ani hlavička → normalizuj jen text
+    return [_norm_text(v) if isinstance(v, str) else "" for v in row[:max_c]]
 
-    candidates = [
-        page.get_by_role("link", name=re.compile(r"vložit\s*zápis", re.I)),
-        page.get_by_role("link", name=re.compile(r"upravit\s*zápis", re.I)),
-        page.locator("a[href*='zapis_start.php?u=']"),
-        page.locator("a[href*='online.php?u=']"),
-    ]
+def _is_teams_header(row_norm) -> bool:
+    """Hlavička Teams: 'druzstvo' (ne id/vedouci) + jasný marker ID nebo přesně 'id'."""
+    has_name = any(("druzstvo" in v and "id" not in v and "vedouci" not in v) for v in row_norm)
+    has_id   = any(any(m in v for m in TEAMS_ID_MARKERS) or (v == "id") for v in row_norm)
+    return has_name and has_id
 
-    for i, sel in enumerate(candidates, 1):
-        try:
-            if sel.count():
-                log(f"Zkouším selector {i}")
-                sel.first.click(timeout=5000)
-                page.wait_for_load_state("domcontentloaded")
-
-                if page.locator("text=/vkládání zápisu/i").count() \
-                   or "online.php?u=" in page.url \
-                   or "zapis_start.php?u=" in page.url:
-                    log("Formulář otevřen na URL:", page.url)
-                    return True
-
-                if page.locator("text=/špatn.*url/i").count():
-                    log("Server hlásí 'špatné URL' – zkusím jiný odkaz.")
-                    page.go_back()
-                    page.wait_for_load_state("domcontentloaded")
-        except Exception as e:
-            log(f"Selector {i} selhal:", repr(e))
+def _map_team_columns(hdr_norm):
+    """Namapuje sloupce podle hlavičky → {klíč: 0-based index} (ID detekuj STRIKTNĚ + vyluč 'vedouci*')."""
+    idx = {}
+    for c, h in enumerate(hdr_norm):
+        # Družstvo (název)
+        if ("druzstvo" in h) and ("id" not in h) and ("vedouci" not in h):
+            idx["name"] = c
 
-    # poslední záchrana – proskenuj všechny <a> a skoč přímo na vyhovující href
-    try:
-        anchors = page.eval_on_selector_all(
-            "a",
-            "els => els.map(a => ({text: (a.textContent||'').trim(), href: a.href||''}))"
-        )
-        for a in anchors:
+        # ID družstva – akceptuj jasné varianty a/nebo přesné 'id', nikdy ne cokoliv s 'vedouci'
+        if (any(m in h for m in TEAMS_ID_MARKERS) or h == "id") and ("vedouci" not in h):
+            idx["id"] = c
+
+        # Vedoucí domácích / hostů
+        if "vedoucidomacich" in h or ("vedouci" in h and "host" not in h):
+            idx["ved_dom"] = c
+        if "vedoucihostu" in h or ("vedouci" in h and "host" in h):
+            idx["ved_host"] = c
+
+        # Herna, začátek, konec
+        if "herna" in h:
+            idx["herna"] = c
+        if "zacatekut" in h or "zacatek" in h:
+            idx["zacatek"] = c
+        if "konecutkani" in h or "konec" in h:
+            idx["konec"] = c
+
+        # Formát soutěže (jméno layoutu pro list "zdroj")
+        if h in ("layout", "format", "soutez", "formatsouteze"):
+            idx["layout"] = c
+    return idx
+
+def _team_from_row(row, idx):
+    def getcol(key):
+        c = idx.get(key)
+        return row[c] if c is not None and c < len(row) else None
+    raw_z = getcol("zacatek")
+    raw_k = getcol("konec")
+    return {
+        "name":    str(getcol("name")).strip(),
+        "id":      str(getcol("id") or "").strip(),
+        "ved_dom": getcol("ved_dom"),
+        "ved_host":getcol("ved_host"),
+        "herna":   getcol("herna"),
+        "layout":  str(getcol("layout") or "").strip() or None,
+        # uchovej RAW hodnoty + parsed řetězec HH:MM
+        "zacatek_raw": raw_z,
+        "konec_raw":   raw_k,
+        "zacatek":     as_time_txt(raw_z),
+        "konec":       as_time_txt(raw_k),
+    }
+
+def index_teams_rows(sheets):
+    """
+    Jeden streamovaný průchod přes `sheets` = [(název listu, iterátor řádků jako tuple hodnot), …].
+    V prvním listu s hlavičkou Teams naráz posbírá login/heslo, mapování sloupců
+    a VŠECHNA družstva. Ostatní listy se čtou jen do TEAMS_HDR_MAX_ROW řádků.
+    Vrací:
+    {
+      "sheet": název | None, "hdr_row": r, "cols": {...},
+      "login": .., "pwd": ..,
+      "teams": {název.lower(): dict družstva},   # první výskyt vyhrává
+      "top_rows": {list: [řádky]}                # surové horní řádky pro diagnostiku
+    }
+    """
+    out = {"sheet": None, "hdr_row": None, "cols": {}, "login": "", "pwd": "",
+           "teams": {}, "top_rows": {}}
+    for title, rows in sheets:
+        top = out["top_rows"].setdefault(title, [])
+        b1 = b2 = ""
+        found_login = found_pwd = ""
+        hdr_row, idx, in_table = None, None, False
+        for r, row in enumerate(rows, start=1):
+            if r <= 15:
+                top.append(row[:LOGIN_MAX_COL])
+            if r <= 2 and len(row) >= 2:
+                v = str(row[1] or "").strip()
+                if r == 1: b1 = v
+                else:      b2 = v
+
+            scan_hdr = hdr_row is None
+            if scan_hdr and r > TEAMS_HDR_MAX_ROW:
+                break
+            # normalizace řádku jen tam, kde je potřeba (hlavička / popisky), a jen jednou
+            row_norm = _norm_row(row, TEAMS_HDR_MAX_COL) if (scan_hdr or r <= LOGIN_MAX_ROW) else None
+            if r <= LOGIN_MAX_ROW:
+                for c, nv in enumerate(row_norm[:LOGIN_MAX_COL]):
+                    if nv == "login" and c + 1 < len(row):
+                        found_login = str(row[c + 1] or "").strip()
+                    elif nv == "heslo" and c + 1 < len(row):
+                        found_pwd = str(row[c + 1] or "").strip()
+
+            if scan_hdr:
+                if _is_teams_header(row_norm):
+                    hdr_row, idx = r, _map_team_columns(row_norm)
+                    in_table = "name" in idx and "id" in idx
+                continue
+
+            if in_table:
+                c = idx["name"]
+                nm = row[c] if c < len(row) else None
+                if nm is None or str(nm).strip() == "":
+                    in_table = False
+                else:
+                    out["teams"].setdefault(str(nm).strip().lower(), _team_from_row(row, idx))
+            if not in_table and r >= LOGIN_MAX_ROW:
+                break
+        close = getattr(rows, "close", None)   # streamovaný list dál nečteme
+        if close:
+            close()
+
+        if hdr_row is not None:
+            out.update(sheet=title, hdr_row=hdr_row, cols=idx)
+            if b1 and b2:
+                out["login"], out["pwd"] = b1, b2
+            else:
+                out["login"], out["pwd"] = found_login, found_pwd
+            break
+    return out
+
+def index_teams(wb):
+    """index_teams_rows nad openpyxl sešitem (iter_rows(values_only=True))."""
+    return index_teams_rows((ws.title, ws.iter_rows(values_only=True)) for ws in wb.worksheets)
+
+def load_team_index(xlsx_path, engine=None):
+    """Index družstev pro sešit – cachovaný podle (cesta, mtime, velikost); opakovaný dotaz = dict hit."""
+    p = Path(xlsx_path).resolve()
+    st = p.stat()
+    key = (str(p), st.st_mtime_ns, st.st_size)
+    index = _TEAM_INDEX_CACHE.get(key)
+    if index is not None:
+        return index
+
+    if (engine or XLSX_ENGINE) == "fast":
+        try:
+            with FastXlsx(p) as x:
+                index = index_teams_rows((title, x.iter_rows(title, max_col=TEAMS_HDR_MAX_COL))
+                                         for title in x.sheetnames)
+            index["engine"] = "fast"
+        except Exception:
+            index = None            # → openpyxl
+    if index is None:
+        wb = load_workbook(p, read_only=True, data_only=True)
+        try:
+            index = index_teams(wb)
+        finally:
+            wb.close()
+        index["engine"] = "openpyxl"
+    _TEAM_INDEX_CACHE[key] = index
+    return index
+
+def find_login_pwd(ws):
+    """Vrátí login/heslo. Nejprve z B1/B2, když chybí, zkusí popisky 'login' / 'heslo' v horní části listu."""
+    login = str(ws["B1"].value or "").strip()
+    pwd   = str(ws["B2"].value or "").strip()
+    if login and pwd:
+        return login, pwd
+
+    found_login = found_pwd = ""
+    for row in ws.iter_rows(max_row=LOGIN_MAX_ROW, max_col=LOGIN_MAX_COL + 1, values_only=True):
+        for c, nv in enumerate(_norm_row(row, LOGIN_MAX_COL)):
+            if nv == "login" and c + 1 < len(row):
+                found_login = str(row[c + 1] or "").strip()
+            elif nv == "heslo" and c + 1 < len(row):
+                found_pwd = str(row[c + 1] or "").strip()
+    return found_login, found_pwd
+
+def find_teams_header_anywhere(wb):
+    """
+    Projdi všechny listy a najdi první řádek, kde je hlavička tabulky Teams:
+      - obsahuje 'druzstvo' (ale ne 'id' / 'vedouci')
+      - a zároveň některý JASNÝ marker ID ('druzstvoid', 'id_druzstva', 'iddruzstva') nebo PŘESNĚ 'id'
+    Vrací (sheet, hdr_row) nebo (None, None).
+    """
+    for ws in wb.worksheets:
+        for r, row in enumerate(ws.iter_rows(max_row=TEAMS_HDR_MAX_ROW, max_col=TEAMS_HDR_MAX_COL,
+                                             values_only=True), start=1):
+            if _is_teams_header(_norm_row(row, TEAMS_HDR_MAX_COL)):
+                return ws, r
+    return None, None
+
+_MATCH_LINKS_JS = """
+els => els.map(a => {
+  const tr = a.closest('tr');
+  return {href: a.href || '', text: (a.textContent || '').trim(),
+          row: tr ? Array.from(tr.cells).map(td => (td.textContent || '').trim()) : []};
+})
+"""
+
+def scan_match_links(page):
+    """
+    Jeden průchod stránkou družstva: všechny odkazy do zápisu (zapis_start/online ?u=) s datem
+    a kolem z řádku tabulky → [{"u", "url", "kind": start|online, "date": YYYY-MM-DD|None, "round"}].
+    """
+    out = []
+    for a in page.eval_on_selector_all("a[href*='zapis_start.php?u='], a[href*='online.php?u=']",
+                                       _MATCH_LINKS_JS) or []:
+        m = re.search(r"(zapis_start|online)\.php\?u=(\d+)", a.get("href", ""), re.I)
+        if not m:
+            continue
+        row = " | ".join(a.get("row") or [])
+        d = re.search(r"(\d{1,2})\.\s*(\d{1,2})\.\s*(\d{4})", row)
+        r = re.search(r"(\d+)\.\s*kolo", row, re.I) or re.match(r"\s*(\d+)\.?\s*\|", row)
+        out.append({"u": m.group(2), "url": a["href"], "kind": "start" if m.group(1).lower() == "zapis_start" else "online",
+                    "date": f"{d.group(3)}-{int(d.group(2)):02d}-{int(d.group(1)):02d}" if d else None,
+                    "round": r.group(1) if r else None})
+    return out
+
+class MatchUrlCache:
+    """
+    Přímé URL formulářů zápasů: {ID družstva: {datum zápasu: {"url", "u", "kind", "round", "seen"}}}
+    v state_dir()/MATCH_URLS_FILE. Plní se jedním scan_match_links na stránce družstva (všechny
+    nadcházející zápasy naráz); další běh/úloha pak jde rovnou na formulář. Odkaz bez data v řádku
+    se uloží jen pod datum běhu, a jen když je na stránce jediný – jinak by příští kolo trefilo starý zápas.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else state_dir() / MATCH_URLS_FILE
+        self.data = {}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f).get("teams") or {}
+        except FileNotFoundError:
+            pass
+        except Exception:
+            self.data = {}
+
+    def lookup(self, team_id, match_date):
+        e = (self.data.get(str(team_id)) or {}).get(match_date)
+        return e["url"] if e else None
+
+    def put(self, team_id, match_date, url, u=None, kind=None, round_=None):
+        self.data.setdefault(str(team_id), {})[match_date] = {
+            "url": url, "u": u, "kind": kind, "round": round_, "seen": round(time.time())}
+        self.dirty = True
+
+    def remember(self, team_id, match_date, links):
+        """Výsledek scan_match_links; 'vložit' (start) má přednost před 'upravit' (online) stejného data."""
+        dated = [l for l in links if l["date"]]
+        if not dated and len({l["u"] for l in links}) == 1:
+            dated = [dict(links[0], date=match_date)]
+        for l in sorted(dated, key=lambda l: l["kind"] == "start"):
+            self.put(team_id, l["date"], l["url"], l["u"], l["kind"], l["round"])
+        return len({l["date"] for l in dated})
+
+    def invalidate(self, team_id, match_date):
+        if (self.data.get(str(team_id)) or {}).pop(match_date, None):
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        cutoff = datetime.fromtimestamp(time.time() - MATCH_URLS_KEEP_D * 86400).strftime("%Y-%m-%d")
+        for tid in list(self.data):
+            self.data[tid] = {d: e for d, e in self.data[tid].items() if d >= cutoff}
+            if not self.data[tid]:
+                del self.data[tid]
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated": datetime.now().isoformat(timespec="seconds"), "teams": self.data}, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+_MATCH_URLS = None   # MatchUrlCache – načte se až při prvním použití
+
+def match_urls():
+    global _MATCH_URLS
+    if _MATCH_URLS is None:
+        _MATCH_URLS = MatchUrlCache()
+    return _MATCH_URLS
+
+def _form_opened(page):
+    """(otevřeno, 'špatné URL') po přímé navigaci na formulář zápasu."""
+    if page.locator("text=/špatn.*url/i").count():
+        return False, True
+    return bool("online.php?u=" in page.url or "zapis_start.php?u=" in page.url
+                or page.locator("text=/vkládání zápisu/i").count()), False
+
+# skupiny lokátorů, které najdou TENTÝŽ odkaz; pořadí skupin = priorita (vložit → upravit → sken)
+OPEN_FORM_GROUPS = (("vlozit", "href_start"), ("upravit", "href_online"), ("scan",))
+
+def open_match_form(page, log, budget=None):
+    """Na stránce družstva otevře formulář – VŽDY nejdřív 'vložit zápis' (zapis_start.php), pak
+       'upravit zápis' (online.php), nakonec sken odkazů (OPEN_FORM_GROUPS). StrategyCache učí jen
+       pořadí lokátorů uvnitř skupiny – text vs. href najdou tentýž odkaz. Vrací True/False.
+       Timeouty se berou ze zbytku `budget`; po jeho vyčerpání se zbylé kandidáty přeskočí.
+    """
+    b = budget or Budget("open_form")
+    try:
+        page.wait_for_selector(
+            "a:has-text('vložit zápis'), a:has-text('upravit zápis'), "
+            "a[href*='zapis_start.php?u='], a[href*='online.php?u=']",
+            timeout=b.ms(15000)
+        )
+    except Exception:
+        log("Nenalezl jsem žádný z očekávaných odkazů do 15 s.")
+        return False
+
+    def opened():
+        return page.locator("text=/vkládání zápisu/i").count() \
+            or "online.php?u=" in page.url or "zapis_start.php?u=" in page.url
+
+    def click_link(sel):
+        # None = na stránce není (neučí se), True/False = otevřel / neotevřel formulář
+        if not sel.count():
+            return None
+        with guarded("open_form", log):
+            sel.first.click(timeout=b.ms(5000))
+            page.wait_for_load_state("domcontentloaded", timeout=b.ms(15000))
+        if opened():
+            return True
+        if page.locator("text=/špatn.*url/i").count():
+            log("Server hlásí 'špatné URL' – zkusím jiný odkaz.")
+            with guarded("go_back", log):
+                page.go_back(timeout=b.ms(15000))
+                page.wait_for_load_state("domcontentloaded", timeout=b.ms(15000))
+        return False
+
+    def scan_anchors():
+        # proskenuj všechny <a> a skoč přímo na vyhovující href
+        anchors = page.eval_on_selector_all(
+            "a",
+            "els => els.map(a => ({text: (a.textContent||'').trim(), href: a.href||''}))"
+        )
+        # nový zápis (zapis_start) má přednost před úpravou (online), stejně jako u lokátorů
+        anchors.sort(key=lambda a: 0 if re.search(r"zapis_start\.php", a.get("href", ""), re.I) else 1)
+        for a in anchors:
             if re.search(r"(zapis_start\.php|online\.php)\?u=\d+", a.get("href",""), re.I):
                 log("Jdu přímo na", a["href"])
-                page.goto(a["href"], wait_until="domcontentloaded")
+                with guarded("goto", log) as http:
+                    http(page.goto(a["href"], wait_until="domcontentloaded", timeout=b.ms(20000)))
                 return True
-    except Exception as e:
-        log("Fallback scan anchorů selhal:", repr(e))
+        return None
+
+    tries = {
+        "vlozit":      lambda: click_link(page.get_by_role("link", name=re.compile(r"vložit\s*zápis", re.I))),
+        "upravit":     lambda: click_link(page.get_by_role("link", name=re.compile(r"upravit\s*zápis", re.I))),
+        "href_start":  lambda: click_link(page.locator("a[href*='zapis_start.php?u=']")),
+        "href_online": lambda: click_link(page.locator("a[href*='online.php?u=']")),
+        "scan":        scan_anchors,    # poslední záchrana
+    }
+    # pořadí skupin pevné; uvnitř skupiny podle toho, co na stránce s tímto otiskem naposledy fungovalo
+    fp = page_fingerprint(page)
+    order = [n for grp in OPEN_FORM_GROUPS for n in strategies().order("open_form", fp, list(grp))]
+    for i, name in enumerate(order, 1):
+        if b.expired:
+            b.overrun(f"strategie {name}")
+            log(f"⏱ Rozpočet pro otevření formuláře vyčerpán – strategie {name}+ přeskakuji.")
+            break
+        try:
+            ok = tries[name]()
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            log(f"Strategie {name} selhala:", repr(e))
+            ok = False
+        if ok is not None:
+            strategies().record("open_form", fp, name, ok)
+        if ok:
+            log(f"Formulář otevřen ({name}, pokus {i}) na URL:", page.url)
+            return True
 
     return False
 
-def read_excel_config(xlsx_path: Path, team_name: str):
+def read_excel_config(xlsx_path: Path, team_name: str, engine=None):
     """
-    Najde list s tabulkou Teams kdekoli v sešitu, přihlášení bere z B1/B2
-    (nebo z popisků 'login'/'heslo'), namapuje sloupce a vrátí login, heslo a dict týmu.
+    Najde tabulku Teams kdekoli v sešitu (jeden streamovaný průchod, viz index_teams_rows),
+    přihlášení bere z B1/B2 (nebo z popisků 'login'/'heslo') a vrátí login, heslo a dict týmu.
+    Index se cachuje – další družstva ze stejného sešitu jsou jen dict lookup.
     """
-    wb = load_workbook(xlsx_path, data_only=True)
+    index = load_team_index(xlsx_path, engine)
 
-    # 1) Najdi list a řádek hlavičky Teams kdekoli v sešitu
-    setup, hdr_row = find_teams_header_anywhere(wb)
-    if setup is None:
+    # 1) List a řádek hlavičky Teams
+    if index["sheet"] is None:
         # diagnostika – co jsme nahoře viděli
         try:
             with open(Path(xlsx_path).with_suffix(".log"), "w", encoding="utf-8") as f:
                 f.write("Header not found. Top rows (normalized):\n")
-                for ws in wb.worksheets:
-                    f.write(f"[{ws.title}]\n")
-                    max_r = min(15, ws.max_row or 0)
-                    max_c = min(20, ws.max_column or 0)
-                    for r in range(1, max_r + 1):
-                        rn = [norm(ws.cell(r, c).value or "") for c in range(1, max_c + 1)]
+                for title, rows in index["top_rows"].items():
+                    f.write(f"[{title}]\n")
+                    for r, row in enumerate(rows, start=1):
+                        rn = [norm(v or "") for v in row]
                         f.write(f"R{r}: {rn}\n")
         except Exception:
             pass
         raise RuntimeError("V setup/Teams chybí sloupce 'Družstvo' a/nebo 'DruzstvoID'.")
 
     # 2) Login a heslo (z nalezeného listu)
-    login, pwd = find_login_pwd(setup)
+    login, pwd = index["login"], index["pwd"]
     if not login or not pwd:
         raise RuntimeError("Vyplň login/heslo (B1/B2, nebo vedle popisků 'login'/'heslo').")
 
-    # 3) Namapuj sloupce podle hlavičky (ID sloupec detekuj STRIKTNĚ + vyluč 'vedouci*')
-    max_c = min(80, setup.max_column or 0)
-    idx = {}
-    for c in range(1, max_c + 1):
-        h = norm(setup.cell(hdr_row, c).value or "")
-
-        # Družstvo (název)
-        if ("druzstvo" in h) and ("id" not in h) and ("vedouci" not in h):
-            idx["name"] = c
-
-        # ID družstva – akceptuj jasné varianty a/nebo přesné 'id', nikdy ne cokoliv s 'vedouci'
-        is_id_col = (("druzstvoid" in h) or ("id_druzstva" in h) or ("iddruzstva" in h) or (h == "id")) \
-                    and ("vedouci" not in h)
-        if is_id_col:
-            idx["id"] = c
-
-        # Vedoucí domácích / hostů
-        if "vedoucidomacich" in h or ("vedouci" in h and "host" not in h):
-            idx["ved_dom"] = c
-        if "vedoucihostu" in h or ("vedouci" in h and "host" in h):
-            idx["ved_host"] = c
-
-        # Herna, začátek, konec
-        if "herna" in h:
-            idx["herna"] = c
-        if "zacatekut" in h or "zacatek" in h:
-            idx["zacatek"] = c
-        if "konecutkani" in h or "konec" in h:
-            idx["konec"] = c
-
-    if "name" not in idx or "id" not in idx:
+    # 3) Sloupce (namapované při průchodu)
+    if "name" not in index["cols"] or "id" not in index["cols"]:
         raise RuntimeError("V Teams chybí sloupce 'Družstvo' a/nebo 'DruzstvoID'.")
 
-    # 4) Najdi požadované družstvo pod hlavičkou
-    team = None
-    r = hdr_row + 1
-    while r <= (setup.max_row or 0):
-        nm = setup.cell(r, idx["name"]).value
-        if nm is None or str(nm).strip() == "":
-            break
-        if str(nm).strip().lower() == team_name.strip().lower():
-            def getcol(key):
-                c = idx.get(key)
-                return setup.cell(r, c).value if c else None
-            raw_z = getcol("zacatek")
-            raw_k = getcol("konec")
-            team = {
-                "name":    str(nm).strip(),
-                "id":      str(getcol("id") or "").strip(),
-                "ved_dom": getcol("ved_dom"),
-                "ved_host":getcol("ved_host"),
-                "herna":   getcol("herna"),
-                # NOVÉ: uchovej RAW hodnoty + parsed řetězec HH:MM
-                "zacatek_raw": raw_z,
-                "konec_raw":   raw_k,
-                "zacatek":     as_time_txt(raw_z),
-                "konec":       as_time_txt(raw_k),
-            }
-            break
-        r += 1
-
+    # 4) Požadované družstvo = dict lookup (kopie, ať volající nemění cache)
+    team = index["teams"].get(team_name.strip().lower())
     if not team:
         raise RuntimeError(f"Družstvo '{team_name}' nenalezeno v Teams.")
+    team = dict(team)
     if not team["id"]:
         raise RuntimeError("Prázdné DruzstvoID u zvoleného družstva.")
 
@@ -1228,266 +3198,2237 @@ def read_excel_config(xlsx_path: Path, team_name: str):
 
     return login, pwd, team
 
-def parse_args():
-    p = argparse.ArgumentParser()
-    p.add_argument("--xlsx", required=True, help="plná cesta k XLSX")
-    p.add_argument("--team", required=True, help="název družstva (sloupec 'Družstvo')")
-    g = p.add_mutually_exclusive_group()
-    g.add_argument("--headed",  dest="headed",  action="store_true",  help="viditelný prohlížeč")
-    g.add_argument("--headless", dest="headed", action="store_false", help="bez UI")
-    p.set_defaults(headed=True)  # výchozí = viditelné okno
-    return p.parse_args()
+def _har_scrub_cookie(name, value):
+    # Cookie: "a=1; b=2" → "a=redacted; b=redacted"; Set-Cookie: jen hodnota před prvním ';' (po řádcích)
+    if name == "cookie":
+        return re.sub(r"=[^;]*", "=redacted", value)
+    return "\n".join(re.sub(r"^([^=;]*)=[^;]*", r"\1=redacted", line) for line in value.split("\n"))
 
-# Nahraďte celou main() funkci tímto opraveným kódem:
+def sanitize_har(src, dst, secrets, log):
+    """
+    Přepíše HAR z Playwright tak, aby v něm nezůstalo přihlášení:
+    - každý výskyt hodnot ze `secrets` ({skutečná hodnota: placeholder}) i v URL-kódované
+      podobě se nahradí placeholderem (login POST pak při replay sedí na HAR_LOGIN/HAR_PASSWORD),
+    - hodnoty Cookie / Set-Cookie / Authorization a cookies[] se zneplatní.
+    Binární obsah (encoding=base64) se nemění. Zdrojový soubor se smaže.
+    """
+    repl = []
+    for real, ph in secrets.items():
+        if real:
+            # formulář může jít v UTF-8 i ve windows-1250 → obě URL-kódované podoby
+            for v in {real, urllib.parse.quote(real, safe=""), urllib.parse.quote_plus(real),
+                      urllib.parse.quote_plus(real, encoding="cp1250", errors="ignore")}:
+                repl.append((v, ph))
+    repl.sort(key=lambda x: -len(x[0]))   # delší varianty dřív
+    hits = [0]
+
+    def scrub(o):
+        if isinstance(o, str):
+            for v, ph in repl:
+                if v in o:
+                    hits[0] += o.count(v)
+                    o = o.replace(v, ph)
+            return o
+        if isinstance(o, list):
+            return [scrub(x) for x in o]
+        if isinstance(o, dict):
+            if o.get("encoding") == "base64":
+                return o
+            out = {k: scrub(v) for k, v in o.items()}
+            if isinstance(out.get("name"), str) and isinstance(out.get("value"), str) \
+                    and out["name"].lower() in ("cookie", "set-cookie", "authorization"):
+                low = out["name"].lower()
+                out["value"] = "redacted" if low == "authorization" else _har_scrub_cookie(low, out["value"])
+            if isinstance(out.get("cookies"), list):
+                out["cookies"] = [dict(c, value="redacted") if isinstance(c, dict) else c for c in out["cookies"]]
+            return out
+        return o
+
+    with open(src, "r", encoding="utf-8") as f:
+        har = json.load(f)
+    har = scrub(har)
+    tmp = Path(dst).with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(har, f, ensure_ascii=False)
+    os.replace(tmp, dst)
+    Path(src).unlink(missing_ok=True)
+    n = len(har.get("log", {}).get("entries", []))
+    log(f"HAR uložen: {dst} ({n} požadavků, nahrazeno {hits[0]}× přihlašovací údaj)")
+
+def _finish_har_recording(context, raw, dst, secrets, log):
+    # HAR zapisuje Playwright až při context.close() – volá se z ExitStack i po chybě
+    try:
+        context.close()
+    except Exception:
+        pass
+    try:
+        if Path(raw).exists():
+            sanitize_har(raw, dst, secrets, log)
+        else:
+            log("HAR nevznikl (context se nezavřel korektně).")
+    except Exception as e:
+        log("Úprava HAR selhala – surový záznam nechávám smazat:", repr(e))
+        Path(raw).unlink(missing_ok=True)
+
+
+def fill_start_form(page, team, log, b, roster=None):
+    """Úvodní formulář (zapis_start.php): hrací místnost, začátek utkání, vedoucí. Vrací (hh, mm) pro retry odeslání."""
+    page.set_default_timeout(b.ms(1500))
+
+    # 7.1) Hrací místnost (SELECT podle labelu „Hrací místnost“)
+    wanted_room_text = (team.get("hraci_mistnost") or team.get("herna") or "").strip()
+    ok_room = fill_playroom(page, wanted_text=wanted_room_text, log=log, budget=b, roster=roster)
+
+    log(f"Hrací místnost → {'OK' if ok_room else 'NEVYBRÁNA'}")
+
+    # 7.2) Začátek utkání (hh:mm)
+    start_txt = (team.get("zacatek") or "19:00").strip()
+    hh, mm = 19, 0
+    try:
+        if ":" in start_txt:
+            hh, mm = start_txt.split(":")[:2]
+        else:
+            hh, mm = "19", "00"
+        hh = int(hh); mm = int(mm)
+
+        if page.locator("select[name='zapis_zacatek_hodiny']").count():
+            page.select_option("select[name='zapis_zacatek_hodiny']", value=str(hh), timeout=b.ms(1500))
+            log(f"Hodina nastavena: {hh:02d}")
+        if page.locator("select[name='zapis_zacatek_minuty']").count():
+            page.select_option("select[name='zapis_zacatek_minuty']", value=str(mm), timeout=b.ms(1500))
+            log(f"Minuta nastavena: {mm:02d}")
+
+        # vystřel change na obou selectech
+        try:
+            page.evaluate("document.querySelector('select[name=\"zapis_zacatek_hodiny\"]').dispatchEvent(new Event('change',{bubbles:true}))")
+            page.evaluate("document.querySelector('select[name=\"zapis_zacatek_minuty\"]').dispatchEvent(new Event('change',{bubbles:true}))")
+        except Exception:
+            pass
+        page.wait_for_timeout(b.ms(200))
+        log("Začátek nastaven:", f"{hh:02d}:{mm:02d}")
+    except Exception as e:
+        log("Set start time failed:", repr(e))
+        hh, mm = 19, 0
+        try:
+            page.select_option("select[name='zapis_zacatek_hodiny']", value="19", timeout=b.ms(1500))
+            page.select_option("select[name='zapis_zacatek_minuty']", value="0", timeout=b.ms(1500))
+            log("Fallback čas: 19:00")
+        except Exception:
+            pass
+
+    # 7.3) Vedoucí družstev (autocomplete → vybrat položku z menu)
+    ok_leaders = fill_leaders_on_start(
+        page,
+        home_name_text=str(team.get("ved_dom_text") or team.get("ved_dom") or "").strip(),
+        away_name_text=str(team.get("ved_host_text") or team.get("ved_host") or "").strip(),
+        log=log,
+        only_from_club=True,
+        budget=b,
+        roster=roster,
+    )
+
+    log(f"Vedoucí → {'OK' if ok_leaders else 'NEULOŽENO'}")
+    page.set_default_timeout(1500)
+    return hh, mm
+
+def submit_start_form(page, hh, mm, run, log, b):
+    """Odeslat úvodní formulář (s malým retry na chybovou hlášku času); počet opakování → run.submit_retries."""
+    max_attempts = 3
+    for attempt in range(max_attempts):
+        run.submit_retries = attempt
+        log(f"Pokus {attempt+1}/{max_attempts}: Click 'Uložit a pokračovat'…")
+        try:
+            btn = page.locator("input[name='odeslat']")
+            if btn.count():
+                # tento klik také naviguje → expect_navigation s delším timeoutem
+                with guarded("odeslat", log) as http:
+                    with page.expect_navigation(wait_until="domcontentloaded", timeout=b.ms(15000)) as nav:
+                        btn.click(timeout=b.ms(3000))
+                    http(nav.value)
+                log("Formulář odeslán")
+
+                # kontrola chybové hlášky k času (už na nové stránce)
+                if page.locator(".exception:has-text('není vyplněn začátek utkání')").count():
+                    log(f"Pokus {attempt+1}: Server stále hlásí chybu s časem")
+                    if attempt < max_attempts - 1 and not b.expired:
+                        page.select_option("select[name='zapis_zacatek_hodiny']", value=str(hh), timeout=b.ms(1500))
+                        page.select_option("select[name='zapis_zacatek_minuty']", value=str(mm), timeout=b.ms(1500))
+                        page.wait_for_timeout(b.ms(200))
+                        continue
+            break
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            log(f"Pokus {attempt+1} selhal:", repr(e))
+            if attempt == max_attempts - 1 or b.expired:
+                if b.expired:
+                    b.overrun(f"odeslat pokus {attempt+1}")
+                raise RuntimeError("Nepodařilo se odeslat formulář ani po několika pokusech")
 
-def main():
-    args = parse_args()
-    xlsx_path = Path(args.xlsx).resolve()
-    if not xlsx_path.exists():
-        raise RuntimeError(f"Soubor neexistuje: {xlsx_path}")
 
-    # logger vedle XLSX
-    log, log_file, log_path = make_logger(xlsx_path)
+def browser_tree_rss():
+    """
+    RSS (bajty) všech potomků tohoto procesu = Playwright driver + prohlížeč a jeho renderery.
+    psutil, když je k dispozici, jinak /proc (Linux); None = neumím změřit (Windows bez psutil).
+    Sdílené stránky procesů Chromia se sčítají vícekrát – jde o horní odhad.
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        total = 0
+        for c in psutil.Process().children(recursive=True):
+            try:
+                total += c.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for d in os.listdir("/proc"):
+        if not d.isdigit():
+            continue
+        try:
+            with open(f"/proc/{d}/stat", "rb") as f:
+                ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(d)
+        except (OSError, ValueError, IndexError):
+            pass
+    page = os.sysconf("SC_PAGE_SIZE")
+    total, todo = 0, list(children.get(os.getpid(), []))
+    while todo:
+        pid = todo.pop()
+        todo += children.get(int(pid), [])
+        try:
+            with open(f"/proc/{pid}/statm", "rb") as f:
+                total += int(f.read().split()[1]) * page
+        except (OSError, ValueError, IndexError):
+            pass
+    return total
+
+class RssSampler:
+    """
+    Vlákno, které každých `interval` s změří browser_tree_rss(). Jen čte /proc (psutil) –
+    na Playwright nesahá, takže běží vedle sync API bez zámků. window() = špička od minulého volání.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_S):
+        self.interval = interval
+        self.available = browser_tree_rss() is not None
+        self.current = self.peak = self._window = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.available and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="stis-rss", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Změř hned; vrací aktuální RSS v MB (0 = neměřeno)."""
+        try:
+            v = browser_tree_rss() or 0
+        except Exception:
+            v = 0
+        with self._lock:
+            self.current = v
+            self.peak = max(self.peak, v)
+            self._window = max(self._window, v)
+        return v // (1024 * 1024)
+
+    def window(self):
+        with self._lock:
+            w, self._window = self._window, self.current
+        return w // (1024 * 1024)
+
+    def stop(self):
+        self._stop.set()
+
+class BrowserSession:
+    """
+    Jeden prohlížeč, jeden BrowserContext a jedno přihlášení pro všechny zápasy běhu.
+    Každý zápas dostane vlastní stránku (new_page); cookies session sdílí context.
+    HAR záznam / přehrání se nastavuje na contextu (viz --record-har / --replay-har).
+    """
+
+    def __init__(self, p, headless, log, stack=None, har_in=None, har_out=None, secrets=None, lite=False):
+        self.p = p
+        self.headless = headless
+        self.lite = lite
+        self.log = log
+        self.stack = stack
+        self.har_in, self.har_out, self.secrets = har_in, har_out, secrets or {}
+        self.browser = self.context = None
+        self.account = None  # (login, heslo) ze zdroje – další zápasy musí mít stejné
+        self.pages = []
+        self._spare = None   # stránka po loginu – dostane ji první zápas
+        self._login_page = None   # login.php načtený dopředu (open_login), čeká na údaje ze sešitu
+        self.trace_path = None
+
+    def launch(self, b):
+        self._launch_browser(b)
+        self._new_context()
+
+    def _launch_browser(self, b):
+        # Chromium → Chrome → Edge
+        p, log, headless = self.p, self.log, self.headless
+        kw = {"headless": headless}
+        if self.lite:
+            kw["args"] = list(LITE_CHROMIUM_ARGS)
+        log("Launching browser… headless =", headless, "(lite)" if self.lite else "")
+        try:
+            self.browser = p.chromium.launch(timeout=b.ms(30000), **kw)
+            log("Launched: managed Chromium")
+        except Exception as e1:
+            log("Chromium failed:", repr(e1), "→ trying channel=chrome")
+            try:
+                self.browser = p.chromium.launch(channel="chrome", timeout=b.ms(30000), **kw)
+                log("Launched: channel=chrome")
+            except Exception as e2:
+                log("Chrome failed:", repr(e2), "→ trying channel=msedge")
+                self.browser = p.chromium.launch(channel="msedge", timeout=b.ms(30000), **kw)
+                log("Launched: channel=msedge")
+
+    def _new_context(self):
+        log = self.log
+        ctx_kw = {}
+        if self.lite:
+            ctx_kw.update(viewport=LITE_VIEWPORT, service_workers="block")
+        if self.har_out:
+            har_raw = self.har_out.with_name(self.har_out.stem + ".raw.har")
+            ctx_kw.update(record_har_path=str(har_raw), record_har_content="embed")
+        self.context = self.browser.new_context(**ctx_kw)
+        if self.har_out:
+            # zavře context (tím se HAR zapíše) a vyčistí ho – i když běh spadne
+            self.stack.callback(_finish_har_recording, self.context, har_raw, self.har_out, self.secrets, log)
+            log("Nahrávám HAR →", self.har_out)
+        if self.har_in:
+            self.context.route_from_har(str(self.har_in), not_found="abort")
+
+    def start_trace(self, path, screenshots=True):
+        """--profile: Playwright trace celého contextu (stop a zápis při close / pádu)."""
+        self.context.tracing.start(screenshots=screenshots, snapshots=True)
+        self.trace_path = Path(path)
+        self.stack.callback(self.stop_trace)
+        self.log("Playwright trace →", self.trace_path)
+
+    def stop_trace(self):
+        if self.trace_path is None:
+            return
+        path, self.trace_path = self.trace_path, None
+        try:
+            self.context.tracing.stop(path=str(path))
+            self.log("Trace uložen:", path, f"(npx playwright show-trace \"{path}\")")
+        except Exception as e:
+            self.log("Uložení trace selhalo:", repr(e))
+
+    @property
+    def version(self):
+        return f"{self.browser.browser_type.name} {self.browser.version}"
+
+    def new_page(self):
+        if self._spare is not None:
+            page, self._spare = self._spare, None
+            return page
+        page = self.context.new_page()
+        # DŮLEŽITÉ: krátký default timeout (žádné 30s visení)
+        page.set_default_timeout(1500)
+        self.pages.append(page)
+        return page
+
+    def open_login(self, b):
+        """Načte login.php – přihlašovací údaje zatím nepotřebuje (pipeline startu, viz main)."""
+        page = self.new_page()
+        self.log("Navigating to login…")
+        with guarded("login", self.log) as http:
+            http(page.goto(STIS_LOGIN_URL, wait_until="domcontentloaded", timeout=b.ms(20000)))
+        self._login_page = page
+
+    def login(self, user_login, user_pwd, b):
+        if self._login_page is None:
+            self.open_login(b)
+        page, self._login_page = self._login_page, None
+        page.fill("input[name='login']", user_login, timeout=b.ms(1500))
+        page.fill("input[name='heslo']",  user_pwd, timeout=b.ms(1500))
+
+        btn_login = page.locator("[name='send']")
+        # Login vyvolává navigaci → dej mu delší timeout jen tady
+        with guarded("login", self.log) as http:
+            with page.expect_navigation(wait_until="domcontentloaded", timeout=b.ms(15000)) as nav:
+                btn_login.click(timeout=b.ms(3000))
+            http(nav.value)
+        self.log("Logged in.")
+        self._spare = page
+
+    def recycle(self, b, user_login, user_pwd, full=False):
+        """RSS nad rozpočtem: zavři stránky a context (full = i prohlížeč), otevři znovu a přihlas se."""
+        self.stop_trace()
+        for page in self.pages:
+            try:
+                page.close()
+            except Exception:
+                pass
+        self.pages, self._spare, self._login_page = [], None, None
+        try:
+            self.context.close()
+        except Exception:
+            pass
+        if full:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+            self._launch_browser(b)
+        self._new_context()
+        self.login(user_login, user_pwd, b)
+
+    def close(self):
+        self.stop_trace()
+        try:
+            self.context.close(); self.log("Browser context uzavřen.")
+        except Exception:
+            pass
+        try:
+            self.browser.close(); self.log("Browser uzavřen.")
+        except Exception:
+            pass
+
+
+class SessionGate:
+    """
+    Zámek kroků, které server v jedné session nesnese souběžně (start formuláře
+    drží rozpracovaný zápis v PHP session). Kroky ze `serial` běží vždy jen pro
+    jeden zápas; když server odmítne krok, který běžel souběžně, krok se přidá
+    do `serial` a zopakuje se pod zámkem (viz _gated_step).
+    """
+
+    def __init__(self, concurrent, serial=SERIAL_STEPS):
+        self.concurrent = concurrent
+        self.serial = set(serial)
+        self.owner = None
+
+    def acquire(self, key, step, log):
+        waiting = False
+        while self.owner not in (None, key):
+            if not waiting:
+                log(f"{step}: čekám, až {self.owner} dokončí sériový krok")
+                waiting = True
+            yield
+        self.owner = key
+
+    def release(self, key):
+        if self.owner == key:
+            self.owner = None
+
+def _server_refused(page):
+    """Vrátí popis, když stránka vypadá jako odmítnutí serverem (chyba, špatné URL, odhlášení), jinak None."""
+    for sel, what in ((".exception", "chybová hláška"), ("text=/špatn.*url/i", "špatné URL"),
+                      ("input[name='heslo']", "přihlašovací formulář")):
+        try:
+            if page.locator(sel).count():
+                return what
+        except Exception:
+            pass
+    return None
+
+def _gated_step(gate, job, step, body):
+    """
+    Krok zápasu (`body(retry)` = generátor). Sériové kroky běží pod zámkem gate;
+    souběžný krok, po kterém server hlásí odmítnutí, se označí jako sériový a zopakuje.
+    Krok, který už klikl na 'Uložit změny' (job["filled"]["save"]), se neopakuje nikdy:
+    `.exception` po uložení je odmítnutí zápisu, ne souběhu, a opakování by zápis odeslalo znovu.
+    """
+    log, key = job["log"], job["key"]
+    held = False
+    try:
+        if step in gate.serial and gate.concurrent:
+            yield from gate.acquire(key, step, log)
+            held = True
+        yield from body(False)
+        if gate.concurrent and not held and (job["filled"] or {}).get("save") is None:
+            why = _server_refused(job["page"])
+            if why:
+                gate.serial.add(step)
+                log(f"Server odmítl souběžný krok {step} ({why}) – dál poběží sériově, opakuji.")
+                yield from gate.acquire(key, step, log)
+                held = True
+                yield from body(True)
+    finally:
+        if held:
+            gate.release(key)
+
+class CircuitOpen(RuntimeError):
+    """Jistič serveru je rozpojený – požadavek odmítnut bez čekání na timeout."""
+
+class HostGuard:
+    """
+    Sdílený limit požadavků na jeden host (token bucket: `rate`/s, nárazově `burst`)
+    a jistič: po `trip` pomalých (≥ slow_ms) nebo chybných načteních za sebou se rozpojí
+    a `cooldown_s` odmítá navigace hned (CircuitOpen) místo pálení 15–30s timeoutů.
+    Chybné = chyba navigace/sítě nebo HTTP ≥ 500 (viz _host_failure), ne timeout lokátoru.
+    Pak pustí jeden zkušební požadavek (half-open): úspěch = zase sepnuto, jinak další cooldown.
+    rate=0 = bez limitu (přehrávání z HAR).
+    """
+
+    def __init__(self, host, rate=RATE_PER_S, burst=RATE_BURST, trip=BREAKER_TRIP,
+                 slow_ms=BREAKER_SLOW_MS, cooldown_s=BREAKER_COOLDOWN_S):
+        self.host, self.rate, self.burst = host, rate, burst
+        self.trip, self.slow_ms, self.cooldown_s = trip, slow_ms, cooldown_s
+        self.tokens, self.stamp = float(burst), time.monotonic()
+        self.state = "closed"       # closed / open / half-open
+        self.fails = 0
+        self.opened = 0.0
+        self.probing = False
+        self.trips = 0
+
+    def _admit(self, op, log):
+        if self.state == "open":
+            left = self.cooldown_s - (time.monotonic() - self.opened)
+            if left > 0:
+                raise CircuitOpen(f"{self.host} nereaguje ({self.fails}× pomalé/chybné načtení) – "
+                                  f"'{op}' odmítnuto, další pokus za {left:.0f} s")
+            self.state = "half-open"
+        if self.state == "half-open":
+            if self.probing:
+                raise CircuitOpen(f"{self.host}: čekám na zkušební požadavek – '{op}' odmítnuto")
+            self.probing = True
+            log(f"Jistič {self.host}: half-open – zkušební požadavek '{op}'")
+            return True
+        return False
+
+    def _delay(self):
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self, op, log, force=False):
+        """Blokující varianta; force = jen limit, jistič neodmítá (uložení zápisu). True = zkušební požadavek."""
+        probe = not force and self._admit(op, log)
+        d = self._delay()
+        while d > 0:
+            time.sleep(d)
+            d = self._delay()
+        return probe
+
+    def acquire_sliced(self, op, log):
+        """Generátorová varianta pro run_pipelines – čekání na token yielduje."""
+        probe = self._admit(op, log)
+        d = self._delay()
+        while d > 0:
+            time.sleep(min(d, POLL_SLICE_MS / 1000))
+            yield
+            d = self._delay()
+        return probe
+
+    def release(self, probe):
+        """Požadavek skončil bez verdiktu o hostu (chyba stránky); byl-li zkušební, pustí se další."""
+        if probe:
+            self.probing = False
+
+    def record(self, op, ok, ms, log):
+        if ok and ms < self.slow_ms:
+            if self.state != "closed":
+                log(f"Jistič {self.host}: zkušební '{op}' OK ({ms} ms) – znovu sepnuto")
+            self.state, self.fails, self.probing = "closed", 0, False
+            return
+        self.fails += 1
+        if self.state == "half-open" or (self.state == "closed" and self.fails >= self.trip):
+            self.trips += 1
+            log(f"Jistič {self.host}: ROZPOJEN po {self.fails}× pomalém/chybném načtení "
+                f"('{op}' {ms} ms{'' if ok else ', chyba'}) – {self.cooldown_s} s odmítám požadavky")
+            self.state, self.opened, self.probing = "open", time.monotonic(), False
+
+REGISTR_GUARD = HostGuard(REGISTR_HOST)
+
+# chyby, které vypovídají o hostu: síť, navigace a čekání na ni (ne lokátor/klik/fill)
+_HOST_ERR_RE = re.compile(r"net::ERR_|NS_ERROR_|waiting for navigation|"
+                          r"\b(Page|Frame)\.(goto|go_back|go_forward|reload|wait_for_load_state"
+                          r"|wait_for_url|wait_for_navigation|expect_navigation)\b")
+
+def _host_failure(e):
+    """Výjimka z navigace/sítě (počítá se do jističe), ne z lokátoru, rozpočtu nebo jističe samého."""
+    if isinstance(e, (CircuitOpen, BudgetExceeded)) or not isinstance(e, Exception):
+        return False
+    return bool(_HOST_ERR_RE.search(str(e)))
+
+@contextlib.contextmanager
+def guarded(op, log, force=False):
+    """
+    Navigace / odeslání formuláře přes REGISTR_GUARD (limit + jistič), s měřením doby.
+    Do jističe jde jen selhání hostu: chyba navigace/sítě (_host_failure) nebo HTTP ≥ 500
+    ohlášené yieldnutou funkcí (`with guarded(...) as http: http(page.goto(...))`);
+    timeout lokátoru či kliku je chyba stránky. force=True (uložení) jistič jen obchází
+    a jeho stav nemění.
+    """
+    probe = REGISTR_GUARD.acquire(op, log, force=force)
+    t0 = time.perf_counter()
+    status = []
+    def http(resp):
+        if resp is not None:
+            status.append(resp.status)
+        return resp
+    try:
+        yield http
+    except BaseException as e:
+        if force:
+            raise
+        if _host_failure(e):
+            REGISTR_GUARD.record(op, False, int((time.perf_counter() - t0) * 1000), log)
+        else:
+            REGISTR_GUARD.release(probe)
+        raise
+    if not force:
+        REGISTR_GUARD.record(op, not any(st >= 500 for st in status),
+                             int((time.perf_counter() - t0) * 1000), log)
+
+def _wait_sliced(wait, b, total_ms):
+    """
+    Čeká po úsecích POLL_SLICE_MS (wait(timeout) → výsledek / PwTimeout) a mezi nimi
+    yielduje – zatímco jeden zápas čeká na síť, ostatní pracují.
+    """
+    deadline = time.monotonic() + total_ms / 1000
+    while True:
+        left = int((deadline - time.monotonic()) * 1000)
+        try:
+            return wait(max(1, min(POLL_SLICE_MS, left, b.ms(POLL_SLICE_MS))))
+        except PwTimeout:
+            if left <= 0 or b.expired:
+                raise
+        yield
+
+def _goto_sliced(page, url, b, total_ms=20000, log=None):
+    # navigaci jen odstartuj (bez blokování) a čekej na ni po úsecích
+    log = log or (lambda *a: None)
+    probe = yield from REGISTR_GUARD.acquire_sliced("goto", log)
+    t0 = time.perf_counter()
+    before = page.url
+    try:
+        page.evaluate("u => { window.location.href = u; }", url)
+    except Exception:
+        pass   # kontext se může zničit už během evaluate – navigace ale běží
+    try:
+        yield from _wait_sliced(
+            lambda t: page.wait_for_url(lambda u: u != before, wait_until="domcontentloaded", timeout=t),
+            b, total_ms)
+    except BaseException as e:
+        if _host_failure(e):
+            REGISTR_GUARD.record("goto", False, int((time.perf_counter() - t0) * 1000), log)
+        else:
+            REGISTR_GUARD.release(probe)
+        raise
+    REGISTR_GUARD.record("goto", True, int((time.perf_counter() - t0) * 1000), log)
+
+def run_pipelines(pipes):
+    """Round-robin nad generátory zápasů; každý yield = „čekám na síť, pusť další“."""
+    active = list(pipes)
+    while active:
+        for g in list(active):
+            try:
+                next(g)
+            except StopIteration:
+                active.remove(g)
+
+def new_job(path, team_name, args, loggers, source="xlsx", doc=None):
+    """
+    Úloha = jeden zápas s vlastními RunStats. `path` = zdroj úlohy (XLSX, JSON…) – vedle něj
+    log, DOM dumpy a kontrolní report. Loggery se sdílí přes `loggers` ({cesta logu: (log, f, cesta)}).
+    """
+    log_key = path.with_suffix(".stislog.txt")
+    if log_key not in loggers:
+        loggers[log_key] = make_logger(path)
+    log, log_file, log_path = loggers[log_key]
     log("==== stis_uploader start ====")
-    log("XLSX:", xlsx_path)
-    log("Team:", args.team)
+    log(f"{source.upper()}:", path)
+    log("Team:", team_name)
     log("Headed:", getattr(args, "headed", True))
+    mode = "replay" if args.replay_har else "record" if args.record_har else "live"
+    return {
+        "key": team_name, "path": path, "team_name": team_name, "source": source, "doc": doc,
+        "log": log, "log_path": log_path,
+        "run": RunStats(int(args.run_budget * 1000)),
+        "meta": {"team": team_name, "mode": mode},   # pro historii běhů
+        "team": None, "page": None, "filled": None, "review_html": None, "roster": {},
+        "error": None, "summary_logged": False,
+    }
+
+def _log_match_data(log, zdroj_data):
+    if not zdroj_data:
+        log("WARNING: zdroj_data=None → nebude se vybírat žádný hráč (vyplní se jen sety, pokud jsou).")
+        return
+    dbls = zdroj_data.get("doubles", []) or []
+    sgls = zdroj_data.get("singles", []) or []
+    log(f"Zdroj data loaded – doubles: {len(dbls)}, singles: {len(sgls)}")
+    for i, d in enumerate(dbls):
+        log(f"[{d.get('key') or f'c{i}'}] home1={d.get('home1')!r}, home2={d.get('home2')!r}, "
+            f"away1={d.get('away1')!r}, away2={d.get('away2')!r}, sets={d.get('sets')}")
+    for s in sgls:
+        log(f"[{s.get('key') or s.get('idx')}] event={s.get('event')} home={s.get('home')!r} away={s.get('away')!r} sets={s.get('sets')}")
+
+_ROSTER_JS = """
+async (terms) => {
+  const out = {players: [], leaders: [], rooms: []};
+  const side = (el) => {
+    if (el.closest('.domaci')) return 'domaci';
+    if (el.closest('.host')) return 'host';
+    const c = el.closest('.cell-player');
+    if (!c || !c.parentElement) return '';
+    return c === c.parentElement.firstElementChild ? 'domaci' : c === c.parentElement.lastElementChild ? 'host' : '';
+  };
+  const skip = (v, t) => !v || v === '0' || !t || t === '----' || /^-\\s*(zvolte|vyberte)/i.test(t);
+
+  // hráči: <select class="player"> v buňkách online editoru
+  for (const el of document.querySelectorAll('select.player')) {
+    for (const o of el.options) {
+      const t = (o.textContent || '').trim();
+      if (!skip(o.value, t)) out.players.push({side: side(el), id: o.value, t});
+    }
+  }
+  // hrací místnosti: select úvodního formuláře
+  const room = document.querySelector("select[name='zapis_id_herna']");
+  for (const o of room ? room.options : []) {
+    const t = (o.textContent || '').trim();
+    if (!skip(o.value, t)) out.rooms.push({side: '', id: o.value, t});
+  }
+
+  // zdroje jQuery UI autocomplete (vedoucí; hráči tam, kde buňka nemá select) – každý zdroj jednou
+  const $ = window.jQuery;
+  if (!$ || !$.fn || !$.fn.autocomplete) return out;
+  const item = (it) => typeof it === 'string' ? {id: null, t: it}
+    : {id: it.id ?? (/^\\d+$/.test(String(it.value ?? '')) ? it.value : null), t: String(it.label ?? it.value ?? '')};
+  const ask = (inst, src, term) => new Promise((resolve) => {
+    if (Array.isArray(src)) return resolve(src);
+    if (typeof src === 'string') {
+      const u = src + (src.includes('?') ? '&' : '?') + 'term=' + encodeURIComponent(term);
+      return fetch(u, {credentials: 'same-origin'}).then((r) => r.json()).then(resolve, () => resolve([]));
+    }
+    if (typeof src !== 'function') return resolve([]);
+    const t = setTimeout(() => resolve([]), 5000);
+    try { src.call(inst, {term}, (items) => { clearTimeout(t); resolve(items || []); }); }
+    catch (e) { clearTimeout(t); resolve([]); }
+  });
+  const seen = new Set();
+  const targets = [
+    ["input[name='id_domaci_vedoucitext']", 'leaders', 'domaci'],
+    ["input[name='id_hoste_vedoucitext']", 'leaders', 'host'],
+    ['.cell-player input.ui-autocomplete-input, .cell-player input.ac_input', 'players', null],
+  ];
+  for (const [sel, kind, fixedSide] of targets) {
+    for (const el of document.querySelectorAll(sel)) {
+      let inst = null;
+      try { inst = $(el).autocomplete('instance'); } catch (e) {}
+      inst = inst || $(el).data('ui-autocomplete') || $(el).data('autocomplete');
+      const src = inst && inst.options ? inst.options.source : null;
+      if (!src || seen.has(src)) continue;
+      seen.add(src);
+      for (const term of (Array.isArray(src) ? [''] : terms)) {   // po jednom – šetrně k serveru
+        for (const it of await ask(inst, src, term)) {
+          const x = item(it);
+          if (x.id && x.t) out[kind].push({side: fixedSide ?? side(el), id: String(x.id), t: x.t.trim()});
+        }
+      }
+    }
+  }
+  return out;
+}
+"""
+
+def harvest_roster(page, log):
+    """Jedno evaluate na otevřené stránce (online editor / úvodní formulář) → {"players", "leaders", "rooms"}."""
+    for cb_name in ("chbklub", "chbklub2"):   # vedoucí jen z klubu (stejně jako fill_leaders_on_start)
+        try:
+            cb = page.locator(f"input[name='{cb_name}']").first
+            if cb.count() and not cb.is_checked():
+                cb.check(timeout=600)
+        except Exception:
+            pass
+    found = page.evaluate(_ROSTER_JS, list(ROSTER_AC_TERMS)) or {}
+    log(f"  soupiska z {page.url}: hráči {len(found.get('players') or [])}, "
+        f"vedoucí {len(found.get('leaders') or [])}, herny {len(found.get('rooms') or [])}")
+    return found
 
+def _roster_name(text):
+    """
+    'Dvořák Jiří 1970 (TJ …)' → 'Dvořák Jiří' – jméno, jak ho píše uživatel do sešitu.
+    Odřízne jen závorku na konci a rok narození; pomlčku nechá ('Nováková-Svobodová Eva').
+    """
+    base = re.split(r"[\(\[]", (text or "").strip(), maxsplit=1)[0]
+    return re.sub(r"\s+\d{4},?$", "", " ".join(base.split()))
+
+def export_team_roster(session, team, log):
+    """
+    Stránka družstva → první online editor (hráči obou stran) a první úvodní formulář (vedoucí, herny).
+    Jen GET – nic se neodesílá. Vrací řádky listu ROSTER_SHEET (bez hlavičky).
+    """
+    page = session.new_page()
+    found = {"players": [], "leaders": [], "rooms": []}
     try:
-        # 1) načti přihlášení + tým
-        user_login, user_pwd, team = read_excel_config(xlsx_path, args.team)
-        log("Login OK; team:", team["name"], "ID:", team["id"])
-        log("Time (XLSX raw → parsed):", repr(team.get("zacatek_raw")), "→", team.get("zacatek"))
+        with guarded("goto", log) as http:
+            http(page.goto(STIS_TEAM_URL.format(id=team["id"]), wait_until="domcontentloaded", timeout=20000))
+        links = scan_match_links(page)
+        for kind in ("online", "start"):
+            link = next((l for l in links if l["kind"] == kind), None)
+            if link is None:
+                log(f"  {team['name']}: na stránce družstva není odkaz typu {kind} – "
+                    + ("hráči" if kind == "online" else "vedoucí a herny") + " se neexportují")
+                continue
+            with guarded("goto", log) as http:
+                http(page.goto(link["url"], wait_until="domcontentloaded", timeout=20000))
+            for k, items in harvest_roster(page, log).items():
+                found.setdefault(k, []).extend(items or [])
+    finally:
+        try:
+            page.close()
+        except Exception:
+            pass
 
-        # 1.5) data ze "zdroj"
+    rows, seen = [], set()
+    for typ, kind in (("hrac", "players"), ("vedouci", "leaders"), ("herna", "rooms")):
+        for it in found.get(kind) or []:
+            text = " ".join(str(it.get("t") or "").split())
+            key = (typ, it.get("side") or "", str(it["id"]))
+            if not text or key in seen:
+                continue
+            seen.add(key)
+            name = text if typ == "herna" else _roster_name(text)
+            rows.append((team["name"], team["id"], typ, it.get("side") or "", name, str(it["id"]), text))
+    return rows
+
+def write_roster(xlsx_path, rows, log, out=None):
+    """
+    Řádky soupisky → nový sešit s jediným listem ROSTER_SHEET, výchozí <název>.hraci.xlsx vedle
+    zdroje (load_roster ho najde sám). Zdrojový sešit se NIKDY nepřeukládá: openpyxl by zahodil
+    uložené hodnoty vzorců, grafy i ovládací prvky a FastXlsx by pak četl vzorcové buňky prázdné.
+    Cíl se přepíše celý. Vrací cestu, kam se zapsalo.
+    """
+    from openpyxl import Workbook
+    xlsx_path = Path(xlsx_path).resolve()
+    target = Path(out).resolve() if out else xlsx_path.with_suffix(".hraci.xlsx")
+    if target == xlsx_path:
+        raise RuntimeError(f"Soupisku nelze zapsat do zdrojového sešitu {xlsx_path.name} – zvol jiný --out.")
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = ROSTER_SHEET
+    ws.append(ROSTER_HEADER)
+    for r in rows:
+        ws.append(r)
+    ws.freeze_panes = "A2"
+    ws.auto_filter.ref = ws.dimensions
+    try:
+        wb.save(target)
+    except PermissionError:
+        raise RuntimeError(f"{target.name} je zamčený (otevřený v Excelu?) – zavři ho a spusť export znovu.")
+    log(f"Soupiska: {len(rows)} řádků → {target.name} (list '{ROSTER_SHEET}')")
+    return target
+
+_ROSTER_CACHE = {}   # (cesta, mtime, velikost) -> výsledek _read_roster
+
+def _read_roster(path):
+    try:
+        with FastXlsx(path) as x:
+            if ROSTER_SHEET not in x.sheets:
+                return {}
+            rows = list(x.iter_rows(ROSTER_SHEET, max_col=len(ROSTER_HEADER)))
+    except Exception:
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            if ROSTER_SHEET not in wb.sheetnames:
+                return {}
+            rows = list(wb[ROSTER_SHEET].iter_rows(max_col=len(ROSTER_HEADER), values_only=True))
+        finally:
+            wb.close()
+
+    out, clash = {}, set()
+    for row in rows[1:]:
+        row = tuple(row) + (None,) * (len(ROSTER_HEADER) - len(row))
+        typ, name, sid, text = row[2], row[4], row[5], row[6]
+        if isinstance(sid, float) and sid.is_integer():
+            sid = int(sid)
+        sid = str(sid if sid is not None else "").strip()
+        if not typ or not sid:
+            continue
+        names = out.setdefault(str(typ).strip(), {})
+        for k in {_norm_name(str(name or "")), _norm_name(_roster_name(str(text or "")))} - {""}:
+            if k in names and names[k][0] != sid:
+                clash.add((str(typ).strip(), k))
+            names[k] = (sid, str(text or name))
+    for typ, k in clash:   # jmenovci s různým ID – rozhodne až výběr z nabídky
+        out[typ].pop(k, None)
+    return out
+
+def load_roster(xlsx_path):
+    """
+    Soupiska z export-roster: list ROSTER_SHEET v sešitu, jinak v <název>.hraci.xlsx →
+    {"hrac"|"vedouci"|"herna": {normalizované jméno: (STIS ID, text v STIS)}}; {} = soupiska není.
+    Cachováno podle (cesta, mtime, velikost) jako index družstev.
+    """
+    p = Path(xlsx_path).resolve()
+    for path in (p, p.with_suffix(".hraci.xlsx")):
+        if not path.exists():
+            continue
+        st = path.stat()
+        key = (str(path), st.st_mtime_ns, st.st_size)
+        if key not in _ROSTER_CACHE:
+            _ROSTER_CACHE[key] = _read_roster(path)
+        if _ROSTER_CACHE[key]:
+            return _ROSTER_CACHE[key]
+    return {}
+
+def roster_id(roster, typ, name):
+    """(STIS ID, text v STIS) pro jméno ze sešitu, nebo None – bez jakéhokoli čtení DOM."""
+    names = (roster or {}).get(typ)
+    if not names or not name:
+        return None
+    for v in _name_variants(str(name).strip()):
+        hit = names.get(_norm_name(_strip_menu_text(v)))
+        if hit:
+            return hit
+    return None
+
+def load_match_xlsx(job, args):
+    """Adaptér XLSX: přihlášení + družstvo z Teams, layout, data ze 'zdroj'."""
+    log, xlsx_path = job["log"], job["path"]
+
+    # 1) načti přihlášení + tým
+    user_login, user_pwd, team = read_excel_config(xlsx_path, job["team_name"], engine=args.xlsx_engine)
+    log("Login OK; team:", team["name"], "ID:", team["id"])
+    log("Time (XLSX raw → parsed):", repr(team.get("zacatek_raw")), "→", team.get("zacatek"))
+
+    # 1.4) layout soutěže (CLI má přednost před sloupcem v Teams); chybný layout = chyba hned teď
+    layout = args.layout or team.get("layout")
+    plan = compile_layout(layout, extra_dirs=(xlsx_path.parent,))
+    log(f"Layout: {plan['name']} – čtyřhry: {len(plan['doubles'])}, singly: {len(plan['singles'])}")
+
+    # 1.5) data ze "zdroj"
+    try:
+        zdroj_data = read_zdroj_data(xlsx_path, log, layout=layout, engine=args.xlsx_engine)
+    except Exception as e:
+        log("WARNING: Nepodařilo se načíst data ze 'zdroj' listu:", repr(e))
+        zdroj_data = None
+    return user_login, user_pwd, team, layout, plan, zdroj_data
+
+def match_from_doc(doc):
+    """
+    JSON zápasu → (login, heslo, team, data) ve stejném tvaru jako read_excel_config + read_zdroj_data:
+    {"login": .., "password": .., "team": {"name", "id", "herna", "zacatek", "ved_dom", "ved_host", "layout"},
+     "layout": .., "doubles": [{"home1", "away1", "home2", "away2", "sets"}, …], "singles": [{"home", "away", "sets"}, …]}
+    Záznamy smí mít "key"/"event" (jinak se mapují podle pořadí). Login/heslo lze vynechat
+    a dát do STIS_LOGIN / STIS_PASSWORD.
+    """
+    if not isinstance(doc, dict):
+        raise RuntimeError("Zápas musí být JSON objekt.")
+    t = doc.get("team") or {}
+    if not isinstance(t, dict):
+        t = {"name": str(t)}
+    tid = str(t.get("id") or "").strip()
+    if not re.fullmatch(r"\d+", tid):
+        raise RuntimeError(f"Družstvo v JSON nemá číselné 'id': {t!r}")
+    team = {
+        "name":    str(t.get("name") or tid).strip(),
+        "id":      tid,
+        "ved_dom": t.get("ved_dom"),
+        "ved_host":t.get("ved_host"),
+        "herna":   t.get("herna"),
+        "layout":  t.get("layout") or doc.get("layout"),
+        "zacatek_raw": t.get("zacatek"),
+        "konec_raw":   t.get("konec"),
+        "zacatek":     as_time_txt(t.get("zacatek")),
+        "konec":       as_time_txt(t.get("konec")),
+    }
+
+    def entry(e, fields):
+        if not isinstance(e, dict):
+            raise RuntimeError(f"Záznam zápasu musí být JSON objekt: {e!r}")
+        out = dict(e)
+        for f in fields:
+            out[f] = str(e.get(f) or "").strip()
+        sets = [None if v is None or str(v).strip() == "" else str(v).strip() for v in e.get("sets") or []]
+        while sets and sets[-1] is None:
+            sets.pop()
+        out["sets"] = sets
+        return out
+
+    data = {
+        "doubles": [entry(e, ("home1", "away1", "home2", "away2")) for e in doc.get("doubles") or []],
+        "singles": [entry(e, ("home", "away")) for e in doc.get("singles") or []],
+    }
+    login = str(doc.get("login") or os.environ.get("STIS_LOGIN") or "").strip()
+    pwd = str(doc.get("password") or doc.get("heslo") or os.environ.get("STIS_PASSWORD") or "").strip()
+    if not login or not pwd:
+        raise RuntimeError("JSON zápasu nemá login/heslo (ani STIS_LOGIN / STIS_PASSWORD).")
+    return login, pwd, team, data
+
+def load_match_json(job, args):
+    """Adaptér JSON/JSONL: vše je už v dokumentu zápasu (viz match_from_doc) – žádný openpyxl."""
+    log = job["log"]
+    if isinstance(job["doc"], Exception):   # neplatný řádek JSONL
+        raise job["doc"]
+    user_login, user_pwd, team, data = match_from_doc(job["doc"])
+    log("Team (JSON):", team["name"], "ID:", team["id"], "začátek:", team.get("zacatek"))
+    layout = args.layout or team.get("layout")
+    plan = compile_layout(layout, extra_dirs=(job["path"].parent,))
+    log(f"Layout: {plan['name']} – čtyřhry: {len(plan['doubles'])}, singly: {len(plan['singles'])}")
+    return user_login, user_pwd, team, layout, plan, data
+
+# zdroj úlohy → adaptér vracející (login, heslo, team, layout, plán, data zápasu)
+MATCH_ADAPTERS = {
+    "xlsx": load_match_xlsx,
+    "json": load_match_json,
+}
+
+def load_match_data(job, args):
+    """Načte úlohu přes adaptér podle job["source"] (chyba konfigurace = výjimka)."""
+    user_login, user_pwd, team, layout, plan, zdroj_data = MATCH_ADAPTERS[job["source"]](job, args)
+    job["key"] = job["key"] or team["name"]
+    job["meta"].update(team=job["meta"]["team"] or team["name"], team_id=team["id"], layout=plan["name"])
+    _log_match_data(job["log"], zdroj_data)
+    job.update(login=user_login, pwd=user_pwd, team=team, layout=layout, plan=plan, zdroj=zdroj_data)
+    if job["source"] == "xlsx":
         try:
-            zdroj_data = read_zdroj_data(xlsx_path, log)  # NOVÁ signatura s log
-        except TypeError:
-            log("WARNING: read_zdroj_data(xlsx_path, log) není k dispozici – volám starou verzi bez logování.")
-            zdroj_data = read_zdroj_data(xlsx_path)
+            job["roster"] = load_roster(job["path"])
         except Exception as e:
-            log("WARNING: Nepodařilo se načíst data ze 'zdroj' listu:", repr(e))
-            zdroj_data = None
+            job["log"](f"Soupisku (list '{ROSTER_SHEET}') nejde načíst: {e!r} – výběr jen z nabídek")
+        if job["roster"]:
+            job["log"]("Soupiska ze sešitu: " + ", ".join(f"{k} {len(v)}" for k, v in sorted(job["roster"].items())))
 
-        if not zdroj_data:
-            log("WARNING: zdroj_data=None → nebude se vybírat žádný hráč (vyplní se jen sety, pokud jsou).")
+def _read_input_docs(src, fmt):
+    """--input: JSON dokument (jeden zápas nebo seznam), nebo JSONL – zápas po zápasu, streamovaně."""
+    fh = _std_stream("stdin", "zadej --input jako soubor místo '-'") if src == "-" else open(src, "r", encoding="utf-8")
+    try:
+        if fmt == "jsonl":
+            for n, line in enumerate(fh, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        yield RuntimeError(f"{src}:{n}: neplatný JSON – {e}")
         else:
-            dbls = zdroj_data.get("doubles", []) or []
-            sgls = zdroj_data.get("singles", []) or []
-            log(f"Zdroj data loaded – doubles: {len(dbls)}, singles: {len(sgls)}")
-            for i, d in enumerate(dbls):
-                log(f"[EXCEL] c{i}: home1={d.get('home1')!r}, home2={d.get('home2')!r}, "
-                    f"away1={d.get('away1')!r}, away2={d.get('away2')!r}, sets={d.get('sets')}")
-            for s in sgls:
-                idx = s.get("idx")
-                dom_idx = (idx or 2) - 2
-                log(f"[EXCEL] d{dom_idx}: idx={idx} home={s.get('home')!r} away={s.get('away')!r} sets={s.get('sets')}")
-
-        headed   = bool(getattr(args, "headed", True))
-        headless = not headed
-
-        # 2) připrav Playwright runtime
-        prepare_playwright_browsers(log)   # nastaví PLAYWRIGHT_BROWSERS_PATH
-        ensure_pw_browsers(log)            # případně doinstaluje Chromium
+            doc = json.load(fh)
+            yield from (doc if isinstance(doc, list) else [doc])
+    finally:
+        if src != "-":
+            fh.close()
 
-        with sync_playwright() as p:
-            # 3) spuštění prohlížeče (Chromium → Chrome → Edge)
-            log("Launching browser… headless =", headless)
-            browser = None
-            try:
-                browser = p.chromium.launch(headless=headless)
-                log("Launched: managed Chromium")
-            except Exception as e1:
-                log("Chromium failed:", repr(e1), "→ trying channel=chrome")
-                try:
-                    browser = p.chromium.launch(channel="chrome", headless=headless)
-                    log("Launched: channel=chrome")
-                except Exception as e2:
-                    log("Chrome failed:", repr(e2), "→ trying channel=msedge")
-                    browser = p.chromium.launch(channel="msedge", headless=headless)
-                    log("Launched: channel=msedge")
-
-            context = browser.new_context()
-            page = context.new_page()
-
-            # DŮLEŽITÉ: krátký default timeout (žádné 30s visení)
-            page.set_default_timeout(1500)
-
-            # 4) login
-            log("Navigating to login…")
-            page.goto("https://registr.ping-pong.cz/htm/auth/login.php", wait_until="domcontentloaded", timeout=20000)
-            page.fill("input[name='login']", user_login)
-            page.fill("input[name='heslo']",  user_pwd)
-            
-            btn_login = page.locator("[name='send']")
-            # Login vyvolává navigaci → dej mu delší timeout jen tady
-            with page.expect_navigation(wait_until="domcontentloaded", timeout=15000):
-                btn_login.click(timeout=3000)
-            log("Logged in.")
-
-            # 5) stránka družstva
-            team_url = f"https://registr.ping-pong.cz/htm/auth/klub/druzstva/vysledky/?druzstvo={team['id']}"
-            log("Open team page:", team_url)
-            page.goto(team_url, wait_until="domcontentloaded", timeout=20000)
+def _input_format(args):
+    if not args.input:
+        return None
+    if args.input_format != "auto":
+        return args.input_format
+    return "jsonl" if str(args.input).lower().endswith((".jsonl", ".ndjson")) else "json"
 
+def _input_base(src):
+    return Path.cwd() / "stis_stdin.json" if src == "-" else Path(src).resolve()
 
-            # 6) najdi vstup do formuláře (vložit/upravit)
-            log("Hledám odkaz 'vložit/upravit zápis'…")
-            if not open_match_form(page, log):
-                raise RuntimeError("Na stránce družstva jsem nenašel odkaz do formuláře.")
+def _doc_path(base, doc, n):
+    """Víc zápasů z jednoho vstupu → vlastní log/report pro každé družstvo: (cesta, název družstva)."""
+    t = doc.get("team") if isinstance(doc, dict) else None
+    t = t if isinstance(t, dict) else {}
+    return base.with_name(f"{base.stem}.{t.get('id') or n}{base.suffix}"), str(t.get("name") or "")
 
-            # 7.1) Hrací místnost (SELECT podle labelu „Hrací místnost“)
-            wanted_room_text = (team.get("hraci_mistnost") or team.get("herna") or "").strip()
-            ok_room = fill_playroom(page, wanted_text=wanted_room_text, log=log)
+def _job_groups(args, loggers):
+    """
+    Skupiny úloh; úlohy jedné skupiny běží souběžně (run_pipelines), skupiny za sebou.
+    XLSX páry i JSON dokument = jedna skupina; JSONL = skupina na každý řádek (stream);
+    --watch = skupina na každý změněný sešit (nekonečně, viz FolderWatch); worker = úloha z fronty.
+    """
+    if args.worker:
+        yield from _queue_groups(args, loggers)
+        return
+    if args.watch:
+        folder = Path(args.watch).resolve()
+        wlog = folder / "stis_watch.stislog.txt"
+        if wlog not in loggers:
+            loggers[wlog] = make_logger(folder / "stis_watch")
+        yield from FolderWatch(folder, args.team, args, loggers[wlog][0],
+                               poll=args.poll, debounce=args.debounce).groups(loggers)
+        return
+    if not args.input:
+        yield [new_job(x, t, args, loggers) for x, t in _match_pairs(args)]
+        return
+    fmt = _input_format(args)
+    base = _input_base(args.input)
+    group = []
+    for n, doc in enumerate(_read_input_docs(args.input, fmt), 1):
+        path, team_name = _doc_path(base, doc, n)
+        job = new_job(path, team_name, args, loggers, source="json", doc=doc)
+        if fmt == "jsonl":
+            yield [job]
+        else:
+            group.append(job)
+    if group:
+        yield group
+
+def _file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _data_digest(team, layout_name, data):
+    blob = json.dumps({"team": team, "layout": layout_name, "data": data},
+                      sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def _match_digest(path, team_name, args):
+    """Hash naparsovaného zápasu (družstvo + layout + data 'zdroj') – uložení bez změny dat dá stejný hash."""
+    _login, _pwd, team = read_excel_config(path, team_name, engine=args.xlsx_engine)
+    layout = args.layout or team.get("layout")
+    plan = compile_layout(layout, extra_dirs=(path.parent,))
+    data = read_zdroj_data(path, lambda *a: None, layout=layout, engine=args.xlsx_engine)
+    return _data_digest(team, plan["name"], data)
+
+class FolderWatch:
+    """
+    --watch: polling složky se sešity (mtime + velikost; notifikace na síťovém disku nefungují).
+    Změněný sešit se zpracuje až po `debounce` sekundách klidu (Excel ukládá několika zápisy).
+    Nahrává se jen tehdy, když se změnil obsah souboru (hash bajtů) A naparsovaná data zápasu
+    proti poslednímu ÚSPĚŠNÉMU nahrání (state_dir()/WATCH_STATE_FILE – přežije restart).
+    Družstvo: jediné --team platí pro všechny sešity, jinak se páruje podle celých slov názvu
+    souboru (zapas_B.xlsx → družstvo „B“, ne „A“); žádná nebo víc shod = sešit se přeskočí.
+    """
+
+    def __init__(self, folder, teams, args, log, poll=WATCH_POLL_S, debounce=WATCH_DEBOUNCE_S):
+        self.folder = Path(folder).resolve()
+        if not self.folder.is_dir():
+            raise RuntimeError(f"Složka neexistuje: {self.folder}")
+        self.teams, self.args, self.log = teams, args, log
+        self.poll, self.debounce = poll, debounce
+        self.state_path = state_dir() / WATCH_STATE_FILE
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {}
+        except Exception:
+            self.state = {}     # poškozený stav → jednou nahraj vše znovu
+        self.seen = {}      # cesta -> (mtime_ns, velikost) z posledního průchodu
+        self.pending = {}   # cesta -> monotonic čas poslední změny
+        self.raw = {}       # cesta -> hash bajtů naposledy zpracovaného obsahu
+
+    def _scan(self):
+        """Jeden průchod složkou → sešity, které se od poslední změny `debounce` s nehnuly."""
+        now = time.monotonic()
+        current = {}
+        for p in self.folder.glob("*.xlsx"):
+            if p.name.startswith("~$"):     # zámek sešitu otevřeného v Excelu
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            current[p] = (st.st_mtime_ns, st.st_size)
+        for p, sig in current.items():
+            if self.seen.get(p) != sig:
+                self.pending[p] = now       # další uložení → debounce znovu od začátku
+        for p in [p for p in self.pending if p not in current]:
+            del self.pending[p]
+        self.seen = current
+        return sorted(p for p, t in self.pending.items() if now - t >= self.debounce)
+
+    @staticmethod
+    def _tokens(text):
+        # slova bez diakritiky; '_', '-', mezera, tečka… oddělují
+        return re.findall(r"[0-9a-z]+", "".join(ch for ch in unicodedata.normalize("NFD", str(text).lower())
+                                                if unicodedata.category(ch) != "Mn"))
+
+    def _teams_for(self, path):
+        """Družstva sešitu: jejich slova musí být v názvu souboru celá a za sebou."""
+        if len(self.teams) == 1:
+            return list(self.teams)
+        stem = self._tokens(path.stem)
+        out = []
+        for t in self.teams:
+            want = self._tokens(t)
+            n = len(want)
+            if n and any(stem[i:i + n] == want for i in range(len(stem) - n + 1)):
+                out.append(t)
+        return out
+
+    def _changed_jobs(self, path, loggers):
+        try:
+            raw = _file_digest(path)
+        except OSError as e:
+            self.log(f"{path.name}: nelze číst – {e!r}")
+            return []
+        if self.raw.get(path) == raw:
+            return []       # jen „touch“ (síťový disk, antivir) – bajty stejné
+        teams = self._teams_for(path)
+        if len(teams) != 1:
+            self.log(f"{path.name}: " + ("název neodpovídá žádnému --team" if not teams else
+                     "název odpovídá víc družstvům (" + ", ".join(teams) + ")") + " – přeskočeno")
+            self.raw[path] = raw
+            return []
+        try:
+            digests = {t: _match_digest(path, t, self.args) for t in teams}
+        except Exception as e:
+            # typicky rozepsaný soubor – další uložení ho pošle znovu
+            self.log(f"{path.name}: nelze načíst ({e!r}) – čekám na další uložení")
+            return []
+        self.raw[path] = raw
+        jobs = []
+        for t, digest in digests.items():
+            key = f"{path}|{t.strip().lower()}"
+            if (self.state.get(key) or {}).get("content") == digest:
+                self.log(f"{path.name} / {t}: data zápasu beze změny – nenahrávám")
+                continue
+            self.log(f"{path.name} / {t}: změna dat → nahrávám")
+            job = new_job(path, t, self.args, loggers)
+            job["watch"] = (key, digest)
+            jobs.append(job)
+        return jobs
+
+    def _commit(self, group):
+        """Po zpracování skupiny: hash dat jen u zápasů, které se opravdu uložily."""
+        changed = False
+        for job in group:
+            key, digest = job["watch"]
+            if job["error"] is None and (job["filled"] or {}).get("saved"):
+                self.state[key] = {"content": digest, "uploaded": datetime.now().isoformat(timespec="seconds")}
+                changed = True
+            else:
+                self.log(f"{job['path'].name} / {job['key']}: nahrání neproběhlo – zkusím při další změně")
+                self.raw.pop(job["path"], None)
+        if changed:
+            tmp = self.state_path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.state_path)
+
+    def groups(self, loggers):
+        """Nekonečný zdroj skupin pro main(); skupina = zápasy jednoho změněného sešitu. Konec = Ctrl+C."""
+        self.log(f"Sleduji {self.folder} (poll {self.poll} s, debounce {self.debounce} s, "
+                 f"družstva: {', '.join(self.teams)}) – ukončení Ctrl+C")
+        try:
+            while True:
+                for path in self._scan():
+                    del self.pending[path]
+                    group = self._changed_jobs(path, loggers)
+                    if group:
+                        yield group     # main() skupinu celou zpracuje, než si řekne o další
+                        self._commit(group)
+                time.sleep(self.poll)
+        except KeyboardInterrupt:
+            self.log("Sledování ukončeno.")
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    match_key TEXT NOT NULL,        -- <DruzstvoID>|<datum zápasu>
+    team TEXT, team_id TEXT, match_date TEXT,
+    source TEXT NOT NULL,           -- xlsx / json
+    path TEXT NOT NULL,             -- sešit, nebo cesta pro log/report JSON zápasu
+    doc TEXT,                       -- JSON zápasu (source = json)
+    digest TEXT,                    -- hash naparsovaných dat (viz _match_digest)
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,           -- queued / running / done / failed / unavailable / superseded
+    superseded_by INTEGER,
+    enqueued REAL NOT NULL, started REAL, finished REAL,
+    worker TEXT, attempts INTEGER NOT NULL DEFAULT 0, error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, priority, match_date);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs(match_key, status);
+"""
+
+def match_key(team_id, match_date):
+    return f"{team_id}|{match_date}"
+
+def _match_date(doc=None, date=None):
+    """Datum zápasu: --date, pak "date" v JSON zápasu, jinak dnešek (zápis se dělá večer po zápase)."""
+    d = date or (doc.get("date") if isinstance(doc, dict) else None) or datetime.now().strftime("%Y-%m-%d")
+    return str(d)[:10]
+
+class MatchLock:
+    """
+    Meziprocesový zámek jednoho zápasu (soubor v state_dir()/locks). Drží ho worker fronty
+    i přímé spuštění z Excelu – dva procesy nikdy nevyplňují stejný online.php.
+    Zámek drží OS, takže po pádu procesu zmizí sám.
+    """
 
-            log(f"Hrací místnost → {'OK' if ok_room else 'NEVYBRÁNA'}")
+    def __init__(self, key):
+        self.key = key
+        self.path = state_dir() / "locks" / (re.sub(r"[^\w.-]+", "_", key) + ".lock")
+        self.fh = None
 
-            # 7.2) Začátek utkání (hh:mm)
-            start_txt = (team.get("zacatek") or "19:00").strip()
+    def acquire(self, timeout=0.0):
+        self.path.parent.mkdir(exist_ok=True)
+        fh = open(self.path, "a+b")
+        deadline = time.monotonic() + timeout
+        while True:
             try:
-                if ":" in start_txt:
-                    hh, mm = start_txt.split(":")[:2]
+                if os.name == "nt":
+                    import msvcrt
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
                 else:
-                    hh, mm = "19", "00"
-                hh = int(hh); mm = int(mm)
+                    import fcntl
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.fh = fh
+                return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    fh.close()
+                    return False
+                time.sleep(0.2)
+
+    def release(self):
+        if self.fh is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self.fh.seek(0)
+                msvcrt.locking(self.fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.fh.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        finally:
+            self.fh.close()
+            self.fh = None
+
+def open_queue(path=None):
+    p = Path(path) if path else state_dir() / QUEUE_FILE
+    con = sqlite3.connect(str(p), timeout=30, isolation_level=None)   # transakce ručně (BEGIN IMMEDIATE)
+    con.row_factory = sqlite3.Row
+    con.executescript(QUEUE_SCHEMA)
+    return con
+
+def enqueue_job(con, key, team, team_id, match_date, source, path, doc=None, digest=None, priority=0):
+    """
+    Zařadí zápas; vrací (id, stav). Čekající úlohy stejného zápasu nahradí nová (superseded) –
+    poběží jen nejnovější verze. Stejná data jako čekající/běžící úloha = jen vrátí její id.
+    """
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if digest:
+            dup = con.execute("SELECT id FROM jobs WHERE match_key=? AND digest=? AND status IN ('queued','running')"
+                              " ORDER BY id DESC LIMIT 1", (key, digest)).fetchone()
+            if dup:
+                con.execute("COMMIT")
+                return dup["id"], "duplicate"
+        jid = con.execute(
+            "INSERT INTO jobs (match_key, team, team_id, match_date, source, path, doc, digest, priority,"
+            " status, enqueued) VALUES (?,?,?,?,?,?,?,?,?,'queued',?)",
+            (key, team, team_id, match_date, source, str(path),
+             json.dumps(doc, ensure_ascii=False) if doc is not None else None, digest, priority, time.time())).lastrowid
+        con.execute("UPDATE jobs SET status='superseded', superseded_by=?, finished=? "
+                    "WHERE match_key=? AND status='queued' AND id<>?", (jid, time.time(), key, jid))
+        con.execute("COMMIT")
+        return jid, "queued"
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
 
-                if page.locator("select[name='zapis_zacatek_hodiny']").count():
-                    page.select_option("select[name='zapis_zacatek_hodiny']", value=str(hh))
-                    log(f"Hodina nastavena: {hh:02d}")
-                if page.locator("select[name='zapis_zacatek_minuty']").count():
-                    page.select_option("select[name='zapis_zacatek_minuty']", value=str(mm))
-                    log(f"Minuta nastavena: {mm:02d}")
+def _recover_stale(con, log):
+    """Úloha 'running', jejíž zámek nikdo nedrží = worker spadl → znovu do fronty (nebo failed)."""
+    for row in con.execute("SELECT id, match_key, attempts FROM jobs WHERE status='running'").fetchall():
+        lock = MatchLock(row["match_key"])
+        if not lock.acquire():
+            continue
+        try:
+            st = "queued" if row["attempts"] < QUEUE_MAX_TRIES else "failed"
+            con.execute("UPDATE jobs SET status=?, error='worker skončil uprostřed běhu' "
+                        "WHERE id=? AND status='running'", (st, row["id"]))
+            log(f"Úloha #{row['id']} ({row['match_key']}) po pádu workeru → {st}")
+        finally:
+            lock.release()
+
+def claim_job(con, worker):
+    """
+    Další úloha podle priority (vyšší dřív), pak data zápasu (starší dřív) – jen zápas, který
+    zrovna nikdo nenahrává. Vrací (řádek, MatchLock) nebo None; zámek uvolní volající AŽ po finish_job.
+    """
+    rows = con.execute(
+        "SELECT * FROM jobs q WHERE status='queued' AND NOT EXISTS "
+        "(SELECT 1 FROM jobs r WHERE r.match_key=q.match_key AND r.status='running') "
+        "ORDER BY priority DESC, match_date, enqueued").fetchall()
+    for row in rows:
+        lock = MatchLock(row["match_key"])
+        if not lock.acquire():
+            continue        # zápas právě nahrává přímé spuštění z Excelu
+        cur = con.execute("UPDATE jobs SET status='running', started=?, worker=?, attempts=attempts+1 "
+                          "WHERE id=? AND status='queued'", (time.time(), worker, row["id"]))
+        if cur.rowcount:
+            return row, lock
+        lock.release()      # mezitím nahrazena jinou verzí / vzal ji jiný worker
+    return None
 
-                # vystřel change na obou selectech
-                try:
-                    page.evaluate("document.querySelector('select[name=\"zapis_zacatek_hodiny\"]').dispatchEvent(new Event('change',{bubbles:true}))")
-                    page.evaluate("document.querySelector('select[name=\"zapis_zacatek_minuty\"]').dispatchEvent(new Event('change',{bubbles:true}))")
-                except Exception:
-                    pass
-                page.wait_for_timeout(200)
-                log("Začátek nastaven:", f"{hh:02d}:{mm:02d}")
-            except Exception as e:
-                log("Set start time failed:", repr(e))
+def finish_job(con, jid, ok, error=None, status=None):
+    con.execute("UPDATE jobs SET status=?, finished=?, error=? WHERE id=?",
+                (status or ("done" if ok else "failed"), time.time(), error, jid))
+
+def _queue_groups(args, loggers):
+    """worker: úlohy z fronty jako skupiny pro main() – jeden přihlášený prohlížeč pro všechny."""
+    wlog = state_dir() / "stis_worker.stislog.txt"
+    if wlog not in loggers:
+        loggers[wlog] = make_logger(state_dir() / "stis_worker")
+    log = loggers[wlog][0]
+    worker = f"{platform.node()}:{os.getpid()}"
+    con = open_queue()
+    log(f"Worker {worker} – fronta {state_dir() / QUEUE_FILE}" + (" (do vyprázdnění)" if args.once else ""))
+    try:
+        while True:
+            _recover_stale(con, log)
+            claimed = claim_job(con, worker)
+            if claimed is None:
+                if args.once:
+                    log("Fronta je prázdná – konec.")
+                    return
+                time.sleep(args.poll)
+                continue
+            row, lock = claimed
+            log(f"Úloha #{row['id']}: {row['team']} ({row['match_key']}) z {row['path']}")
+            try:
+                doc = json.loads(row["doc"]) if row["doc"] else None
+                job = new_job(Path(row["path"]), row["team"] or "", args, loggers,
+                              source=row["source"], doc=doc)
+                job["match_date"] = row["match_date"]
+                job["queue_id"] = row["id"]
                 try:
-                    page.select_option("select[name='zapis_zacatek_hodiny']", value="19")
-                    page.select_option("select[name='zapis_zacatek_minuty']", value="0")
-                    log("Fallback čas: 19:00")
-                except Exception:
-                    pass
-
-            # 7.3) Vedoucí družstev (autocomplete → vybrat položku z menu)
-            leaders_only_from_club = bool(team.get("leaders_only_from_club", True))
-            ok_leaders = fill_leaders_on_start(
-                page,
-                home_name_text=str(team.get("ved_dom_text") or team.get("ved_dom") or "").strip(),
-                away_name_text=str(team.get("ved_host_text") or team.get("ved_host") or "").strip(),
-                log=log,
-                only_from_club=True,
-            )
-
-            log(f"Vedoucí → {'OK' if ok_leaders else 'NEULOŽENO'}")
-
-            # 8) Odeslat úvodní formulář (s malým retry na chybovou hlášku času)
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                log(f"Pokus {attempt+1}/{max_attempts}: Click 'Uložit a pokračovat'…")
+                    yield [job]
+                finally:
+                    ok = job["error"] is None and bool((job["filled"] or {}).get("saved"))
+                    save = (job["filled"] or {}).get("save") or {}
+                    err = None if ok else repr(job["error"] or job["meta"].get("error") or
+                                               f"zápis neuložen ({save.get('status')}: {save.get('message')})")[:500]
+                    # rozpojený jistič = server nedostupný, ne chyba dat → vlastní stav
+                    st = "unavailable" if isinstance(job["error"], CircuitOpen) else None
+                    finish_job(con, row["id"], ok, err, status=st)
+                    log(f"Úloha #{row['id']}: {st or ('done' if ok else 'failed')}" + (f" – {err}" if err else ""))
+            finally:
+                lock.release()
+    except KeyboardInterrupt:
+        log("Worker ukončen.")
+    finally:
+        con.close()
+
+def _match_steps(session, job, gate, args):
+    log, run, team, src_path = job["log"], job["run"], job["team"], job["path"]
+    page = job["page"] = session.new_page()
+
+    # 5) stránka družstva – navigace běží v prohlížeči, mezitím jedou ostatní zápasy;
+    #    známe-li URL formuláře z minula (MatchUrlCache), jde se rovnou na něj
+    team_url = STIS_TEAM_URL.format(id=team["id"])
+    match_date = job.get("match_date") or _match_date(job["doc"])
+    direct = match_urls().lookup(team["id"], match_date)
+    job["direct"] = False
+    def team_page(retry):
+        with run.phase("team_page") as b:
+            if direct and not retry:
+                log("Přímo na formulář zápasu (uložená URL):", direct)
+                yield from _goto_sliced(page, direct, b, log=log)
+                ok, bad_url = _form_opened(page)
+                if ok:
+                    job["direct"] = True
+                    return
+                log("Uložená URL zápasu neplatí" + (" ('špatné URL')" if bad_url else "") +
+                    " – mažu ji a jdu přes stránku družstva.")
+                match_urls().invalidate(team["id"], match_date)
+            log("Open team page:", team_url)
+            yield from _goto_sliced(page, team_url, b, log=log)
+    yield from _gated_step(gate, job, "team_page", team_page)
+
+    # 6–8) vstup do formuláře, úvodní formulář, odeslání (výchozí SERIAL_STEPS: sériově)
+    def start_form(retry):
+        if retry:
+            job["direct"] = False
+            with guarded("goto", log) as http:
+                http(page.goto(team_url, wait_until="domcontentloaded", timeout=20000))
+        with run.phase("open_form") as b:
+            if job["direct"]:
+                log("Formulář otevřen přímo:", page.url)
+            else:
                 try:
-                    btn = page.locator("input[name='odeslat']")
-                    if btn.count():
-                        # tento klik také naviguje → expect_navigation s delším timeoutem
-                        with page.expect_navigation(wait_until="domcontentloaded", timeout=15000):
-                            btn.click(timeout=3000)
-                        log("Formulář odeslán")
-            
-                        # kontrola chybové hlášky k času (už na nové stránce)
-                        if page.locator(".exception:has-text('není vyplněn začátek utkání')").count():
-                            log(f"Pokus {attempt+1}: Server stále hlásí chybu s časem")
-                            if attempt < max_attempts - 1:
-                                page.select_option("select[name='zapis_zacatek_hodiny']", value=str(hh))
-                                page.select_option("select[name='zapis_zacatek_minuty']", value=str(mm))
-                                page.wait_for_timeout(200)
-                                continue
-                        break
+                    n = match_urls().remember(team["id"], match_date, scan_match_links(page))
+                    log(f"URL formulářů uloženy pro {n} zápas(ů) družstva")
                 except Exception as e:
-                    log(f"Pokus {attempt+1} selhal:", repr(e))
-                    if attempt == max_attempts - 1:
-                        raise RuntimeError("Nepodařilo se odeslat formulář ani po několika pokusech")
-
-
-            # 9) Čekej na online editor a vyplň
+                    log("Načtení odkazů zápasů selhalo:", repr(e))
+                log("Hledám odkaz 'vložit/upravit zápis'…")
+                if not open_match_form(page, log, b):
+                    raise RuntimeError("Na stránce družstva jsem nenašel odkaz do formuláře.")
+        with run.phase("start_form") as b:
+            hh, mm = fill_start_form(page, team, log, b, roster=job["roster"])
+        with run.phase("submit") as b:
+            submit_start_form(page, hh, mm, run, log, b)
+        yield from ()   # krok bez čekání po úsecích – generátor jen kvůli _gated_step
+    yield from _gated_step(gate, job, "start_form", start_form)
+
+    # 9) Čekej na online editor a vyplň
+    online_url = []
+    def online(retry):
+        with run.phase("online") as b:
             try:
-                page.wait_for_function(
+                if retry and online_url:
+                    with guarded("goto", log) as http:
+                        http(page.goto(online_url[0], wait_until="domcontentloaded", timeout=b.ms(20000)))
+                yield from _wait_sliced(lambda t: page.wait_for_function(
                     "window.location.href.includes('online.php') || document.querySelector('input.zapas-set') !== null",
-                    timeout=30000
-                )
-                log("Online editor dostupný na:", page.url)
+                    timeout=t), b, 30000)
+                run.editor_ms = run.budget.elapsed_ms()
+                log("Online editor dostupný na:", page.url, f"({run.editor_ms} ms od startu)")
+                online_url[:] = [page.url]
+                m = re.search(r"online\.php\?u=(\d+)", page.url)
+                if m:   # zápis už běží → příště rovnou do online editoru
+                    match_urls().put(team["id"], match_date, page.url, m.group(1), "online")
 
                 # krátký default timeout i pro online část
                 page.set_default_timeout(1500)
 
-                if zdroj_data:
+                if job["zdroj"]:
                     log("Začínám vyplňovat sestavy a sety…")
-                    fill_online_from_zdroj(page, zdroj_data, log, xlsx_path)
+                    job["filled"] = fill_online_from_zdroj(page, job["zdroj"], log, src_path,
+                                                           layout=job["layout"], budget=b, roster=job["roster"])
+                    run.cells = list((job["filled"] or {}).get("cells", []))
+                    run.verify = (job["filled"] or {}).get("verify")
+                    run.save = (job["filled"] or {}).get("save")
                     log("Sestavy a sety vyplněny")
                 else:
                     log("VAROVÁNÍ: Žádná data ze 'zdroj' listu k vyplnění")
             except Exception as e:
                 log("Problém s online editorem:", repr(e))
-                if xlsx_path:
-                    _dom_dump(page, xlsx_path, log)
+                _dom_dump(page, src_path, log)
                 raise
+    yield from _gated_step(gate, job, "online", online)
 
-            # 10) Ukončení
-            if headed:
-                log("=" * 60)
-                log("HOTOVO! Okno prohlížeče zůstává otevřené.")
-                log("Zkontrolujte vyplněná data a ručně zavřete okno prohlížeče.")
-                log("Program se ukončí až po zavření okna.")
-                log("=" * 60)
-                try:
-                    page.wait_for_event("close", timeout=0)
-                    log("Okno prohlížeče bylo zavřeno uživatelem.")
-                except Exception as e:
-                    log("Čekání na zavření okna skončilo:", repr(e))
-                finally:
+    run.finish(ok=True)
+    run.log_summary(log)
+    job["summary_logged"] = True
+
+    # 9.5) kontrolní report místo držení okna
+    if args.review:
+        try:
+            filled = job["filled"] or {}
+            rows = snapshot_online(page, filled)
+            job["review_html"] = write_review(src_path, rows, {
+                "team": team["name"], "team_id": team["id"], "url": page.url,
+                "saved": (filled.get("save") or {}).get("status", bool(filled.get("saved"))),
+                "layout": job["plan"]["name"],
+            }, log)
+        except Exception as e:
+            log("Kontrolní report selhal:", repr(e))
+
+def match_pipeline(session, job, gate, args):
+    """Generátor jednoho zápasu pro run_pipelines; chyba zůstane v job["error"] a ostatní zápasy jedou dál."""
+    try:
+        yield from _match_steps(session, job, gate, args)
+    except Exception as e:
+        job["error"] = e
+        job["meta"]["error"] = repr(e)[:500]
+        job["log"]("ERROR:", repr(e))
+        job["log"](traceback.format_exc())
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(epilog="Další příkazy: report (přehled z historie běhů), "
+                                       "parse / validate (hromadně sešity bez prohlížeče), "
+                                       "enqueue / worker (fronta úloh), "
+                                       "export-roster (soupisky ze STIS do <sešit>.hraci.xlsx).")
+    p.add_argument("--xlsx", action="append",
+                   help="plná cesta k XLSX (opakovaně: jeden sešit na každé --team, nebo jeden pro všechna)")
+    p.add_argument("--team", action="append",
+                   help="název družstva (sloupec 'Družstvo'); opakovaně = víc zápasů souběžně pod jedním loginem")
+    p.add_argument("--input", metavar="JSON|-",
+                   help="zápas(y) jako JSON místo XLSX (soubor nebo '-' = stdin); .jsonl = zápas po zápasu")
+    p.add_argument("--input-format", choices=("auto", "json", "jsonl"), default="auto",
+                   help="formát --input (auto podle přípony)")
+    p.add_argument("--watch", metavar="DIR",
+                   help="sleduj složku a nahraj každý sešit, jehož data zápasu se změnila (s --team; Ctrl+C = konec)")
+    p.add_argument("--worker", action="store_true",
+                   help="zpracovávej úlohy z fronty (= podpříkaz worker; zařazení: enqueue)")
+    p.add_argument("--once", action="store_true", help="--worker: skonči, jakmile je fronta prázdná")
+    p.add_argument("--poll", type=float, default=WATCH_POLL_S, help="--watch/--worker: interval kontroly v s")
+    p.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE_S,
+                   help="--watch: zpracuj sešit až po tolika s bez dalšího uložení")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--headed",  dest="headed",  action="store_true",  help="viditelný prohlížeč")
+    g.add_argument("--headless", dest="headed", action="store_false", help="bez UI")
+    p.set_defaults(headed=True)  # výchozí = viditelné okno
+    p.add_argument("--xlsx-engine", choices=XLSX_ENGINES, default=XLSX_ENGINE,
+                   help="čtení sešitu: fast = vlastní minimální čtečka (fallback openpyxl), openpyxl = vždy openpyxl")
+    p.add_argument("--run-budget", type=float, default=RUN_BUDGET_MS / 1000,
+                   help="časový rozpočet celého běhu v sekundách (bez ruční kontroly na konci)")
+    p.add_argument("--no-adaptive", dest="adaptive", action="store_false",
+                   help="nepoužívat naučené timeouty (jen ruční FAST_* konstanty)")
+    p.add_argument("--layout", default=None,
+                   help=f"formát soutěže: jméno layoutu nebo cesta k .json (výchozí: sloupec 'Format' v Teams, jinak '{DEFAULT_LAYOUT}')")
+    p.add_argument("--metrics-dir", default=os.environ.get(METRICS_DIR_ENV) or None,
+                   help=f"adresář textfile collectoru node-exporteru pro .prom metriky (nebo {METRICS_DIR_ENV})")
+    h = p.add_mutually_exclusive_group()
+    h.add_argument("--record-har", metavar="HAR",
+                   help="nahraj celou session do HAR (přihlašovací údaje se nahradí placeholdery)")
+    h.add_argument("--replay-har", metavar="HAR",
+                   help="přehraj session z HAR bez sítě (benchmark/regrese; adaptivní timeouty vypnuty)")
+    p.add_argument("--no-pipeline", dest="pipeline", action="store_false",
+                   help="start postupně (sešit → prohlížeč → login) místo čtení sešitu souběžně se spuštěním "
+                        "prohlížeče; pro srovnání time-to-editor (--profile startuje vždy postupně)")
+    p.add_argument("--lite", action="store_true",
+                   help="úsporné Chromium (bez GPU/rozšíření/obrázků, malý viewport, bez cache) pro slabé stroje")
+    p.add_argument("--rss-budget", type=int, default=None, metavar="MB",
+                   help="strop RSS prohlížeče; mezi zápasy se při překročení recykluje context, příp. celý prohlížeč")
+    p.add_argument("--rate", type=float, default=RATE_PER_S,
+                   help=f"max. navigací/odeslání za sekundu na {REGISTR_HOST} (všechny zápasy dohromady; 0 = bez limitu)")
+    p.add_argument("--review", action="store_true",
+                   help="po uložení zapiš kontrolní report (.review.html/.json) a hned zavři prohlížeč "
+                        "(místo čekání na ruční zavření okna)")
+    p.add_argument("--profile", action="store_true",
+                   help="Playwright trace (.trace.zip), cProfile (.pstats) a souhrn CPU vs. čekání po fázích "
+                        "(.profile.txt) vedle zdroje prvního zápasu")
+    p.add_argument("--no-trace-screenshots", dest="trace_screenshots", action="store_false",
+                   help="--profile: trace bez screenshotů (menší soubor)")
+    p.add_argument("--no-history", dest="history", action="store_false",
+                   help=f"nezapisovat běh do historie ({HISTORY_FILE})")
+    p.add_argument("--version", action="version", version=f"stis_uploader {__version__}")
+    a = p.parse_args(argv)
+    if a.worker:
+        if a.input or a.xlsx or a.team or a.watch:
+            p.error("--worker bere zápasy z fronty – bez --xlsx/--team/--input/--watch")
+    elif a.watch:
+        if a.input or a.xlsx or not a.team:
+            p.error("--watch potřebuje --team a nejde kombinovat s --xlsx/--input")
+    elif not a.input and not (a.xlsx and a.team):
+        p.error("zadej --xlsx a --team (nebo --input s JSON zápasem, nebo --watch se složkou)")
+    return a
+
+def cmd_report(argv):
+    p = argparse.ArgumentParser(prog="stis_uploader report", description="přehled výkonu z historie běhů")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--last", type=int, default=30, help="posledních N běhů (výchozí 30)")
+    g.add_argument("--days", type=float, help="běhy za posledních N dní")
+    p.add_argument("--team", help="jen jedno družstvo (název nebo ID)")
+    p.add_argument("--mode", choices=("live", "record", "replay"), default="live",
+                   help="jen běhy daného režimu (replay = benchmark nad HAR, výchozí live)")
+    p.add_argument("--split", help="srovnej okna před/po: datum YYYY-MM-DD[THH:MM] nebo verze uploaderu")
+    p.add_argument("--top", type=int, default=10, help="kolik nejpomalejších kroků / problémů vypsat")
+    p.add_argument("--history", help=f"cesta k databázi (výchozí state_dir()/{HISTORY_FILE})")
+    history_report(p.parse_args(argv))
+
+def cmd_bulk(argv, mode):
+    p = argparse.ArgumentParser(prog=f"stis_uploader {mode}",
+                                description="hromadné načtení sešitů (JSON lines na výstup)" if mode == "parse"
+                                else "hromadná kontrola sešitů bez prohlížeče (JSON lines na výstup)")
+    p.add_argument("inputs", nargs="+", help="sešity nebo adresáře (rekurzivně *.xlsx)")
+    p.add_argument("--team", help="družstvo (sloupec 'Družstvo'); bez něj jen seznam družstev")
+    p.add_argument("--layout", help="layout pro všechny sešity (jinak sloupec 'Format', jinak výchozí)")
+    p.add_argument("--xlsx-engine", choices=XLSX_ENGINES, default=XLSX_ENGINE)
+    p.add_argument("--workers", type=int, default=None, help="počet procesů (výchozí = počet jader)")
+    p.add_argument("--chunk", type=int, default=None, help="max. rozpracovaných sešitů (výchozí 4× workers)")
+    p.add_argument("--out", help="soubor pro JSON lines (výchozí stdout)")
+    a = p.parse_args(argv)
+    if not a.out:
+        _std_stream("stdout", "zadej výstupní soubor (--out)")   # ještě před načítáním sešitů
+    with (open(a.out, "w", encoding="utf-8") if a.out else contextlib.nullcontext(sys.stdout)) as out:
+        stats = bulk_process(a.inputs, mode, team=a.team, layout=a.layout, engine=a.xlsx_engine,
+                             workers=a.workers, chunk=a.chunk, out=out)
+    print(f"{mode}: {stats['files']} sešitů, OK {stats['ok']}, chyb {stats['failed']}, {stats['seconds']} s",
+          file=sys.stderr)
+    return 1 if mode == "validate" and stats["failed"] else 0
+
+def wait_jobs(con, ids, timeout=None, out=print):
+    """enqueue --wait: čeká na konec úloh (nahrazená úloha → čeká na tu novější); True = vše uloženo."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending, ok = list(ids), True
+    while pending:
+        for jid in list(pending):
+            row = con.execute("SELECT status, superseded_by, team, error FROM jobs WHERE id=?", (jid,)).fetchone()
+            if row["status"] == "superseded":
+                out(f"#{jid} nahrazena novější verzí #{row['superseded_by']}")
+                pending[pending.index(jid)] = row["superseded_by"]
+            elif row["status"] in ("done", "failed", "unavailable"):
+                pending.remove(jid)
+                ok = ok and row["status"] == "done"
+                out(f"#{jid} {row['status']}: {row['team']}" + (f" – {row['error']}" if row["error"] else ""))
+        if pending:
+            if deadline is not None and time.monotonic() > deadline:
+                out("Vypršel čas čekání, ve frontě zůstává: " + ", ".join(f"#{j}" for j in pending))
+                return False
+            time.sleep(QUEUE_POLL_S / 2)
+    return ok
+
+def cmd_enqueue(argv):
+    p = argparse.ArgumentParser(prog="stis_uploader enqueue",
+                                description="zařadí zápas(y) do fronty; nahrává `stis_uploader worker`")
+    p.add_argument("--xlsx", action="append", help="sešit (opakovaně, jako u hlavního příkazu)")
+    p.add_argument("--team", action="append", help="družstvo (opakovaně)")
+    p.add_argument("--input", metavar="JSON|-", help="zápas(y) jako JSON / JSONL (soubor nebo '-' = stdin)")
+    p.add_argument("--input-format", choices=("auto", "json", "jsonl"), default="auto")
+    p.add_argument("--date", help="datum zápasu YYYY-MM-DD (výchozí 'date' z JSON, jinak dnes) – starší jdou dřív")
+    p.add_argument("--priority", type=int, default=0, help="vyšší = dřív než ostatní bez ohledu na datum")
+    p.add_argument("--layout", default=None)
+    p.add_argument("--xlsx-engine", choices=XLSX_ENGINES, default=XLSX_ENGINE)
+    p.add_argument("--wait", action="store_true", help="počkej, až worker úlohy dokončí (exit 1 = neuloženo)")
+    p.add_argument("--timeout", type=float, default=None, help="--wait: max. sekund čekání")
+    a = p.parse_args(argv)
+    if not a.input and not (a.xlsx and a.team):
+        p.error("zadej --xlsx a --team, nebo --input")
+
+    entries = []    # (team, source, cesta, doc, digest, datum)
+    if a.input:
+        base = _input_base(a.input)
+        for n, doc in enumerate(_read_input_docs(a.input, _input_format(a)), 1):
+            if isinstance(doc, Exception):
+                raise doc
+            _login, _pwd, team, data = match_from_doc(doc)
+            plan = compile_layout(a.layout or team.get("layout"), extra_dirs=(base.parent,))
+            entries.append((team, "json", _doc_path(base, doc, n)[0], doc,
+                            _data_digest(team, plan["name"], data), _match_date(doc, a.date)))
+    else:
+        for x, t in _match_pairs(a):
+            _login, _pwd, team = read_excel_config(x, t, engine=a.xlsx_engine)
+            entries.append((team, "xlsx", x, None, _match_digest(x, t, a), _match_date(date=a.date)))
+
+    # EXE bez konzole: print by nic nevypsal → výpis do logu vedle (prvního) zdroje
+    say, log_fh = print, None
+    if sys.stdout is None:
+        say, log_fh, _path = make_logger(Path(a.xlsx[0]).resolve() if a.xlsx else _input_base(a.input))
+    con = open_queue()
+    try:
+        ids = []
+        for team, source, path, doc, digest, date in entries:
+            key = match_key(team["id"], date)
+            jid, st = enqueue_job(con, key, team["name"], team["id"], date, source, path,
+                                  doc=doc, digest=digest, priority=a.priority)
+            say(f"#{jid} {st}: {team['name']} ({key})")
+            ids.append(jid)
+        if a.wait:
+            return 0 if wait_jobs(con, ids, a.timeout, out=say) else 1
+        return 0
+    finally:
+        con.close()
+        if log_fh is not None:
+            log_fh.close()
+
+def cmd_export_roster(argv):
+    p = argparse.ArgumentParser(prog="stis_uploader export-roster",
+                                description=f"stáhne hráče, vedoucí a herny družstev ze STIS do listu '{ROSTER_SHEET}' "
+                                            "(přesná jména pro ověření dat v Excelu; uploader pak vybírá podle ID)")
+    p.add_argument("--xlsx", required=True, help="sešit s tabulkou Teams (login/heslo, družstva)")
+    p.add_argument("--team", action="append", help="jen tato družstva (název nebo ID; výchozí všechna z Teams)")
+    p.add_argument("--out", help="kam zapsat (výchozí <název>.hraci.xlsx vedle sešitu; soubor se přepíše celý, "
+                                 "zdrojový sešit nejde)")
+    p.add_argument("--headed", action="store_true", help="viditelné okno prohlížeče")
+    p.add_argument("--xlsx-engine", choices=XLSX_ENGINES, default=XLSX_ENGINE)
+    a = p.parse_args(argv)
+    xlsx = Path(a.xlsx).resolve()
+    if a.out and Path(a.out).resolve() == xlsx:
+        p.error("--out nesmí být zdrojový sešit (uložením přes openpyxl by přišel o hodnoty vzorců)")
+    index = load_team_index(xlsx, a.xlsx_engine)
+    if not index["login"] or not index["pwd"]:
+        p.error("v sešitu chybí login/heslo")
+    want = {t.strip().lower() for t in a.team or []}
+    teams = [t for t in index["teams"].values()
+             if not want or t["name"].lower() in want or str(t["id"]) in want]
+    if not teams:
+        p.error("žádné družstvo k exportu")
+
+    log, fh, log_path = make_logger(xlsx)
+    say = lambda *parts: (log(*parts), print(*parts))
+    rows = []
+    try:
+        with contextlib.ExitStack() as stack:
+            prepare_playwright_browsers(log)
+            ensure_pw_browsers(log)
+            session = BrowserSession(stack.enter_context(sync_playwright()), not a.headed, log, stack)
+            b = Budget("export-roster")
+            session.launch(b)
+            try:
+                session.login(index["login"], index["pwd"], b)
+                for team in teams:
+                    say(f"{team['name']} ({team['id']})…")
                     try:
-                        context.close(); log("Browser context uzavřen.")
-                    except Exception:
-                        pass
+                        rows += export_team_roster(session, team, log)
+                    except CircuitOpen:
+                        raise
+                    except Exception as e:
+                        say(f"  {team['name']}: export selhal – {e!r}")
+            finally:
+                session.close()
+        if not rows:
+            say("Ze STIS se nic nenačetlo – list se nepřepisuje.")
+            return 1
+        say(f"Zapsáno do {write_roster(xlsx, rows, log, a.out)}")
+        return 0
+    finally:
+        fh.close()
+
+# podpříkazy: `stis_uploader report …`; bez podpříkazu = původní volání z Excelu (--xlsx/--team)
+COMMANDS = {
+    "report":   cmd_report,
+    "parse":    lambda argv: cmd_bulk(argv, "parse"),
+    "validate": lambda argv: cmd_bulk(argv, "validate"),
+    "enqueue":  cmd_enqueue,
+    "export-roster": cmd_export_roster,
+    "worker":   lambda argv: main(["--worker", *argv]),
+}
+
+# Nahraďte celou main() funkci tímto opraveným kódem:
+
+def _match_pairs(args):
+    """--xlsx/--team lze opakovat: páry v pořadí, nebo jeden sešit pro všechna družstva."""
+    xlsxs, teams = args.xlsx, args.team
+    if len(xlsxs) == 1:
+        xlsxs = xlsxs * len(teams)
+    if len(xlsxs) != len(teams):
+        raise RuntimeError("Počet --xlsx musí být 1 nebo stejný jako počet --team.")
+    pairs = []
+    for x, t in zip(xlsxs, teams):
+        p = Path(x).resolve()
+        if not p.exists():
+            raise RuntimeError(f"Soubor neexistuje: {p}")
+        pairs.append((p, t))
+    return pairs
+
+def _recycle_over_budget(session, sampler, budget_mb, creds, run, log):
+    """Mezi zápasy: RSS nad --rss-budget → nový context; když nestačí, nový prohlížeč."""
+    rss = sampler.sample()
+    if rss <= budget_mb:
+        return
+    if session.har_out:
+        log(f"RSS {rss} MB > {budget_mb} MB, ale při --record-har context nerecykluji (HAR by se rozdělil).")
+        return
+    log(f"RSS prohlížeče {rss} MB > rozpočet {budget_mb} MB – nový context a přihlášení.")
+    with run.phase("recycle") as b:
+        session.recycle(b, *creds)
+        after = sampler.sample()
+        if after > budget_mb:
+            log(f"Po recyklaci contextu stále {after} MB – restartuji prohlížeč.")
+            session.recycle(b, *creds, full=True)
+            after = sampler.sample()
+    log(f"RSS po recyklaci: {after} MB")
+
+def lock_match(job):
+    """Přímé spuštění: zámek zápasu, ať ho souběžně nevyplňuje worker fronty ani jiné okno."""
+    if "queue_id" in job:
+        return      # úlohu z fronty už zamkl claim_job
+    key = match_key(job["team"]["id"], job.get("match_date") or _match_date(job["doc"]))
+    lock = MatchLock(key)
+    if not lock.acquire():
+        raise RuntimeError(f"Zápas {key} právě nahrává jiný proces (worker fronty nebo jiné spuštění).")
+    job["lock"] = lock
+
+def load_group(group, args, stream):
+    """
+    Data zápasů skupiny (XLSX / JSON) + zámky. V dávce chyba kteréhokoli zápasu = výjimka,
+    ve streamu se vadný zápas jen označí chybou a ostatní jedou dál.
+    """
+    for job in group:
+        try:
+            with job["run"].phase("load"):
+                load_match_data(job, args)
+            lock_match(job)
+        except Exception as e:
+            if not stream:
+                raise
+            job["error"] = e
+            job["meta"]["error"] = repr(e)[:500]
+            job["log"]("ERROR:", repr(e))
+
+def _startup_check(loading, log):
+    """Pipeline startu: čtení sešitu už spadlo → příprava prohlížeče nemá smysl, skonči hned s jeho chybou."""
+    if loading.done() and loading.exception() is not None:
+        log("Čtení dat zápasu selhalo – ruším start prohlížeče.")
+        raise loading.exception()
+
+def finalize_job(job, args):
+    """Souhrn, metriky a historie jedné úlohy (hned po dokončení – i uprostřed JSONL streamu)."""
+    log, run, team = job["log"], job["run"], job["team"]
+    try:
+        if not job["summary_logged"]:
+            run.finish()
+            run.log_summary(log)
+            job["summary_logged"] = True
+    except Exception:
+        pass
+    if args.metrics_dir:
+        try:
+            write_metrics(run, args.metrics_dir,
+                          {"team": job["meta"]["team"], "team_id": (team or {}).get("id") or ""}, log)
+        except Exception as e:
+            log("Zápis metrik selhal:", repr(e))
+    if args.history:
+        try:
+            record_run(run, job["meta"])
+        except Exception as e:
+            log("Zápis do historie běhů selhal:", repr(e))
+    lock = job.pop("lock", None)
+    if lock is not None:
+        lock.release()
+    job["finalized"] = True
+
+def write_profile(base, prof, jobs, trace, log, top=25):
+    """
+    --profile: cProfile → <base>.pstats a souhrn <base>.profile.txt – po fázích wall čas,
+    CPU Pythonu a zbytek = čekání na prohlížeč/síť; pod tím nejdražší funkce Pythonu.
+    Fáze souběžných zápasů se překrývají (CPU jedné fáze zahrnuje i práci ostatních).
+    """
+    stats_path = base.with_suffix(".pstats")
+    prof.dump_stats(str(stats_path))
+    lines = [f"stis_uploader {__version__} --profile  {datetime.now():%Y-%m-%d %H:%M:%S}",
+             f"cProfile: {stats_path}   (python -m pstats \"{stats_path}\")"]
+    if trace:
+        lines.append(f"Trace:    {trace}   (npx playwright show-trace \"{trace}\")")
+    for job in jobs:
+        run = job["run"]
+        lines += ["", f"[{job['key'] or job['path'].name}]",
+                  f"  {'fáze':<12} {'wall ms':>9} {'CPU Py ms':>10} {'čekání ms':>10} {'CPU %':>6}"]
+        tw = tc = 0
+        for name, ms in run.phases.items():
+            cpu = min(run.cpu.get(name, 0), ms)
+            tw, tc = tw + ms, tc + cpu
+            lines.append(f"  {name:<12} {ms:>9} {cpu:>10} {ms - cpu:>10} {100 * cpu / ms if ms else 0:>5.0f}%")
+        lines.append(f"  {'celkem':<12} {tw:>9} {tc:>10} {tw - tc:>10} {100 * tc / tw if tw else 0:>5.0f}%")
+    import pstats
+    buf = io.StringIO()
+    lines += ["", "Nejdražší funkce Pythonu (vlastní čas; poll/select = čekání na prohlížeč):"]
+    pstats.Stats(prof, stream=buf).sort_stats("tottime").print_stats(top)
+    lines.append(buf.getvalue())
+    path = base.with_suffix(".profile.txt")
+    path.write_text("\n".join(lines), encoding="utf-8")
+    log("Profil uložen:", path)
+    return path
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    args = parse_args(argv)
+    loggers = {}    # log vedle každého zdroje (XLSX/JSON)
+    jobs = []       # všechny úlohy běhu (kvůli souhrnu/chybám na konci)
+    def log_to(group):
+        def log(*parts):
+            for job in group:
+                if not job.get("ended"):    # log hotového zápasu ze streamu už je uzavřený
+                    job["log"](*parts)
+        return log
+
+    latency = None
+    har_in = Path(args.replay_har).resolve() if args.replay_har else None
+    har_out = Path(args.record_har).resolve() if args.record_har else None
+    REGISTR_GUARD.rate = args.rate
+    unattended = bool(args.watch or args.worker)   # běží dlouho, zápasy přichází postupně
+    stream = _input_format(args) == "jsonl" or unattended
+    headed   = bool(getattr(args, "headed", True))
+    headless = not headed
+    session = None
+    sampler = None
+    prepared = False
+    prof = None
+    if args.profile:
+        import cProfile
+        prof = cProfile.Profile()
+    profile_base = None
+    profiled = []   # všechny zápasy pro souhrn profilu (--watch/--worker průběžně maže `jobs`)
+    idle_since = None   # --watch/--worker: konec posledního zápasu (kvůli expiraci PHP session)
+
+    def start_browser(lead_job, log, check=lambda: None):
+        """
+        2) Playwright runtime + 3) spuštění prohlížeče a načtení login.php – nic z toho nepotřebuje
+        data zápasu. `check` se volá mezi kroky (pipeline: chyba sešitu start přeruší).
+        Přihlášení (session.account) doplní main, až jsou data načtená.
+        """
+        nonlocal sampler, profile_base
+        lead = lead_job["run"]
+        prepare_playwright_browsers(log)   # nastaví PLAYWRIGHT_BROWSERS_PATH
+        check()
+        ensure_pw_browsers(log)            # případně doinstaluje Chromium
+        check()
+        p = pw_stack.enter_context(sync_playwright())
+        s = BrowserSession(p, headless, log, pw_stack, har_in, har_out, {}, lite=args.lite)
+        with lead.phase("launch") as b:
+            s.launch(b)
+        check()
+        sampler = RssSampler()
+        if sampler.available:
+            sampler.start()
+            pw_stack.callback(sampler.stop)
+        else:
+            log("RSS prohlížeče nelze měřit (chybí psutil) – bez paměťových statistik.")
+        if prof is not None:
+            profile_base = lead_job["path"]    # → .trace.zip / .pstats / .profile.txt vedle zdroje
+            s.start_trace(profile_base.with_suffix(".trace.zip"), args.trace_screenshots)
+        with lead.phase("login") as b:
+            s.open_login(b)
+        check()
+        return s
+    def end_group(group):
+        """
+        Stream: zápasy skupiny jsou hotové – prohlížeč zůstává přihlášený pro další zápas,
+        stránky hotových zápasů se zavřou a jejich log se uzavře hned, ne až na konci běhu.
+        """
+        for job in group:
+            try:
+                if job["page"] is not None:
+                    job["page"].close()
+            except Exception:
+                pass
+            job["log"]("==== stis_uploader end ====")
+            job["ended"] = True
+    if prof is not None:
+        prof.enable()
+    try:
+        with contextlib.ExitStack() as pw_stack:
+            for group in _job_groups(args, loggers):
+                jobs += group
+                if prof is not None:
+                    profiled += group
+                log_all = log_to(group)
+
+                if not prepared:
+                    prepared = True
+                    if har_in:
+                        if not har_in.exists():
+                            raise RuntimeError(f"HAR neexistuje: {har_in}")
+                        # přehrávání má nulovou latenci → neučit se z něj a nepoužívat naučené hodnoty
+                        args.adaptive = False
+                        REGISTR_GUARD.rate = 0
+                        log_all("Replay z HAR:", har_in)
+
+                    # 0) adaptivní timeouty z minulých běhů
+                    if args.adaptive:
+                        try:
+                            latency = LatencyStore()
+                            log_all(f"Adaptivní timeouty ({latency.path}):")
+                            apply_adaptive_timeouts(latency, log_all)
+                        except Exception as e:
+                            latency = None
+                            log_all("Adaptivní timeouty nedostupné, jedu s konstantami:", repr(e))
+
+                # 1) data zápasů (XLSX / JSON) – v dávce chyba kteréhokoli = konec před přihlášením,
+                #    ve streamu se jen přeskočí vadný zápas.
+                #    Pipeline (první dávka bez --no-pipeline): prohlížeč ani login.php na datech nezávisí,
+                #    takže se sešit čte ve vlákně a mezitím se spouští prohlížeč; na data čeká až login.
+                #    --profile startuje postupně: cProfile vidí jen hlavní vlákno a CPU/čekání po fázích
+                #    by se při souběhu fází překrývalo.
+                pipelined = session is None and args.pipeline and not stream and prof is None
+                if session is None:
+                    for job in group:
+                        job["meta"]["startup"] = "pipe" if pipelined else "seq"
+                    if args.pipeline and not stream and prof is not None:
+                        log_all("--profile: start postupně (bez pipeline), aby profil fází odpovídal.")
+                if pipelined:
+                    import concurrent.futures
+                    pool = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="stis-load")
+                    loading = pool.submit(load_group, group, args, stream)
+                    pool.shutdown(wait=False)
+                    lead = group[0]["run"]
+                    try:
+                        session = start_browser(group[0], log_all, lambda: _startup_check(loading, log_all))
+                    except BaseException:
+                        concurrent.futures.wait([loading])   # vlákno nesmí běžet dál (zámky zápasů, log)
+                        raise
+                    with lead.phase("load_wait"):
+                        loading.result()
+                    log_all(f"Data zápasu připravena, prohlížeč na ně čekal {lead.phases['load_wait']} ms.")
+                else:
+                    load_group(group, args, stream)
+                if stream and session is not None:
+                    for job in group:
+                        if not job["error"] and (job["login"], job["pwd"]) != session.account:
+                            job["error"] = RuntimeError("Jiný login než přihlášená session – spusť tento zápas zvlášť.")
+                            job["meta"]["error"] = repr(job["error"])
+                            job["log"]("ERROR:", repr(job["error"]))
+                ready = [j for j in group if not j["error"]]
+                if not ready:
+                    for job in group:
+                        finalize_job(job, args)
+                    if stream:
+                        end_group(group)
+                    if unattended:
+                        jobs = [j for j in jobs if j not in group]
+                    continue
+                logins = {(j["login"], j["pwd"]) for j in ready}
+                if session is not None and session.account is not None:
+                    logins.add(session.account)
+                if len(logins) > 1:
+                    raise RuntimeError("Všechna družstva běhu musí mít stejný login (jeden context = jedno přihlášení).")
+                if len(ready) > 1:
+                    log_all(f"Souběžně {len(ready)} zápasů v jednom contextu:", ", ".join(j["key"] for j in ready))
+
+                if session is None or session.account is None:
+                    lead = ready[0]["run"]
+                    if session is None:
+                        session = start_browser(ready[0], log_all)
+                    user_login, user_pwd = ready[0]["login"], ready[0]["pwd"]
+                    if har_in:
+                        user_login, user_pwd = HAR_LOGIN, HAR_PASSWORD   # tak je login uložen v HAR
+                    session.secrets.update({user_login: HAR_LOGIN, user_pwd: HAR_PASSWORD})
+                    session.account = (ready[0]["login"], ready[0]["pwd"])
+
+                    # 4) login – jednou pro všechny zápasy
+                    with lead.phase("login") as b:
+                        session.login(user_login, user_pwd, b)
+                    for job in ready:
+                        for ph in ("launch", "login"):
+                            job["run"].phases[ph] = lead.phases[ph]
+                            job["run"].cpu[ph] = lead.cpu[ph]
+                            job["run"].limits[ph] = lead.limits[ph]
+                else:
+                    session.log = log_all
+                    if args.rss_budget and sampler.available:
+                        _recycle_over_budget(session, sampler, args.rss_budget,
+                                             (HAR_LOGIN, HAR_PASSWORD) if har_in else session.account,
+                                             ready[0]["run"], log_all)
+                    if idle_since is not None and time.monotonic() - idle_since > WATCH_RELOGIN_S:
+                        log_all("Dlouhá nečinnost – přihlašuji znovu.")
+                        with ready[0]["run"].phase("login") as b:
+                            session.login(*((HAR_LOGIN, HAR_PASSWORD) if har_in else session.account), b)
+                for job in ready:
+                    job["meta"]["browser"] = session.version
+
+                # 5–9) zápasy skupiny: každý na své stránce, prokládaně
+                gate = SessionGate(concurrent=len(ready) > 1)
+                if sampler.available:
+                    sampler.sample()
+                    sampler.window()    # špička jen za tuto skupinu
+                run_pipelines([match_pipeline(session, job, gate, args) for job in ready])
+                if sampler.available:
+                    end_mb = sampler.sample()
+                    peak_mb = sampler.window()
+                    for job in ready:
+                        job["run"].rss_peak_mb, job["run"].rss_end_mb = peak_mb, end_mb
+                for job in group:
+                    finalize_job(job, args)
+                if stream:
+                    end_group(group)
+                if unattended:
+                    jobs = [j for j in jobs if j not in group]
+                    idle_since = time.monotonic()
                     try:
-                        browser.close(); log("Browser uzavřen.")
+                        if latency is not None:
+                            latency.save()
+                        for cache in (_STRATEGIES, _MATCH_URLS):
+                            if cache is not None:
+                                cache.save()
                     except Exception:
                         pass
-            else:
-                log("Headless režim – zavírám browser automaticky.")
-                try: context.close()
-                except Exception: pass
-                try: browser.close()
-                except Exception: pass
+
+            if session is not None:
+                log_all = log_to(jobs)
+                session.log = log_all
+                # 10) Ukončení
+                if stream:
+                    session.close()   # konec streamu – zápisy jsou uložené, stránky zápasů už zavřené
+                elif args.review:
+                    log_all("Režim kontroly – zavírám browser, zápis je uložen; zkontrolujte report.")
+                    session.close()
+                    if headed:
+                        for job in jobs:
+                            if job["review_html"]:
+                                try:
+                                    os.startfile(str(job["review_html"]))
+                                except Exception:
+                                    pass
+                elif headed and not all(j["error"] for j in jobs):
+                    log_all("=" * 60)
+                    log_all("HOTOVO! Okno prohlížeče zůstává otevřené.")
+                    log_all("Zkontrolujte vyplněná data a ručně zavřete okno prohlížeče.")
+                    log_all("Program se ukončí až po zavření okna.")
+                    log_all("=" * 60)
+                    try:
+                        for job in jobs:
+                            if job["page"] is not None and not job["error"] and not job["page"].is_closed():
+                                job["page"].wait_for_event("close", timeout=0)
+                        log_all("Okno prohlížeče bylo zavřeno uživatelem.")
+                    except Exception as e:
+                        log_all("Čekání na zavření okna skončilo:", repr(e))
+                    finally:
+                        session.close()
+                else:
+                    log_all("Headless režim – zavírám browser automaticky." if not headed else
+                            "Všechny zápasy selhaly – zavírám browser.")
+                    session.close()
 
     except Exception as e:
-        log("ERROR:", repr(e))
-        log(traceback.format_exc())
+        # chyba mimo pipeline zápasu (vstup, prohlížeč, login) → týká se všech rozpracovaných zápasů
+        for job in jobs:
+            if job["error"] is None and not job.get("finalized"):
+                job["meta"]["error"] = repr(e)[:500]
+                job["log"]("ERROR:", repr(e))
+                job["log"](traceback.format_exc())
         try:
-            os.startfile(str(log_path))
+            os.startfile(str(jobs[0]["log_path"] if jobs else BOOTLOG))
         except Exception:
             pass
         raise
     finally:
+        for job in jobs:
+            if not job.get("finalized"):
+                finalize_job(job, args)
+        if prof is not None:
+            prof.disable()
+            if profile_base is not None:
+                try:
+                    write_profile(profile_base, prof, profiled, profile_base.with_suffix(".trace.zip"),
+                                  log_to(profiled))
+                except Exception as e:
+                    log_to(profiled)("Zápis profilu selhal:", repr(e))
+        if latency is not None:
+            log_all = log_to(jobs)
+            try:
+                latency.save()
+                log_all("Naučené timeouty pro příští běh:")
+                for op, (name, _f, _c) in ADAPTIVE_OPS.items():
+                    ms, p95, n = latency.learned(op, _ADAPTIVE_DEFAULTS.get(name, globals()[name]))
+                    log_all(f"  {op:<12} → {ms} ms" + (f" (p95={p95:.0f} ms, n={n})" if p95 is not None else f" (n={n})"))
+            except Exception as e:
+                log_all("Uložení latencí selhalo:", repr(e))
+        for cache in (_STRATEGIES, _MATCH_URLS):
+            if cache is not None:
+                try:
+                    cache.save()
+                except Exception as e:
+                    log_to(jobs)(f"Uložení {cache.path.name} selhalo:", repr(e))
+        for job in jobs:
+            if not job.get("ended"):
+                job["log"]("==== stis_uploader end ====")
+        for _log, f, _path in loggers.values():
+            try:
+                f.close()
+            except Exception:
+                pass
+
+    # chyby jednotlivých zápasů (už zalogované v match_pipeline)
+    failed = [j for j in jobs if j["error"]]
+    if failed:
         try:
-            log("==== stis_uploader end ====")
-            log_file.close()
+            os.startfile(str(failed[0]["log_path"]))
         except Exception:
             pass
+        if len(jobs) == 1:
+            raise failed[0]["error"]
+        raise RuntimeError("; ".join(f"{j['key'] or Path(j['path']).name}: {j['error']!r}" for j in failed))
+
 
 if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()   # EXE: procesy poolu (parse/validate) se spouští stejným EXE
+    import atexit
+    atexit.register(boot_flush)   # i při sys.exit / nezachycené výjimce
     boot("=== EXE start ===")
     try:
         boot("argv: " + " ".join(sys.argv))
-        main()
+        rc = main()
         boot("main() finished OK")
     except SystemExit as e:
         boot(f"SystemExit (pravděpodobně argparse): code={getattr(e, 'code', None)}")
+        if getattr(e, "code", None) in (0, None):   # --help / --version
+            raise
+        boot_flush()   # ať je stis_boot.log na disku, než uživatel odklikne hlášku
         msgbox("Spuštění skončilo hned na začátku (špatné/neúplné argumenty?).\n" +
                "Zkontroluj prosím volání z Excelu.\n" +
                "V TEMP nebo vedle EXE je stis_boot.log s detaily.")
@@ -1498,7 +5439,10 @@ if __name__ == "__main__":
             boot(traceback.format_exc())
         except Exception:
             pass
+        boot_flush()
         msgbox(f"Nastala chyba: {e}\nPodrobnosti jsou ve stis_boot.log.")
         raise
     finally:
         boot("=== EXE end ===")
+    if rc:
+        sys.exit(rc)